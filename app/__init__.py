@@ -0,0 +1,77 @@
+# app/__init__.py
+import gc
+import os
+
+from flask import Flask
+from flask_cors import CORS
+
+from app.utils.model_loader import ModelLoader
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Models that are pure spaCy/numpy data and can be loaded before gunicorn forks,
+# so all workers share their pages copy-on-write. The sentence model is not one:
+# torch starts OpenMP thread pools that do not survive fork, so each worker loads its own
+PRELOAD_MODELS = ['doc_parser', 'ner_analyzer', 'network_analyzer', 'doc_analyzer']
+
+
+def create_models(app: Flask) -> ModelLoader:
+    """Register every analyzer with a lazy loader"""
+    from app.models.doc_embeddings import EnhancedDocEmbeddingAnalyzer
+    from app.models.ner_analyzer import EnhancedNERAnalyzer
+    from app.models.network_analyzer import EnhancedNetworkAnalyzer
+    from app.utils.doc_parser import SharedDocParser
+
+    models = ModelLoader()
+    models.register('doc_parser', lambda: SharedDocParser(batch_size=app.config['PARSE_BATCH_SIZE'],
+                                                          n_process=app.config['PARSE_N_PROCESS']))
+    models.register('ner_analyzer', EnhancedNERAnalyzer)
+    models.register('network_analyzer', EnhancedNetworkAnalyzer)
+    models.register('doc_analyzer', EnhancedDocEmbeddingAnalyzer)
+    models.register('sentence_model', lambda: models.get('doc_analyzer').sentence_model)
+    return models
+
+
+def create_app() -> Flask:
+    """Application factory used by gunicorn ("app:create_app()") and wsgi.py"""
+    app = Flask(__name__, root_path=PROJECT_ROOT, static_url_path='/static')
+    CORS(app)
+
+    # Configuration
+    app.config['UPLOAD_FOLDER'] = 'uploads'
+    app.config['RESULTS_FOLDER'] = 'results'
+    app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('NATS_MAX_CONTENT_MB', '16')) * 1024 * 1024
+    app.config['PARSE_BATCH_SIZE'] = int(os.environ.get('NATS_PARSE_BATCH_SIZE', '8'))
+    app.config['PARSE_N_PROCESS'] = int(os.environ.get('NATS_PARSE_N_PROCESS', '1'))
+    app.config['WARMUP_MODELS'] = os.environ.get('NATS_WARMUP', '1') == '1'
+    app.config['WARMUP_RETRIES'] = int(os.environ.get('NATS_WARMUP_RETRIES', '2'))
+    app.config['PRELOAD_MODELS'] = os.environ.get('NATS_PRELOAD', '0') == '1'
+    # Set by gunicorn_config.py: warm-up threads start in each worker's post_worker_init,
+    # never here, since create_app may be running in the master before fork
+    app.config['WARMUP_IN_WORKER_HOOK'] = os.environ.get('NATS_WARMUP_HOOK', '0') == '1'
+
+    # Create directories
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+    os.makedirs(app.config['RESULTS_FOLDER'], exist_ok=True)
+    os.makedirs('static/networks', exist_ok=True)
+
+    models = create_models(app)
+    app.extensions['models'] = models
+
+    from app.routes.api_routes import api_bp
+    app.register_blueprint(api_bp)
+
+    if app.config['PRELOAD_MODELS']:
+        # Running in the gunicorn master (preload_app): load the shareable models
+        # now, in this thread, and move them out of the GC's reach so collections
+        # in the workers do not touch, and therefore copy, their pages. Worker-only
+        # models are warmed up by the post_worker_init hook in gunicorn_config.py.
+        models.warm_up(PRELOAD_MODELS, background=False)
+        gc.freeze()
+
+    if not app.config['WARMUP_MODELS']:
+        models.load_on_demand()
+    elif not app.config['WARMUP_IN_WORKER_HOOK']:
+        models.warm_up(retries=app.config['WARMUP_RETRIES'])
+
+    return app
@@ -0,0 +1,267 @@
+# app/models/cooccurrence.py
+"""Sentence co-occurrence counts as a sparse matrix product.
+
+Sentences are rows and entities are columns of a binary incidence matrix
+``X``. ``XᵀX`` holds, for every pair of entities, the number of sentences
+containing both; its diagonal holds each entity's sentence count, which is
+what PMI weighting needs. Rows arrive a window at a time (``flush``), and
+each window's product is added to a running upper triangle, so dense
+sentences cost sparse-matrix time instead of a Python loop over pairs.
+The incidence rows are kept to find the first sentences of each pair,
+enumerated row by row with vectorized index arithmetic. Callers that only
+need which pairs co-occur and where first (``keep_rows=False``) keep the
+first sentence of each pair instead, so memory grows with the number of
+distinct pairs rather than with the number of mentions.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+WEIGHTINGS = ('count', 'pmi')
+
+
+def _resize(matrix: sparse.spmatrix, shape: Tuple[int, int]) -> sparse.csr_matrix:
+    matrix = sparse.csr_matrix(matrix, copy=True)
+    matrix.resize(shape)
+    return matrix
+
+
+class CooccurrenceMatrix:
+    """Incrementally built sentence × entity incidence matrix and its pair counts"""
+
+    def __init__(self, names: Optional[Sequence[str]] = None, keep_rows: bool = True):
+        self.names: List[str] = list(names or [])
+        self._ids: Dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        self.n_sentences = 0
+        self.keep_rows = keep_rows
+
+        # Rows not yet flushed, in CSR form
+        self._indices: List[int] = []
+        self._indptr: List[int] = [0]
+        self._keys: List[Any] = []
+
+        self._blocks: List[sparse.csr_matrix] = []  # flushed incidence rows, one block per window
+        self._block_keys: List[Any] = []
+        self._counts = sparse.csr_matrix((0, 0), dtype=np.int64)  # upper triangle of XᵀX
+
+        # Without rows: first sentence (row + 1) of each pair, and the keys of those sentences
+        self._n_rows = 0
+        self._first = sparse.csr_matrix((0, 0), dtype=np.int64)
+        self._first_keys: Dict[int, Any] = {}
+
+    @property
+    def n_entities(self) -> int:
+        return len(self.names)
+
+    def column(self, name: str) -> int:
+        """Column of an entity name, added on first sight"""
+        column = self._ids.get(name)
+        if column is None:
+            column = self._ids[name] = len(self.names)
+            self.names.append(name)
+        return column
+
+    def add_sentence(self, columns: Iterable[int], key: Any = None):
+        """Add one sentence by the columns of its entities; ``key`` identifies it in contexts"""
+        self.n_sentences += 1
+        columns = sorted(set(columns))
+        if not columns:
+            return
+        if columns[-1] >= self.n_entities:
+            raise IndexError(f'Column {columns[-1]} out of range for {self.n_entities} entities')
+        self._indices.extend(columns)
+        self._indptr.append(len(self._indices))
+        self._keys.append(key)
+
+    def add_entities(self, names: Iterable[str], key: Any = None):
+        """Add one sentence by its entity names"""
+        self.add_sentence([self.column(name) for name in names], key)
+
+    def flush(self):
+        """Fold the pending rows (e.g. one streaming window) into the running counts"""
+        if not self._keys:
+            return
+        n = self.n_entities
+        block = sparse.csr_matrix((np.ones(len(self._indices), dtype=np.int64), self._indices, self._indptr),
+                                  shape=(len(self._keys), n))
+        self._counts = _resize(self._counts, (n, n)) + sparse.triu(block.T @ block, format='csr')
+        if self.keep_rows:
+            self._blocks.append(block)
+            self._block_keys.extend(self._keys)
+        else:
+            self._fold_first(block, self._keys)
+        self._n_rows += block.shape[0]
+        self._indices, self._indptr, self._keys = [], [0], []
+
+    def _fold_first(self, block: sparse.csr_matrix, keys: List[Any]):
+        """Record the first row of every pair seen for the first time in ``block``"""
+        n = self.n_entities
+        a, b, rows = _row_pairs(block)
+        first = _resize(self._first, (n, n))
+        if len(a):
+            # Pairs come in row order, so the first index of each code is its first row
+            _, index = np.unique(a * n + b, return_index=True)
+            new = sparse.csr_matrix((rows[index] + self._n_rows + 1, (a[index], b[index])), shape=(n, n))
+            seen = first.copy()
+            seen.data[:] = 1
+            new = new - new.multiply(seen)  # pairs of earlier windows keep their first row
+            new.eliminate_zeros()
+            first = first + new
+            for row in new.data - 1:
+                self._first_keys[int(row)] = keys[row - self._n_rows]
+        self._first = first
+
+    def incidence(self) -> sparse.csc_matrix:
+        """The sentence × entity incidence matrix of all sentences with an entity, by column"""
+        if not self.keep_rows:
+            raise ValueError('Incidence rows were not kept (keep_rows=False)')
+        self.flush()
+        n = self.n_entities
+        if not self._blocks:
+            return sparse.csc_matrix((0, n), dtype=np.int64)
+        matrix = sparse.vstack([_resize(block, (block.shape[0], n)) for block in self._blocks], format='csc')
+        matrix.sort_indices()
+        return matrix
+
+    def counts(self) -> sparse.csr_matrix:
+        """Upper triangle of XᵀX: pair counts above the diagonal, sentence counts on it"""
+        self.flush()
+        return _resize(self._counts, (self.n_entities, self.n_entities))
+
+    def merged(self, mapping: Sequence[Optional[int]], names: Sequence[str]) -> 'CooccurrenceMatrix':
+        """Map columns onto new ones (e.g. surface forms onto canonical names; None drops a column).
+
+        A sentence counts once for a merged entity however many of its
+        surface forms it contains.
+        """
+        merged = CooccurrenceMatrix(names)
+        merged.n_sentences = self.n_sentences
+        incidence = self.incidence()
+        keep = [i for i, target in enumerate(mapping[:self.n_entities]) if target is not None]
+        projection = sparse.csr_matrix((np.ones(len(keep), dtype=np.int64), (keep, [mapping[i] for i in keep])),
+                                       shape=(self.n_entities, len(merged.names)))
+        rows = (incidence @ projection).tocsr()
+        rows.data[:] = 1
+        rows.eliminate_zeros()
+        merged._blocks = [rows]
+        merged._block_keys = list(self._block_keys)
+        merged._counts = sparse.triu(rows.T @ rows, format='csr')
+        return merged
+
+    def merged_pairs(self, mapping: Sequence[Optional[int]], names: Sequence[str]) -> List[Tuple[str, str]]:
+        """The pairs of ``merged(mapping, names).pairs()``, in the same order, without needing rows.
+
+        A merged pair co-occurs wherever any pair of its surface forms does,
+        so it first co-occurs in the earliest first sentence of those pairs.
+        """
+        if self.keep_rows:
+            return [pair['entities'] for pair in self.merged(mapping, names).pairs(max_contexts=0)]
+        self.flush()
+        n = self.n_entities
+        first = _resize(self._first, (n, n)).tocoo()
+        target = np.array([-1 if column is None else column for column in mapping[:n]], dtype=np.int64)
+        a, b = target[first.row], target[first.col]
+        keep = (a >= 0) & (b >= 0) & (a != b)
+        a, b, sentence = np.minimum(a, b)[keep], np.maximum(a, b)[keep], first.data[keep]
+        order = np.lexsort((b, a, sentence))
+        a, b = a[order], b[order]
+        _, index = np.unique(a * len(names) + b, return_index=True)
+        index.sort()
+        return [(names[i], names[j]) for i, j in zip(a[index].tolist(), b[index].tolist())]
+
+    def pairs(self, weighting: str = 'count', min_weight: Optional[float] = None,
+              max_contexts: int = 3) -> List[Dict[str, Any]]:
+        """Co-occurring pairs with their count and weight, optionally filtered by weight.
+
+        Weights are the raw count or the pointwise mutual information
+        ``log(N · n_ab / (n_a · n_b))`` over ``N`` sentences. Each pair
+        carries the keys of its first ``max_contexts`` sentences (at most one
+        without rows), and pairs are ordered by the sentence where they
+        first co-occur.
+        """
+        if weighting not in WEIGHTINGS:
+            raise ValueError(f'Unknown weighting {weighting}; expected one of {WEIGHTINGS}')
+        counts = self.counts().tocoo()
+        off_diagonal = counts.row < counts.col
+        rows, cols, pair_counts = counts.row[off_diagonal], counts.col[off_diagonal], counts.data[off_diagonal]
+
+        if weighting == 'pmi':
+            totals = counts.diagonal() if counts.nnz else np.zeros(self.n_entities)
+            weights = np.log(self.n_sentences * pair_counts / (totals[rows] * totals[cols]))
+        else:
+            weights = pair_counts.astype(float)
+
+        if min_weight is not None:
+            keep = weights >= min_weight
+            rows, cols, pair_counts, weights = rows[keep], cols[keep], pair_counts[keep], weights[keep]
+
+        if self.keep_rows:
+            contexts = self._first_sentences(rows, cols, max(max_contexts, 1))
+            keys = self._block_keys
+        else:
+            # Only the first sentence of each pair is known
+            first = _resize(self._first, (self.n_entities, self.n_entities))
+            contexts = np.asarray(first[rows, cols], dtype=np.int64).reshape(-1, 1) - 1
+            keys = self._first_keys
+        order = np.lexsort((cols, rows, contexts[:, 0]))
+        names = self.names
+        return [{
+            'entities': (names[a], names[b]),
+            'count': count,
+            'weight': weight,
+            'contexts': [keys[j] for j in sentences if j >= 0]
+        } for a, b, count, weight, sentences in zip(rows[order].tolist(), cols[order].tolist(),
+                                                    pair_counts[order].tolist(), weights[order].tolist(),
+                                                    contexts[order, :max_contexts].tolist())]
+
+    def _first_sentences(self, rows: np.ndarray, cols: np.ndarray, n_slots: int,
+                         max_pairs_per_chunk: int = 4000000) -> np.ndarray:
+        """(n_pairs, n_slots) array of the first sentences (rows) containing each pair, -1 padded"""
+        n = max(self.n_entities, 1)
+        codes = rows.astype(np.int64) * n + cols
+        order = np.argsort(codes)
+        sorted_codes = codes[order]
+        found = np.full((len(codes), n_slots), -1, dtype=np.int64)
+        filled = np.zeros(len(codes), dtype=np.int64)
+        if not len(codes):
+            return found
+
+        row_offset = 0
+        for block in self._blocks:
+            block_pairs = np.cumsum(np.diff(block.indptr) * (np.diff(block.indptr) - 1) // 2)
+            start = 0
+            while start < block.shape[0]:
+                # Rows whose within-sentence pairs fit in one chunk (at least one row)
+                done = block_pairs[start - 1] if start else 0
+                end = max(int(np.searchsorted(block_pairs, done + max_pairs_per_chunk, side='right')), start + 1)
+                a, b, sentence = _row_pairs(block[start:end])
+                slot = np.searchsorted(sorted_codes, a * n + b)
+                slot[slot == len(sorted_codes)] = 0
+                hit = sorted_codes[slot] == a * n + b
+                slot, sentence = order[slot[hit]], sentence[hit] + row_offset + start
+
+                # Rank of each occurrence within its pair, after those of earlier chunks
+                by_pair = np.argsort(slot, kind='stable')
+                slot, sentence = slot[by_pair], sentence[by_pair]
+                starts = np.flatnonzero(np.r_[True, slot[1:] != slot[:-1]])
+                rank = np.arange(len(slot)) - np.repeat(starts, np.diff(np.r_[starts, len(slot)]))
+                rank += filled[slot]
+                keep = rank < n_slots
+                found[slot[keep], rank[keep]] = sentence[keep]
+                filled += np.bincount(slot, minlength=len(filled))
+                start = end
+            row_offset += block.shape[0]
+        return found
+
+
+def _row_pairs(block: sparse.csr_matrix) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """(column a, column b, row) for every pair of entries in the same row, in row order; a < b"""
+    block.sort_indices()
+    lengths = np.diff(block.indptr)
+    entry_rows = np.repeat(np.arange(block.shape[0]), lengths)
+    # Each entry pairs with the entries after it in its row
+    later = block.indptr[entry_rows + 1] - np.arange(block.nnz) - 1
+    first = np.repeat(np.arange(block.nnz), later)
+    second = first + 1 + np.arange(len(first)) - np.repeat(np.cumsum(later) - later, later)
+    return block.indices[first].astype(np.int64), block.indices[second].astype(np.int64), entry_rows[first]
@@ -1,8 +1,175 @@
-from sklearn.decomposition import PCA
+from sklearn.decomposition import PCA, IncrementalPCA
 from sklearn.manifold import TSNE
+import atexit
+import inspect
+import multiprocessing
+import os
+import threading
+import time
 import numpy as np
 import plotly.express as px
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, Iterator, Tuple, Union
+
+try:
+    import umap
+    UMAP_AVAILABLE = True
+except ImportError:
+    UMAP_AVAILABLE = False
+
+# Above these sizes exact PCA gives way to randomized SVD, then to IncrementalPCA
+RANDOMIZED_PCA_MIN_ROWS = 2000
+INCREMENTAL_PCA_MIN_ROWS = 50000
+# t-SNE and UMAP run on a PCA projection of this many dimensions
+PREREDUCE_COMPONENTS = 50
+
+# Reducers other than PCA run in their own processes (at most this many at once), each with a time budget
+REDUCER_PROCESSES = int(os.environ.get('NATS_REDUCER_PROCESSES', '0')) or min(4, os.cpu_count() or 1)
+REDUCER_TIMEOUT = float(os.environ.get('NATS_REDUCER_TIMEOUT', '60'))
+# Up to this many rows every reducer runs in-process: a spawned process would spend
+# longer re-importing scikit-learn/umap/numba than the reduction itself takes
+IN_PROCESS_MAX_ROWS = int(os.environ.get('NATS_REDUCER_IN_PROCESS_ROWS', '500'))
+
+# scikit-learn 1.5 renamed TSNE's n_iter to max_iter
+_TSNE_ITER_PARAM = 'max_iter' if 'max_iter' in inspect.signature(TSNE).parameters else 'n_iter'
+
+
+def incremental_pca(matrix, n_components: int = 2, batch_size: int = 4096) -> np.ndarray:
+    """IncrementalPCA fitted and applied batch by batch, so a memory-mapped matrix is never fully loaded"""
+    batch_size = max(batch_size, n_components)
+    reducer = IncrementalPCA(n_components=n_components)
+    for start in range(0, len(matrix), batch_size):
+        batch = np.asarray(matrix[start:start + batch_size], dtype=np.float32)
+        if len(batch) >= n_components:
+            reducer.partial_fit(batch)
+    return np.vstack([reducer.transform(np.asarray(matrix[start:start + batch_size], dtype=np.float32))
+                      for start in range(0, len(matrix), batch_size)])
+
+
+def pca(matrix, n_components: int = 2, random_state: int = 42) -> np.ndarray:
+    """PCA whose solver is picked by size: exact, randomized SVD, or incremental from disk"""
+    n_rows = len(matrix)
+    if n_rows >= INCREMENTAL_PCA_MIN_ROWS or isinstance(matrix, np.memmap):
+        return incremental_pca(matrix, n_components)
+    solver = 'randomized' if n_rows >= RANDOMIZED_PCA_MIN_ROWS else 'full'
+    return PCA(n_components=n_components, svd_solver=solver, random_state=random_state).fit_transform(matrix)
+
+
+def prereduce(matrix, random_state: int = 42) -> np.ndarray:
+    """Project onto the top PREREDUCE_COMPONENTS principal components ahead of t-SNE/UMAP"""
+    n_components = min(PREREDUCE_COMPONENTS, len(matrix) - 1)
+    if matrix.shape[1] <= PREREDUCE_COMPONENTS or n_components < 2:
+        return np.asarray(matrix, dtype=np.float32)
+    return pca(matrix, n_components, random_state).astype(np.float32)
+
+
+def tsne(matrix, n_components: int = 2, random_state: int = 42, n_jobs: int = -1) -> np.ndarray:
+    """Barnes-Hut t-SNE on a PCA-50 projection, with perplexity and iterations scaled to N"""
+    n_rows = len(matrix)
+    perplexity = float(min(max(5, n_rows // 5), 30, n_rows - 1))
+    params = {
+        'n_components': n_components,
+        'perplexity': perplexity,
+        'init': 'pca',
+        'learning_rate': 'auto',
+        'random_state': random_state,
+        'n_jobs': n_jobs,
+        # PCA initialisation converges early, so large inputs get fewer iterations
+        _TSNE_ITER_PARAM: 1000 if n_rows <= 2000 else 500
+    }
+    return TSNE(**params).fit_transform(prereduce(matrix, random_state))
+
+
+def umap_reduce(matrix, n_components: int = 2, random_state: int = 42) -> np.ndarray:
+    """UMAP on a PCA-50 projection; falls back to PCA when umap-learn is missing"""
+    if not UMAP_AVAILABLE:
+        return pca(matrix, n_components, random_state)
+    n_rows = len(matrix)
+    reducer = umap.UMAP(n_components=n_components,
+                        n_neighbors=min(15 if n_rows <= 10000 else 30, n_rows - 1),
+                        low_memory=n_rows > 10000,
+                        random_state=random_state)
+    return reducer.fit_transform(prereduce(matrix, random_state))
+
+
+def reduce_matrix(matrix, method: str = 'pca', n_components: int = 2, random_state: int = 42,
+                  n_jobs: int = -1) -> np.ndarray:
+    """Reduce an (N, dim) matrix with parameters chosen from its size"""
+    method = method.lower()
+    if method == 'tsne':
+        return tsne(matrix, n_components, random_state, n_jobs)
+    if method == 'umap':
+        return umap_reduce(matrix, n_components, random_state)
+    return pca(matrix, n_components, random_state)
+
+
+def _run_reducer(conn, matrix, method: str, n_components: int):
+    try:
+        # One thread: the job already has a process of its own, and loky refuses to nest
+        result = ('ok', reduce_matrix(matrix, method, n_components, n_jobs=1))
+    except Exception as e:
+        result = ('error', f'{type(e).__name__}: {e}')
+    conn.send(result)
+    conn.close()
+
+
+_slots = threading.BoundedSemaphore(REDUCER_PROCESSES)
+_running = set()
+
+
+class _ReducerJob:
+    """One reduction in a dedicated process, so an overrun can be killed without touching other jobs"""
+
+    def __init__(self, matrix, method: str, n_components: int, budget: float):
+        self.args = (matrix, method, n_components)
+        self.budget = budget
+        self.deadline = None  # set when the process starts, so time queued for a slot is not counted
+        self.process = None
+        self.conn = None
+
+    def start(self) -> bool:
+        """Start once a process slot is free; False while all slots are busy"""
+        if not _slots.acquire(blocking=False):
+            return False
+        # spawn, not fork: OpenMP/numba thread pools in the parent do not survive fork
+        context = multiprocessing.get_context('spawn')
+        self.conn, child_conn = context.Pipe(duplex=False)
+        self.process = context.Process(target=_run_reducer, args=(child_conn,) + self.args, daemon=True)
+        self.process.start()
+        self.deadline = time.time() + self.budget
+        child_conn.close()
+        _running.add(self)
+        return True
+
+    def ready(self) -> bool:
+        return self.process is not None and (self.conn.poll() or not self.process.is_alive())
+
+    def get(self) -> np.ndarray:
+        try:
+            status, result = self.conn.recv()
+        except EOFError:
+            raise RuntimeError(f'reducer process exited with code {self.process.exitcode}')
+        finally:
+            self.close()
+        if status != 'ok':
+            raise RuntimeError(result)
+        return result
+
+    def close(self, kill: bool = False):
+        if self.process is None or self not in _running:
+            return
+        _running.discard(self)
+        if kill:
+            self.process.terminate()
+        self.process.join()
+        self.conn.close()
+        _slots.release()
+
+
+@atexit.register
+def _terminate_running():
+    for job in list(_running):
+        job.close(kill=True)
+
 
 class DimensionReducer:
     def __init__(self, n_components: int = 2):
@@ -17,21 +184,14 @@ class DimensionReducer:
         labels = list(embeddings.keys())
         embedding_matrix = np.array([embeddings[label] for label in labels])
         
-        # Choose reducer
-        if method.lower() == 'pca':
-            reducer = PCA(n_components=min(self.n_components, len(labels)-1))
-        else:  # t-SNE
-            perplexity = min(30, max(5, len(labels) // 5))
-            reducer = TSNE(
-                n_components=self.n_components,
-                perplexity=perplexity,
-                n_iter=250,
-                random_state=42
-            )
-        
         # Reduce dimensions
-        reduced = reducer.fit_transform(embedding_matrix)
-        
+        reduced = reduce_matrix(embedding_matrix, method, self._components(method, len(labels)))
+        return self._package(labels, reduced, method)
+    
+    def _components(self, method: str, n_rows: int) -> int:
+        return min(self.n_components, n_rows - 1) if method.lower() == 'pca' else self.n_components
+    
+    def _package(self, labels, reduced: np.ndarray, method: str) -> Dict[str, Any]:
         # Create visualization
         fig = px.scatter(
             x=reduced[:, 0],
@@ -51,9 +211,85 @@ class DimensionReducer:
             'plot': fig.to_json()
         }
     
-    def analyze_both(self, embeddings: Dict[str, np.ndarray]) -> Dict[str, Dict]:
-        """Run both PCA and t-SNE"""
-        return {
-            'pca': self.reduce_dimensions(embeddings, 'pca'),
-            'tsne': self.reduce_dimensions(embeddings, 'tsne')
-        }
+    def iter_reductions(self, embeddings: Dict[str, np.ndarray],
+                        methods: Iterable[str] = ('pca', 'tsne'),
+                        time_budget: Union[float, Dict[str, float]] = REDUCER_TIMEOUT
+                        ) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Run reducers concurrently and yield (method, result) as each one finishes.
+
+        PCA runs in-process; other methods each run in their own process,
+        all submitted before the first result is yielded. A method that
+        errors, overruns its time budget (seconds from the start of its
+        process; a float for all or a dict per method) or is not installed
+        (UMAP) yields a PCA result instead, marked ``fallback``. Up to
+        IN_PROCESS_MAX_ROWS embeddings, every method runs in-process, one
+        after another, with no time budget.
+        """
+        labels = list(embeddings.keys())
+        embedding_matrix = np.array([embeddings[label] for label in labels])
+        methods = [method.lower() for method in methods]
+        
+        unavailable = [method for method in methods if method == 'umap' and not UMAP_AVAILABLE]
+        in_process = len(labels) <= IN_PROCESS_MAX_ROWS
+        pending = {}
+        for method in methods:
+            if method != 'pca' and method not in unavailable and not in_process:
+                budget = time_budget.get(method, REDUCER_TIMEOUT) if isinstance(time_budget, dict) else time_budget
+                pending[method] = _ReducerJob(embedding_matrix, method, self._components(method, len(labels)),
+                                              budget)
+        for job in pending.values():
+            job.start()  # jobs beyond the free slots are started as slots free up
+        
+        fallback = None
+        def pca_fallback():
+            nonlocal fallback
+            if fallback is None:
+                fallback = reduce_matrix(embedding_matrix, 'pca', self._components('pca', len(labels)))
+            return fallback
+        
+        if 'pca' in methods:
+            yield 'pca', self._package(labels, pca_fallback(), 'pca')
+        for method in unavailable:
+            print(f"umap-learn is not installed; falling back to PCA for {method}")
+            yield method, dict(self._package(labels, pca_fallback(), method), fallback='pca')
+        if in_process:
+            for method in methods:
+                if method == 'pca' or method in unavailable:
+                    continue
+                try:
+                    result = self._package(labels, reduce_matrix(embedding_matrix, method,
+                                                                 self._components(method, len(labels))), method)
+                except Exception as e:
+                    print(f"{method} reduction failed ({e}); falling back to PCA")
+                    result = dict(self._package(labels, pca_fallback(), method), fallback='pca')
+                yield method, result
+        
+        try:
+            while pending:
+                for method, job in list(pending.items()):
+                    if job.process is None:
+                        job.start()
+                    if job.ready():
+                        del pending[method]
+                        try:
+                            yield method, self._package(labels, job.get(), method)
+                        except Exception as e:
+                            print(f"{method} reduction failed ({e}); falling back to PCA")
+                            yield method, dict(self._package(labels, pca_fallback(), method), fallback='pca')
+                    elif job.deadline is not None and time.time() >= job.deadline:
+                        del pending[method]
+                        job.close(kill=True)  # only this job's process
+                        print(f"{method} reduction exceeded its time budget; falling back to PCA")
+                        yield method, dict(self._package(labels, pca_fallback(), method), fallback='pca')
+                if pending:
+                    time.sleep(0.05)
+        finally:
+            # The caller stopped iterating early: do not leave reducers running
+            for job in pending.values():
+                job.close(kill=True)
+    
+    def analyze_both(self, embeddings: Dict[str, np.ndarray],
+                     methods: Iterable[str] = ('pca', 'tsne'),
+                     time_budget: Union[float, Dict[str, float]] = REDUCER_TIMEOUT) -> Dict[str, Dict]:
+        """Run PCA and t-SNE (or any set of methods) concurrently"""
+        return dict(self.iter_reductions(embeddings, methods, time_budget))
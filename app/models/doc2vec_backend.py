@@ -0,0 +1,228 @@
+# app/models/doc2vec_backend.py
+"""Doc2Vec document embeddings trained on the corpus of everything uploaded so far.
+
+Uploaded documents are appended, tokenized, to an on-disk corpus. A model is
+trained on that corpus with several worker threads and saved into a new
+versioned directory, with its large arrays in separate ``.npy`` files so every
+worker process can memory-map them read-only. A ``CURRENT`` file names the
+version in use; workers notice when it changes and reload, and only the
+newest few versions are kept. New uploads are embedded with ``infer_vector``
+against the current model.
+"""
+import fcntl
+import hashlib
+import os
+import shutil
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+from gensim.models.doc2vec import Doc2Vec, TaggedDocument
+
+DOC2VEC_DIR = os.environ.get('NATS_DOC2VEC_DIR', os.path.join('cache', 'doc2vec'))
+DOC2VEC_WORKERS = int(os.environ.get('NATS_DOC2VEC_WORKERS', str(os.cpu_count() or 1)))
+# Retrain once the corpus has grown by this fraction since the current model was trained
+DOC2VEC_RETRAIN_GROWTH = float(os.environ.get('NATS_DOC2VEC_RETRAIN_GROWTH', '0.25'))
+# Model versions kept on disk; workers still mapping a deleted one keep their open files
+DOC2VEC_KEEP_VERSIONS = int(os.environ.get('NATS_DOC2VEC_KEEP_VERSIONS', '3'))
+
+
+class _CorpusStream:
+    """Re-iterable stream of TaggedDocuments read from the corpus file, one pass per epoch"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def __iter__(self) -> Iterator[TaggedDocument]:
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break  # partially written line
+                tag, _, tokens = line.rstrip('\n').partition('\t')
+                yield TaggedDocument(tokens.split(' '), [tag])
+
+
+class Doc2VecBackend:
+    """Persistent Doc2Vec model shared by all workers through a memory-mapped directory"""
+
+    def __init__(self, directory: str = DOC2VEC_DIR, vector_size: int = 100, window: int = 5,
+                 min_count: int = 2, epochs: int = 20, workers: int = DOC2VEC_WORKERS,
+                 retrain_growth: float = DOC2VEC_RETRAIN_GROWTH, keep_versions: int = DOC2VEC_KEEP_VERSIONS):
+        self.directory = directory
+        self.vector_size = vector_size
+        self.window = window
+        self.min_count = min_count
+        self.epochs = epochs
+        self.workers = workers
+        self.retrain_growth = retrain_growth
+        self.keep_versions = max(keep_versions, 1)
+
+        self._corpus_path = os.path.join(directory, 'corpus.tsv')
+        self._current_path = os.path.join(directory, 'CURRENT')
+        self._lock_path = os.path.join(directory, '.lock')
+        os.makedirs(os.path.join(directory, 'models'), exist_ok=True)
+
+        self.model = None
+        self.version = None
+        self._tags = None
+        self._lock = threading.Lock()
+        self._training = None
+
+    # --- corpus ---
+
+    @staticmethod
+    def tag(tokens: List[str]) -> str:
+        return hashlib.sha1(' '.join(tokens).encode('utf-8')).hexdigest()
+
+    def _load_tags(self):
+        if self._tags is None:
+            self._tags = set()
+            if os.path.exists(self._corpus_path):
+                for document in _CorpusStream(self._corpus_path):
+                    self._tags.add(document.tags[0])
+
+    def add_documents(self, documents: Dict[str, List[str]]) -> int:
+        """Append unseen tokenized documents to the corpus; returns how many were new"""
+        with self._lock:
+            self._load_tags()
+            new = {}
+            for tokens in documents.values():
+                tokens = [t for t in tokens if t and not any(c.isspace() for c in t)]
+                tag = self.tag(tokens)
+                if tokens and tag not in self._tags:
+                    new[tag] = tokens
+            if not new:
+                return 0
+
+            with open(self._lock_path, 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                with open(self._corpus_path, 'a', encoding='utf-8') as f:
+                    f.write(''.join(f"{tag}\t{' '.join(tokens)}\n" for tag, tokens in new.items()))
+            self._tags.update(new)
+            return len(new)
+
+    def corpus_size(self) -> int:
+        with self._lock:
+            self._load_tags()
+            return len(self._tags)
+
+    # --- model versions ---
+
+    def _current_version(self) -> Optional[str]:
+        try:
+            with open(self._current_path, 'r', encoding='utf-8') as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def _model_path(self, version: str) -> str:
+        return os.path.join(self.directory, 'models', version, 'doc2vec.model')
+
+    def _reload(self):
+        """Switch to the version named in CURRENT if another process trained a newer one"""
+        version = self._current_version()
+        if version is not None and version != self.version:
+            self.model = Doc2Vec.load(self._model_path(version), mmap='r')
+            self.version = version
+            print(f"Loaded Doc2Vec model {version}")
+
+    def _build_vocab(self, corpus: _CorpusStream, min_count: int) -> Doc2Vec:
+        model = Doc2Vec(vector_size=self.vector_size, window=self.window, min_count=min_count,
+                        epochs=self.epochs, workers=self.workers)
+        model.build_vocab(corpus)
+        return model
+
+    def train(self) -> str:
+        """Train a new model version on the whole corpus and make it current"""
+        corpus = _CorpusStream(self._corpus_path)
+        n_docs = self.corpus_size()
+        start = time.time()
+
+        model = self._build_vocab(corpus, self.min_count)
+        if not len(model.wv) and self.min_count > 1:
+            # A corpus of a few short documents may have no word min_count times
+            print(f"No word occurs {self.min_count} times in {n_docs} documents; training with min_count=1")
+            model = self._build_vocab(corpus, 1)
+        if not len(model.wv):
+            raise RuntimeError('Doc2Vec corpus has no words to train on')
+        model.train(corpus, total_examples=model.corpus_count, epochs=model.epochs)
+
+        version = f"{time.strftime('%Y%m%d-%H%M%S')}-{n_docs}"
+        path = self._model_path(version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # sep_limit=0 stores every array as its own .npy file so loads can mmap them
+        model.save(path, sep_limit=0)
+
+        tmp_path = f'{self._current_path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(version)
+        os.replace(tmp_path, self._current_path)
+        self._prune(version)
+
+        print(f"Trained Doc2Vec model {version} on {n_docs} documents in {time.time() - start:.1f}s")
+        return version
+
+    def _prune(self, current: str):
+        """Delete all but the newest ``keep_versions`` model versions (never the current one)"""
+        models_dir = os.path.join(self.directory, 'models')
+        versions = sorted(os.listdir(models_dir), reverse=True)
+        for version in versions[self.keep_versions:]:
+            if version != current:
+                shutil.rmtree(os.path.join(models_dir, version), ignore_errors=True)
+
+    def _train_exclusive(self, wait: bool = False):
+        """Train unless another process is already doing so.
+
+        With ``wait``, block until that process is done instead, and train
+        only if it did not leave a model behind.
+        """
+        with open(self._lock_path + '.train', 'w') as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX if wait else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                return
+            if wait:
+                self._reload()
+                if self.model is not None:
+                    return
+            self.train()
+
+    def _needs_training(self) -> bool:
+        if self.model is None:
+            return True
+        trained_on = int(self.version.rsplit('-', 1)[-1])
+        return self.corpus_size() > trained_on * (1 + self.retrain_growth)
+
+    def ensure_model(self):
+        """Load the current model, training the first one synchronously and later ones in the background"""
+        self._reload()
+        if not self._needs_training():
+            return
+
+        if self.model is None:
+            # No model to serve yet: wait for a worker already training the first one
+            self._train_exclusive(wait=True)
+            self._reload()
+        elif self._training is None or not self._training.is_alive():
+            self._training = threading.Thread(target=self._train_exclusive, name='doc2vec-train', daemon=True)
+            self._training.start()
+
+    # --- inference ---
+
+    def infer(self, documents: Dict[str, List[str]], epochs: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Embed tokenized documents with the current model"""
+        self.add_documents(documents)
+        self.ensure_model()
+        return {name: self.model.infer_vector(tokens, epochs=epochs or self.epochs)
+                for name, tokens in documents.items() if tokens}
+
+
+_backend = None
+
+
+def get_doc2vec_backend() -> Doc2VecBackend:
+    global _backend
+    if _backend is None:
+        _backend = Doc2VecBackend()
+    return _backend
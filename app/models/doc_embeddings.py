@@ -1,25 +1,25 @@
 # app/models/doc_embeddings.py
-from gensim.models.doc2vec import Doc2Vec, TaggedDocument
-from sentence_transformers import SentenceTransformer
 import numpy as np
-from sklearn.decomposition import PCA
-from sklearn.manifold import TSNE
+from scipy import sparse
 from sklearn.cluster import KMeans
-try:
-    import umap
-    UMAP_AVAILABLE = True
-except:
-    UMAP_AVAILABLE = False
-    print("UMAP not available - using PCA/t-SNE only")
 import plotly.express as px
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
-import spacy
 import pandas as pd
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Tuple, Optional
+import os
 import re
 import json
+import atexit
+import threading
+from multiprocessing import AuthenticationError
 from collections import Counter
+from app.utils.nlp_registry import get_pipeline
+from app.utils.embedding_server import EmbeddingClient
+from app.utils.embedding_cache import get_embedding_cache
+from app.utils.embedding_store import save_embeddings
+from app.models.dimension_reducer import UMAP_AVAILABLE, reduce_matrix
+from app.models.reference_space import REFERENCE_METHODS, get_reference_space
 
 try:
     import textstat
@@ -28,18 +28,128 @@ try:
 except (ImportError, Exception):
     TEXTSTAT_AVAILABLE = False
 
+# Opt-in multi-process encoding for large requests on CPU-only nodes
+ENCODE_POOL = os.environ.get('NATS_ENCODE_POOL', '0') == '1'
+ENCODE_POOL_SIZE = int(os.environ.get('NATS_ENCODE_POOL_SIZE', '0')) or os.cpu_count() or 1
+ENCODE_POOL_MIN_SENTENCES = int(os.environ.get('NATS_ENCODE_POOL_MIN_SENTENCES', '4096'))
+
 class EnhancedDocEmbeddingAnalyzer:
     def __init__(self):
         """Initialize with multiple embedding models and preprocessing tools"""
-        self.nlp = spacy.load('el_core_news_md', disable=['tagger', 'parser', 'attribute_ruler', 'lemmatizer'])
-        self.nlp.add_pipe('sentencizer')
+        self.nlp = get_pipeline(disable=['tagger', 'parser', 'attribute_ruler', 'lemmatizer'], sentencizer=True)
         
+        # The transformer is loaded on first use so the spaCy side can be preloaded before fork
+        self._sentence_model = None
+        self.sentence_model_name = None
+        self.embedding_cache = None
+        self._sentence_model_lock = threading.Lock()
+        self._encode_pool = None
+        
+        self.vector_size = 100
+        self.encode_batch_size = 64  # sentences per forward pass
+        self.encode_window = 1024  # length-sorted sentences handed to encode at a time
+        
+        # Similarity heatmap: dense up to similarity_dense_limit documents, then top-k sparse
+        self.similarity_dense_limit = 300
+        self.similarity_top_k = 10
+        self.similarity_block_size = 1024
+        self.heatmap_max_cells = 100  # per axis
+    
+    @property
+    def sentence_model(self):
+        """Sentence transformer, loaded on first access"""
+        if self._sentence_model is None:
+            with self._sentence_model_lock:
+                if self._sentence_model is None:
+                    model = self._load_sentence_model()
+                    self.embedding_cache = get_embedding_cache(self.sentence_model_name)
+                    self._sentence_model = model
+        return self._sentence_model
+    
+    def _load_sentence_model(self):
+        """Use the shared embedding server when NATS_EMBEDDING_SOCKET points at one, else a local model"""
+        socket_path = os.environ.get('NATS_EMBEDDING_SOCKET')
+        if socket_path and os.path.exists(socket_path):
+            try:
+                client = EmbeddingClient(socket_path)
+                self.sentence_model_name = client.model_name
+                print(f"Using embedding server at {socket_path}")
+                return client
+            except (OSError, EOFError, RuntimeError, AuthenticationError) as e:
+                # Stale socket of a dead server, or no shared key: encode locally
+                print(f"Embedding server at {socket_path} unavailable ({e}); loading a local model")
+        
+        from sentence_transformers import SentenceTransformer
         try:
-            self.sentence_model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+            model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+            self.sentence_model_name = 'paraphrase-multilingual-MiniLM-L12-v2'
         except:
-            self.sentence_model = SentenceTransformer('all-MiniLM-L6-v2')
+            model = SentenceTransformer('all-MiniLM-L6-v2')
+            self.sentence_model_name = 'all-MiniLM-L6-v2'
+        return model
+    
+    @property
+    def encode_pool(self):
+        """Multi-process encode pool of the local model, started on first use when NATS_ENCODE_POOL=1"""
+        if not ENCODE_POOL or ENCODE_POOL_SIZE < 2 or isinstance(self.sentence_model, EmbeddingClient):
+            return None
+        if self._encode_pool is None:
+            with self._sentence_model_lock:
+                if self._encode_pool is None:
+                    pool = self.sentence_model.start_multi_process_pool(['cpu'] * ENCODE_POOL_SIZE)
+                    atexit.register(self.sentence_model.stop_multi_process_pool, pool)
+                    print(f"Started encode pool with {ENCODE_POOL_SIZE} processes")
+                    self._encode_pool = pool
+        return self._encode_pool
+    
+    def encode_sentences(self, sentences: List[str], pool=None) -> np.ndarray:
+        """Encode sentences, serving repeats from the embedding cache"""
+        model = self.sentence_model
+        
+        def encode(batch):
+            if pool is not None:
+                return model.encode_multi_process(batch, pool, batch_size=self.encode_batch_size)
+            return model.encode(batch, batch_size=self.encode_batch_size)
+        
+        if self.embedding_cache is None:
+            return encode(sentences)
+        return self.embedding_cache.encode(sentences, encode)
+    
+    def encode_pooled(self, sentences: List[Tuple[int, int, int]], texts: List[str],
+                      pooling: str = 'mean') -> np.ndarray:
+        """Encode (doc_id, start_char, end_char) sentences and pool them per document.
+
+        Sentences from all documents are sorted by length and encoded in
+        fixed-size windows, which keeps padding low; each window is folded
+        into a running sum and count (or running max) per document, so memory
+        stays constant however many sentences there are.
+        """
+        order = sorted(range(len(sentences)), key=lambda i: sentences[i][2] - sentences[i][1])
+        pooled = None
+        counts = np.zeros(len(texts), dtype=np.int64)
+        
+        # Only large requests are worth the pool's inter-process overhead; give each process a full window
+        pool = self.encode_pool if len(sentences) >= ENCODE_POOL_MIN_SENTENCES else None
+        window_size = self.encode_window * (len(pool['processes']) if pool else 1)
+        
+        for start in range(0, len(order), window_size):
+            window = [sentences[i] for i in order[start:start + window_size]]
+            batch = np.asarray(self.encode_sentences([texts[d][s:e] for d, s, e in window], pool), dtype=np.float32)
+            doc_ids = np.array([d for d, _, _ in window])
+            
+            if pooled is None:
+                fill = -np.inf if pooling == 'max' else 0.0
+                pooled = np.full((len(texts), batch.shape[1]), fill, dtype=np.float32)
+            
+            if pooling == 'max':
+                np.maximum.at(pooled, doc_ids, batch)
+            else:
+                np.add.at(pooled, doc_ids, batch)
+            np.add.at(counts, doc_ids, 1)
         
-        self.vector_size = 100
+        if pooling != 'max':
+            pooled /= np.maximum(counts, 1)[:, None]
+        return pooled
     
     def preprocess_text(self, text: str) -> str:
         """Preprocess text for better embedding quality"""
@@ -47,12 +157,13 @@ class EnhancedDocEmbeddingAnalyzer:
         text = text.replace('΄', "'").replace('΅', '"')
         return text
     
-    def extract_text_features(self, text: str) -> Dict[str, Any]:
-        """Extract various text features"""
-        doc = self.nlp(text)
+    def extract_text_features(self, text: str, doc=None) -> Dict[str, Any]:
+        """Extract various text features (reuses ``doc`` when already parsed)"""
+        if doc is None:
+            doc = self.nlp(text)
         
         words = [token.text for token in doc if token.is_alpha]
-        sentences = list(doc.sents)
+        sentences = self.nlp.sentences(doc)
         
         readability_score = 0
         if len(words) > 0 and len(sentences) > 0:
@@ -72,27 +183,71 @@ class EnhancedDocEmbeddingAnalyzer:
         
         return {
             'word_count': len([token for token in doc if not token.is_punct and not token.is_space]),
-            'sentence_count': len(list(doc.sents)),
+            'sentence_count': len(sentences),
             'avg_word_length': np.mean([len(token.text) for token in doc if not token.is_punct]) if len([token for token in doc if not token.is_punct]) > 0 else 0,
             'readability_score': readability_score,
             'lexical_diversity': len(set(token.text.lower() for token in doc if token.is_alpha)) / max(1, len([token for token in doc if token.is_alpha])),
             'pos_distribution': dict(Counter([token.pos_ for token in doc if not token.is_punct]))
         }
     
-    def create_embeddings(self, texts: Dict[str, str]) -> Dict[str, np.ndarray]:
-        """Create sentence transformer embeddings - clean and simple"""
-        embeddings = {}
+    def create_embeddings(self, texts: Dict[str, str], docs: Optional[Dict[str, Any]] = None,
+                          pooling: str = 'mean', max_sentences: Optional[int] = None) -> Dict[str, np.ndarray]:
+        """Create sentence transformer embeddings - clean and simple.
+
+        Every sentence is encoded (``max_sentences`` restores a per-document
+        cap) and pooled per document with ``pooling`` ('mean' or 'max').
+        """
+        docs = docs or {}
+        
+        # Gather sentence offsets of every document so they can be encoded together
+        filenames = []
+        doc_texts = []
+        sentences = []
         
         for filename, text in texts.items():
             # Process full text, no artificial balancing
-            sentences = [sent.text for sent in self.nlp(text).sents if len(sent.text.strip()) > 10]
+            doc = docs.get(filename)
+            if doc is None:
+                doc = self.nlp(text)
+            # Sentencizer boundaries even when the Doc comes from the shared full parse
+            doc_sentences = [(start, end) for start, end in self.nlp.sentences(doc)
+                             if len(doc.text[start:end].strip()) > 10]
             
-            if sentences:
-                # Use all sentences for accurate representation
-                embeddings_array = self.sentence_model.encode(sentences[:100])  # Cap at 100 sentences for memory
-                embeddings[filename] = np.mean(embeddings_array, axis=0)
+            if doc_sentences:
+                doc_id = len(filenames)
+                sentences.extend((doc_id, start, end) for start, end in doc_sentences[:max_sentences])
+                filenames.append(filename)
+                doc_texts.append(doc.text)
+        
+        if not sentences:
+            return {}
+        
+        pooled = self.encode_pooled(sentences, doc_texts, pooling)
+        return {filename: pooled[i] for i, filename in enumerate(filenames)}
+    
+    def create_doc2vec_embeddings(self, texts: Dict[str, str],
+                                  docs: Optional[Dict[str, Any]] = None) -> Dict[str, np.ndarray]:
+        """Embed whole documents with the persistent Doc2Vec model"""
+        from app.models.doc2vec_backend import get_doc2vec_backend
+        docs = docs or {}
         
-        return embeddings
+        tokenized = {}
+        for filename, text in texts.items():
+            doc = docs.get(filename)
+            if doc is None:
+                doc = self.nlp(text)
+            tokenized[filename] = [token.lower_ for token in doc
+                                   if not token.is_punct and not token.is_space]
+        
+        return get_doc2vec_backend().infer(tokenized)
+    
+    def embedding_space(self, embedding_type: str = 'sentence_transformer', pooling: str = 'mean') -> str:
+        """Name of the vector space document embeddings live in; vectors from different spaces are not comparable"""
+        if embedding_type == 'doc2vec':
+            from app.models.doc2vec_backend import get_doc2vec_backend
+            return f'doc2vec-{get_doc2vec_backend().version}'
+        self.sentence_model  # sets sentence_model_name
+        return self.sentence_model_name if pooling == 'mean' else f'{self.sentence_model_name}-{pooling}'
     
     def reduce_dimensions(self, embeddings: np.ndarray, method: str = 'pca', n_components: int = 2) -> np.ndarray:
         """Reduce dimensions using various methods"""
@@ -103,20 +258,8 @@ class EnhancedDocEmbeddingAnalyzer:
         max_components = max(2, max_components)
         
         try:
-            if method == 'pca':
-                reducer = PCA(n_components=max_components)
-            elif method == 'tsne':
-                perplexity = min(30, max(5, len(embeddings)-1))
-                reducer = TSNE(n_components=max_components, perplexity=perplexity, random_state=42)
-            elif method == 'umap':
-                if not UMAP_AVAILABLE:
-                    reducer = PCA(n_components=max_components)
-                else:
-                    reducer = umap.UMAP(n_components=max_components, random_state=42)
-            else:
-                reducer = PCA(n_components=max_components)
-            
-            result = reducer.fit_transform(embeddings)
+            # Solver, PCA pre-reduction and t-SNE/UMAP parameters are picked from the corpus size
+            result = reduce_matrix(embeddings, method, max_components)
             
             if result.shape[1] == 1:
                 result = np.column_stack([result, np.zeros(len(result))])
@@ -297,8 +440,40 @@ class EnhancedDocEmbeddingAnalyzer:
         
         return fig
     
-    def create_similarity_heatmap(self, embedding_matrix: np.ndarray, filenames: List[str]) -> go.Figure:
+    def top_k_similarity(self, embedding_matrix: np.ndarray, k: int = None,
+                         block_size: int = None) -> sparse.csr_matrix:
+        """Cosine similarity to each document's k nearest neighbours, as a sparse matrix.
+
+        Similarities are computed one block of rows at a time, so memory is
+        bounded by ``block_size`` x N rather than N x N.
+        """
+        k = k or self.similarity_top_k
+        block_size = block_size or self.similarity_block_size
+        n = len(embedding_matrix)
+        k = min(k, n - 1)
+        
+        norms = np.linalg.norm(embedding_matrix, axis=1, keepdims=True)
+        normalized = (embedding_matrix / np.maximum(norms, 1e-12)).astype(np.float32)
+        
+        rows, cols, values = [], [], []
+        for start in range(0, n, block_size):
+            block = normalized[start:start + block_size] @ normalized.T
+            block_rows = np.arange(start, start + len(block))
+            block[block_rows - start, block_rows] = -np.inf  # exclude self-similarity
+            
+            neighbours = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            rows.append(np.repeat(block_rows, k))
+            cols.append(neighbours.ravel())
+            values.append(np.take_along_axis(block, neighbours, axis=1).ravel())
+        
+        return sparse.csr_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))),
+                                 shape=(n, n))
+    
+    def create_similarity_heatmap(self, embedding_matrix: np.ndarray, filenames: List[str],
+                                  clusters: Optional[np.ndarray] = None) -> go.Figure:
         """Create clean similarity heatmap"""
+        if len(filenames) > self.similarity_dense_limit:
+            return self.create_aggregated_similarity_heatmap(embedding_matrix, filenames, clusters)
         
         # Calculate cosine similarity
         from sklearn.metrics.pairwise import cosine_similarity
@@ -347,25 +522,118 @@ class EnhancedDocEmbeddingAnalyzer:
         
         return fig
     
+    def create_aggregated_similarity_heatmap(self, embedding_matrix: np.ndarray, filenames: List[str],
+                                             clusters: Optional[np.ndarray] = None) -> go.Figure:
+        """Heatmap of top-k similarities for large corpora, grouped to at most heatmap_max_cells per axis.
+
+        Documents are ordered by cluster and split into contiguous groups
+        (never spanning two clusters); each cell shows the mean similarity of
+        the top-k links between two groups.
+        """
+        n = len(filenames)
+        if clusters is None:
+            clusters = np.zeros(n, dtype=int)
+        
+        # A link counts in both directions. Union the two patterns explicitly:
+        # maximum() against the implicit zeros would clip negative similarities
+        similarity = self.top_k_similarity(embedding_matrix)
+        links = similarity.copy()
+        links.data = np.ones_like(links.data)
+        similarity = (similarity + similarity.T - similarity.multiply(links.T)).tocsr()
+        links = ((links + links.T) > 0).astype(np.float64).tocsr()
+        
+        # Give each cluster a share of the cells proportional to its size
+        cells = min(self.heatmap_max_cells, n)
+        groups, labels = [], []
+        for cluster in np.unique(clusters):
+            members = np.flatnonzero(clusters == cluster)
+            share = max(1, round(cells * len(members) / n))
+            for part in np.array_split(members, min(share, len(members))):
+                groups.append(part)
+                first, last = filenames[part[0]], filenames[part[-1]]
+                span = first if len(part) == 1 else f"{first} … {last} ({len(part)})"
+                labels.append(f"C{cluster}·{len(labels) + 1}: {span}")
+        
+        # Sum and count the links between groups through a document-to-group indicator matrix
+        group_of = np.empty(n, dtype=int)
+        for g, part in enumerate(groups):
+            group_of[part] = g
+        indicator = sparse.csr_matrix((np.ones(n), (np.arange(n), group_of)), shape=(n, len(groups)))
+        
+        totals = (indicator.T @ similarity @ indicator).toarray()
+        counts = (indicator.T @ links @ indicator).toarray()
+        z = np.divide(totals, counts, out=np.full_like(totals, np.nan), where=counts > 0)
+        
+        fig = go.Figure(data=go.Heatmap(
+            z=z,
+            x=labels,
+            y=labels,
+            colorscale='Blues',
+            customdata=counts.astype(int),
+            hovertemplate='<b>%{y}</b> ↔ <b>%{x}</b><br>Mean similarity: %{z:.3f}<br>Links: %{customdata}<extra></extra>',
+            colorbar=dict(
+                title='Similarity',
+                tickmode='linear',
+                tick0=0,
+                dtick=0.2
+            )
+        ))
+        
+        fig.update_layout(
+            title={
+                'text': f'Document Similarity ({n} documents, top {self.similarity_top_k} neighbours)',
+                'x': 0.5,
+                'xanchor': 'center',
+                'font': {'size': 18, 'color': '#2c3e50'}
+            },
+            height=700,
+            plot_bgcolor='white',
+            paper_bgcolor='white',
+            margin=dict(l=100, r=120, t=80, b=100)
+        )
+        
+        fig.update_xaxes(tickangle=45, showticklabels=len(labels) <= 40)
+        fig.update_yaxes(showticklabels=len(labels) <= 40)
+        
+        return fig
+    
     def create_comprehensive_visualization(self, texts: Dict[str, str], 
                                          embedding_type: str = 'sentence_transformer',
-                                         reduction_method: str = 'pca') -> Dict[str, Any]:
-        """Create comprehensive visualization with clean, separated plots"""
+                                         reduction_method: str = 'pca',
+                                         docs: Optional[Dict[str, Any]] = None,
+                                         pooling: str = 'mean',
+                                         embeddings_path: Optional[str] = None) -> Dict[str, Any]:
+        """Create comprehensive visualization with clean, separated plots.
+
+        With ``embeddings_path`` the document vectors are saved there as .npy
+        and the result carries a reference instead of float lists.
+        """
+        docs = docs or {}
         
         # Extract features
-        features = {filename: self.extract_text_features(text) for filename, text in texts.items()}
+        features = {filename: self.extract_text_features(text, docs.get(filename))
+                    for filename, text in texts.items()}
         
         # Create embeddings (simplified - no artificial balancing)
-        embeddings = self.create_embeddings(texts)
+        if embedding_type == 'doc2vec':
+            embeddings = self.create_doc2vec_embeddings(texts, docs)
+        else:
+            embeddings = self.create_embeddings(texts, docs, pooling=pooling)
         
         if not embeddings:
             return {'error': 'No embeddings could be created'}
         
         filenames = list(embeddings.keys())
         embedding_matrix = np.array([embeddings[fname] for fname in filenames])
+        space = self.embedding_space(embedding_type, pooling)
         
-        # Reduce dimensions
-        coords = self.reduce_dimensions(embedding_matrix, reduction_method)
+        # Project into the fitted reference space when there is one, so maps are comparable
+        coords = None
+        if reduction_method in REFERENCE_METHODS:
+            coords = get_reference_space(space, reduction_method).transform(embedding_matrix)
+        projection = 'fit' if coords is None else 'reference'
+        if coords is None:
+            coords = self.reduce_dimensions(embedding_matrix, reduction_method)
         
         # Cluster documents
         clusters = self.cluster_embeddings(embedding_matrix)
@@ -373,15 +641,24 @@ class EnhancedDocEmbeddingAnalyzer:
         # Create three separate, clean visualizations
         scatter_plot = self.create_main_scatter_plot(coords, filenames, clusters, features)
         features_chart = self.create_features_chart(filenames, features)
-        similarity_heatmap = self.create_similarity_heatmap(embedding_matrix, filenames)
+        similarity_heatmap = self.create_similarity_heatmap(embedding_matrix, filenames, clusters)
+        
+        if embeddings_path:
+            embeddings_output = save_embeddings(embeddings_path, filenames, embedding_matrix, space)
+        else:
+            embeddings_output = {fname: emb.tolist() for fname, emb in embeddings.items()}
         
         # Return as parsed dicts, not JSON strings
-        return {
+        result = {
             'scatter_plot': json.loads(scatter_plot.to_json()),
             'features_chart': json.loads(features_chart.to_json()),
             'similarity_heatmap': json.loads(similarity_heatmap.to_json()),
-            'embeddings': {fname: emb.tolist() for fname, emb in embeddings.items()},
+            'embeddings': embeddings_output,
             'features': features,
             'clusters': {fname: int(cluster) for fname, cluster in zip(filenames, clusters)},
-            'filenames': filenames
-        }
\ No newline at end of file
+            'filenames': filenames,
+            'projection': projection
+        }
+        if projection == 'fit' and reduction_method == 'umap' and not UMAP_AVAILABLE:
+            result['fallback'] = 'pca'  # umap-learn is not installed
+        return result
\ No newline at end of file
@@ -0,0 +1,360 @@
+# app/models/document_index.py
+"""Persistent FAISS index of document embeddings for "more like this" search.
+
+Vectors are L2-normalised so inner product equals cosine similarity. Every
+document is stored under a string key - a hash of its text, so analysing
+the same text again replaces the entry instead of duplicating it - which
+maps to a numeric FAISS id. Sources (``<analysis_id>/<filename>``) map to
+the key their text hashed to. Keys, sources and metadata live in a JSON
+sidecar next to the index file.
+
+Three index types are supported (``NATS_INDEX_TYPE``):
+
+* ``flat`` - exact search, ``IndexIDMap2`` over ``IndexFlatIP``
+* ``ivf`` - starts flat and switches to ``IndexIVFFlat`` once there are
+  enough vectors to train the coarse quantizer
+* ``hnsw`` - ``IndexHNSWFlat``; HNSW cannot delete, so removals are
+  tombstoned and the graph is rebuilt when too many accumulate
+
+Each worker process holds the index in memory. Changes are recorded as
+pending operations and written out by snapshots under a file lock - after
+each analysis and from a background timer;
+a snapshot first reloads whatever other workers wrote, then replays its own
+pending operations, so workers converge on the same collection.
+"""
+import atexit
+import fcntl
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+INDEX_DIR = os.environ.get('NATS_INDEX_DIR', os.path.join('cache', 'index'))
+INDEX_TYPE = os.environ.get('NATS_INDEX_TYPE', 'flat')
+INDEX_NLIST = int(os.environ.get('NATS_INDEX_NLIST', '256'))
+INDEX_SNAPSHOT_SECONDS = float(os.environ.get('NATS_INDEX_SNAPSHOT_SECONDS', '60'))
+
+# Vectors per IVF list needed before the quantizer is trained (FAISS warns below 39)
+_IVF_POINTS_PER_LIST = 39
+# Rebuild an HNSW graph once this fraction of its vectors are tombstones
+_HNSW_MAX_TOMBSTONES = 0.2
+
+
+def content_key(text: str) -> str:
+    """Index key of a document: identical texts share one entry"""
+    return 'sha1:' + hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class DocumentIndex:
+    """Add, remove and search document vectors by key, persisted to ``directory``"""
+
+    def __init__(self, directory: str, index_type: str = INDEX_TYPE, nlist: int = INDEX_NLIST,
+                 nprobe: int = 16, hnsw_m: int = 32, snapshot_interval: float = INDEX_SNAPSHOT_SECONDS):
+        if not FAISS_AVAILABLE:
+            raise ImportError('faiss is required for the document index (pip install faiss-cpu)')
+        if index_type not in ('flat', 'ivf', 'hnsw'):
+            raise ValueError(f'Unknown index type: {index_type}')
+
+        self.directory = directory
+        self.index_type = index_type
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.hnsw_m = hnsw_m
+        self.snapshot_interval = snapshot_interval
+
+        self._index_path = os.path.join(directory, 'index.faiss')
+        self._meta_path = os.path.join(directory, 'meta.json')
+        self._lock_path = os.path.join(directory, '.lock')
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock = threading.RLock()
+        self._pending = []
+        self._last_snapshot = time.time()
+        self._flusher = None
+        self._reset()
+        self._load()
+
+    # --- state ---
+
+    def _reset(self):
+        self.index = None
+        self.kind = None
+        self.dim = None
+        self.next_id = 0
+        self.ids: Dict[str, int] = {}
+        self.sources: Dict[str, str] = {}  # '<analysis_id>/<filename>' -> key
+        self.metadata: Dict[int, Dict[str, Any]] = {}
+        self.tombstones = set()
+        self._loaded_mtime = None
+
+    def _new_index(self, dim: int):
+        if self.index_type == 'hnsw':
+            self.kind = 'hnsw'
+            self.index = faiss.IndexIDMap2(faiss.IndexHNSWFlat(dim, self.hnsw_m, faiss.METRIC_INNER_PRODUCT))
+        else:
+            # IVF collections start flat until there is enough data to train on
+            self.kind = 'flat'
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        self.dim = dim
+
+    def _live_vectors(self):
+        """(ids, vectors) of every key still in the collection"""
+        ids = np.array(sorted(self.metadata), dtype=np.int64)
+        vectors = np.vstack([self.index.reconstruct(int(i)) for i in ids]) if len(ids) else \
+            np.zeros((0, self.dim), dtype=np.float32)
+        return ids, vectors
+
+    def _train_ivf(self):
+        ids, vectors = self._live_vectors()
+        quantizer = faiss.IndexFlatIP(self.dim)
+        index = faiss.IndexIVFFlat(quantizer, self.dim, self.nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        # A hashtable direct map lets IVF reconstruct and remove by id
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+        index.add_with_ids(vectors, ids)
+        index.nprobe = self.nprobe
+        self.index = index
+        self.kind = 'ivf'
+        print(f"Document index switched to IVF with {self.nlist} lists ({len(ids)} vectors)")
+
+    def _rebuild_hnsw(self):
+        ids, vectors = self._live_vectors()
+        index = faiss.IndexIDMap2(faiss.IndexHNSWFlat(self.dim, self.hnsw_m, faiss.METRIC_INNER_PRODUCT))
+        if len(ids):
+            index.add_with_ids(vectors, ids)
+        self.index = index
+        self.tombstones = set()
+
+    def _apply_add(self, key: str, vector: np.ndarray, metadata: Dict[str, Any], source: Optional[str] = None):
+        if source is not None:
+            self.sources[source] = key
+        if key in self.ids:
+            self._drop(key)
+        if self.index is None:
+            self._new_index(vector.shape[1])
+
+        doc_id = self.next_id
+        self.next_id += 1
+        self.index.add_with_ids(vector, np.array([doc_id], dtype=np.int64))
+        self.ids[key] = doc_id
+        self.metadata[doc_id] = dict(metadata, key=key)
+
+        if self.index_type == 'ivf' and self.kind == 'flat' and \
+                len(self.ids) >= self.nlist * _IVF_POINTS_PER_LIST:
+            self._train_ivf()
+
+    def _apply_remove(self, key: str) -> bool:
+        self.sources = {source: target for source, target in self.sources.items() if target != key}
+        return self._drop(key)
+
+    def _drop(self, key: str) -> bool:
+        doc_id = self.ids.pop(key, None)
+        if doc_id is None:
+            return False
+        del self.metadata[doc_id]
+        if self.kind == 'hnsw':
+            self.tombstones.add(doc_id)
+        else:
+            self.index.remove_ids(np.array([doc_id], dtype=np.int64))
+        return True
+
+    # --- persistence ---
+
+    def _load(self, locked: bool = False):
+        """Replace the in-memory state with the last snapshot on disk"""
+        self._reset()
+        if not os.path.exists(self._meta_path):
+            return
+        if not locked:
+            with open(self._lock_path, 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_SH)
+                return self._load(locked=True)
+
+        with open(self._meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta['dim'] is not None:
+            self.index = faiss.read_index(self._index_path)
+        self._loaded_mtime = os.path.getmtime(self._meta_path)
+
+        self.kind = meta['kind']
+        self.dim = meta['dim']
+        self.next_id = meta['next_id']
+        self.ids = meta['ids']
+        self.sources = meta.get('sources', {})
+        self.metadata = {int(doc_id): info for doc_id, info in meta['metadata'].items()}
+        self.tombstones = set(meta['tombstones'])
+        if self.kind == 'ivf':
+            self.index.nprobe = self.nprobe
+
+    def _sync(self, locked: bool = False):
+        """Pick up a snapshot written by another worker, keeping our unsaved changes"""
+        try:
+            mtime = os.path.getmtime(self._meta_path)
+        except OSError:
+            return
+        if mtime != self._loaded_mtime:
+            self._load(locked)
+            for op in self._pending:
+                if op[0] == 'add':
+                    self._apply_add(*op[1:])
+                else:
+                    self._apply_remove(op[1])
+
+    def _write(self, path: str, write_fn):
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        write_fn(tmp_path)
+        os.replace(tmp_path, path)
+
+    def snapshot(self):
+        """Write the index and its sidecar to disk, merging other workers' snapshots first"""
+        with self._lock:
+            if not self._pending and os.path.exists(self._meta_path):
+                self._last_snapshot = time.time()
+                return
+
+            with open(self._lock_path, 'w') as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                self._sync(locked=True)
+
+                if self.kind == 'hnsw' and self.tombstones and \
+                        len(self.tombstones) > _HNSW_MAX_TOMBSTONES * self.index.ntotal:
+                    self._rebuild_hnsw()
+
+                meta = {
+                    'kind': self.kind,
+                    'dim': self.dim,
+                    'next_id': self.next_id,
+                    'ids': self.ids,
+                    'sources': self.sources,
+                    'metadata': self.metadata,
+                    'tombstones': sorted(self.tombstones)
+                }
+                if self.index is not None:
+                    self._write(self._index_path, lambda path: faiss.write_index(self.index, path))
+
+                def write_meta(path):
+                    with open(path, 'w', encoding='utf-8') as f:
+                        json.dump(meta, f, ensure_ascii=False)
+                self._write(self._meta_path, write_meta)
+                self._loaded_mtime = os.path.getmtime(self._meta_path)
+
+            self._pending = []
+            self._last_snapshot = time.time()
+
+    def maybe_snapshot(self):
+        if time.time() - self._last_snapshot >= self.snapshot_interval:
+            self.snapshot()
+
+    def start_flusher(self):
+        """Snapshot pending changes every snapshot_interval seconds from a daemon thread"""
+        def flush_forever():
+            while True:
+                time.sleep(self.snapshot_interval)
+                try:
+                    if self._pending:
+                        self.snapshot()
+                except Exception as e:
+                    print(f"Document index snapshot failed: {e}")
+
+        if self._flusher is None:
+            self._flusher = threading.Thread(target=flush_forever, name='index-flusher', daemon=True)
+            self._flusher.start()
+
+    # --- public API ---
+
+    def add(self, key: str, vector, metadata: Optional[Dict[str, Any]] = None, source: Optional[str] = None):
+        """Add or replace the vector stored under ``key``, optionally reachable from ``source``"""
+        vector = _normalize(vector)
+        metadata = metadata or {}
+        with self._lock:
+            if self.dim is not None and vector.shape[1] != self.dim:
+                raise ValueError(f'Vector dimension {vector.shape[1]} does not match index dimension {self.dim}')
+            self._apply_add(key, vector, metadata, source)
+            self._pending.append(('add', key, vector, metadata, source))
+        self.maybe_snapshot()
+
+    def remove(self, key: str) -> bool:
+        with self._lock:
+            removed = self._apply_remove(key)
+            if removed:
+                self._pending.append(('remove', key))
+        self.maybe_snapshot()
+        return removed
+
+    def resolve(self, source: str) -> Optional[str]:
+        """Key of the document stored for ``source``"""
+        with self._lock:
+            self._sync()
+            return self.sources.get(source)
+
+    def get_vector(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            self._sync()
+            if key not in self.ids:
+                return None
+            return self.index.reconstruct(self.ids[key])
+
+    def search(self, vector, k: int = 10, exclude: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """The ``k`` nearest documents by cosine similarity, best first"""
+        vector = _normalize(vector)
+        exclude = set(exclude or [])
+        with self._lock:
+            self._sync()
+            if self.index is None or not self.ids:
+                return []
+
+            fetch = min(k + len(self.tombstones) + len(exclude), self.index.ntotal)
+            scores, doc_ids = self.index.search(vector, fetch)
+
+            results = []
+            for score, doc_id in zip(scores[0], doc_ids[0]):
+                info = self.metadata.get(int(doc_id))
+                if info is None or info['key'] in exclude:
+                    continue  # padding (-1), tombstone or excluded
+                results.append(dict(info, score=float(score)))
+                if len(results) == k:
+                    break
+            return results
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'documents': len(self.ids),
+            'kind': self.kind,
+            'dim': self.dim,
+            'tombstones': len(self.tombstones),
+            'pending': len(self._pending)
+        }
+
+
+_indexes: Dict[str, DocumentIndex] = {}
+
+
+def get_document_index(space: str) -> DocumentIndex:
+    """Process-wide index for one embedding space (e.g. a sentence model name)"""
+    if space not in _indexes:
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', space)
+        index = DocumentIndex(os.path.join(INDEX_DIR, slug))
+        index.start_flusher()
+        atexit.register(index.snapshot)
+        _indexes[space] = index
+    return _indexes[space]
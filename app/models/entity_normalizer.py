@@ -0,0 +1,239 @@
+# app/models/entity_normalizer.py
+"""Canonicalization of entity names: aliases, exact rule/lemma keys, then blocked fuzzy matching.
+
+Without rules, the result is identical to comparing every entity with every earlier
+canonical form of the same type and taking the first whose
+``SequenceMatcher`` ratio (on lowercased text) reaches the threshold. Only a
+few candidates are actually scored:
+
+1. Blocking - canonical forms are indexed per entity type by their
+   lowercase character bigrams. If two strings share no bigram, every
+   matching block is a single character and consecutive matches must be
+   separated by a gap in one string or the other. That gives
+   ``ratio <= 2/3 + 2/(3L)`` with ``L`` the combined length, so for
+   ``threshold > 2/3`` only pairs with ``L <= 2/(3*threshold - 2)`` can match
+   without a shared bigram; those short forms are scanned by length.
+   Below 2/3 the bound is useless and the whole type block is scanned.
+2. Pruning - the length bound (``real_quick_ratio``) and the character
+   multiset bound (``quick_ratio``) discard candidates cheaply.
+3. Scoring - ``ratio`` runs on the survivors in insertion order, and the
+   first one that reaches the threshold wins.
+
+Two cheaper stages run before the fuzzy match:
+
+* With an alias store, surface forms seen in earlier documents resolve to
+  their recorded canonical with a dictionary lookup, and the mappings
+  found here are recorded for next time.
+* With ``rules=True``, each name gets exact keys - the Greek declension
+  rules of ``normalize_greek_entity`` and the spaCy lemma, both
+  accent-stripped and lowercased - and a name whose key is already taken
+  by a canonical form of its type maps there with a hash lookup.
+"""
+from collections import defaultdict
+from difflib import SequenceMatcher
+from typing import Dict, List, Optional, Set, Tuple
+import math
+import unicodedata
+
+from app.utils.alias_store import AliasStore
+
+
+def remove_greek_accents(text):
+    """Remove Greek accent marks for better matching"""
+    # Decompose characters and remove combining marks
+    nfd = unicodedata.normalize('NFD', text)
+    return ''.join(char for char in nfd if unicodedata.category(char) != 'Mn')
+
+def normalize_greek_entity(text, entity_type):
+    """Comprehensive Greek entity normalization using rules and lemmatization"""
+    text = text.strip()
+    
+    # Apply Greek-specific rules based on entity type
+    if entity_type == 'PERSON' and len(text) > 4:
+        # Normalize person names to masculine nominative
+        if text.endswith('άκη'):
+            text = text[:-1] + 'ης'  # Νικολάκη -> Νικολάκης
+        elif text.endswith('ίκη'):
+            text = text[:-1] + 'ης'  # Γιωργίκη -> Γιωργίκης
+        elif text.endswith('ου'):
+            text = text[:-2] + 'ος'  # Γιώργου → Γιώργος
+        elif text.endswith('ο') and not text.endswith('ιο'):
+            text = text[:-1] + 'ος'  # Γιώργο → Γιώργος
+        elif text.endswith('ε') and len(text) > 5:
+            text = text[:-1] + 'ος'  # Γιώργε → Γιώργος
+    
+    elif entity_type in ['LOC', 'GPE'] and len(text) > 5:
+        # Normalize place names
+        if text.endswith('ης'):
+            text = text[:-1]  # Φρανκφούρτης → Φρανκφούρτη
+        elif text.endswith('ου'):
+            text = text[:-2] + 'η'  # Αθήνου → Αθήνη
+    
+    return text
+
+
+def canonical_keys(entity: str, entity_type: str, lemma: Optional[str] = None) -> List[str]:
+    """Exact-match keys of a name: its rule-normalized form and its lemma, accent-stripped and lowercased"""
+    keys = [remove_greek_accents(normalize_greek_entity(entity, entity_type)).lower()]
+    if lemma and lemma.strip():
+        key = remove_greek_accents(lemma.strip()).lower()
+        if key != keys[0]:
+            keys.append(key)
+    return keys
+
+
+def _bigrams(text: str) -> Set[str]:
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class _TypeBlock:
+    """Canonical forms of one entity type with their bigram and length indexes"""
+
+    def __init__(self):
+        self.lowered: Dict[str, str] = {}
+        self.by_bigram: Dict[str, Set[str]] = defaultdict(set)
+        self.by_length: Dict[int, Set[str]] = defaultdict(set)
+
+    def add(self, canonical: str):
+        lowered = canonical.lower()
+        self.lowered[canonical] = lowered
+        for bigram in _bigrams(lowered):
+            self.by_bigram[bigram].add(canonical)
+        self.by_length[len(lowered)].add(canonical)
+
+    def remove(self, canonical: str):
+        lowered = self.lowered.pop(canonical)
+        for bigram in _bigrams(lowered):
+            self.by_bigram[bigram].discard(canonical)
+        self.by_length[len(lowered)].discard(canonical)
+
+
+class EntityNormalizer:
+    """Incrementally map entity names onto canonical forms"""
+
+    def __init__(self, similarity_threshold: float = 0.85, aliases: Optional[AliasStore] = None,
+                 rules: bool = False):
+        self.similarity_threshold = similarity_threshold
+        self.aliases = aliases
+        self.rules = rules
+        self._keys: Dict[Tuple[str, str], str] = {}  # (type, exact key) -> canonical
+        self.normalized: Dict[str, str] = {}  # canonical -> entity type, in insertion order
+        self.entity_map: Dict[str, str] = {}  # cleaned entity -> canonical
+        self._order: Dict[str, int] = {}
+        self._blocks: Dict[str, _TypeBlock] = defaultdict(_TypeBlock)
+
+        # Combined length up to which a match may share no bigram (see module docstring)
+        if similarity_threshold > 2 / 3:
+            # The epsilon keeps float error from rounding an exact bound down (0.8 -> 4.999...)
+            self._max_unindexed_length = math.floor(2 / (3 * similarity_threshold - 2) + 1e-9)
+        else:
+            self._max_unindexed_length = None
+
+    def _candidates(self, lowered: str, block: _TypeBlock) -> List[str]:
+        if self._max_unindexed_length is None:
+            return list(block.lowered)
+
+        candidates = set()
+        for bigram in _bigrams(lowered):
+            candidates.update(block.by_bigram.get(bigram, ()))
+        for length in range(1, self._max_unindexed_length - len(lowered) + 1):
+            candidates.update(block.by_length.get(length, ()))
+        return list(candidates)
+
+    def find(self, entity: str, entity_type: str) -> Optional[str]:
+        """The earliest canonical form of the same type similar enough to ``entity``, or None"""
+        block = self._blocks.get(entity_type)
+        if block is None:
+            return None
+
+        threshold = self.similarity_threshold
+        lowered = entity.lower()
+        matcher = SequenceMatcher(None, lowered)
+        for canonical in sorted(self._candidates(lowered, block), key=self._order.__getitem__):
+            other = block.lowered[canonical]
+            # Same formula as real_quick_ratio, without building the matcher
+            if 2.0 * min(len(lowered), len(other)) / (len(lowered) + len(other)) < threshold:
+                continue
+            matcher.set_seq2(other)
+            if matcher.quick_ratio() >= threshold and matcher.ratio() >= threshold:
+                return canonical
+        return None
+
+    def _find_by_key(self, keys: List[str], entity_type: str) -> Optional[str]:
+        for key in keys:
+            canonical = self._keys.get((entity_type, key))
+            if canonical is not None and self.normalized.get(canonical) == entity_type:
+                return canonical
+        return None
+
+    def add(self, entity: str, entity_type: str, lemma: Optional[str] = None) -> str:
+        """Map one entity and return its canonical form (None for blank names)"""
+        entity_clean = entity.strip()
+        if not entity_clean:
+            return None
+
+        canonical = self._resolve(entity_clean, entity_type, lemma)
+        self.entity_map[entity_clean] = canonical
+        return canonical
+
+    def _resolve(self, entity_clean: str, entity_type: str, lemma: Optional[str]) -> str:
+        keys = canonical_keys(entity_clean, entity_type, lemma) if self.rules else []
+
+        # Known alias from an earlier document: its canonical joins this result as is
+        alias = self.aliases.lookup(entity_clean, entity_type) if self.aliases is not None else None
+        if alias is not None and self.normalized.get(alias, entity_type) == entity_type:
+            if alias not in self.normalized:
+                self._add_canonical(alias, entity_type)
+                self._register_keys(canonical_keys(alias, entity_type) if self.rules else [], entity_type, alias)
+            self._register_keys(keys, entity_type, alias)
+            return alias
+
+        canonical = self._find_by_key(keys, entity_type) or self.find(entity_clean, entity_type)
+        if canonical is None:
+            canonical = entity_clean
+            self._add_canonical(canonical, entity_type)
+        self._register_keys(keys, entity_type, canonical)
+        return canonical
+
+    def _register_keys(self, keys: List[str], entity_type: str, canonical: str):
+        for key in keys:
+            self._keys.setdefault((entity_type, key), canonical)
+
+    def _add_canonical(self, canonical: str, entity_type: str):
+        # A blank-stripped duplicate of a canonical of another type keeps its
+        # position but changes type
+        previous_type = self.normalized.get(canonical)
+        if previous_type is not None and previous_type != entity_type:
+            self._blocks[previous_type].remove(canonical)
+        if previous_type != entity_type:
+            self._blocks[entity_type].add(canonical)
+        self._order.setdefault(canonical, len(self._order))
+        self.normalized[canonical] = entity_type
+
+    def normalize(self, entities: Dict[str, str],
+                  lemmas: Optional[Dict[str, str]] = None) -> Tuple[Dict[str, str], Dict[str, str]]:
+        """Map every ``{entity: type}``; returns (canonical -> type, entity -> canonical)"""
+        lemmas = lemmas or {}
+        if self.aliases is not None:
+            self.aliases.refresh()  # aliases other workers recorded since our last look
+        learned = []
+        for entity, entity_type in entities.items():
+            canonical = self.add(entity, entity_type, lemmas.get(entity))
+            if canonical is not None:
+                learned.append((entity.strip(), entity_type, canonical))
+
+        if self.aliases is not None:
+            self.aliases.record(learned)
+        return self.normalized, self.entity_map
+
+
+def normalize_entities(entities, similarity_threshold=0.85, aliases=None, lemmas=None, rules=False):
+    """
+    Normalize similar entity names to a canonical form.
+    Handles Greek declensions like Γιώργος/Γιώργου/Γιώργο
+    """
+    if not entities:
+        return entities, {}
+    
+    # Aliases from earlier documents, then exact rule/lemma keys, then blocked fuzzy matching
+    return EntityNormalizer(similarity_threshold, aliases, rules).normalize(entities, lemmas)
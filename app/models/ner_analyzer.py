@@ -1,12 +1,15 @@
-import spacy
 from pyvis.network import Network
-from collections import Counter, defaultdict
+from collections import Counter
 from typing import Dict, Any, List, Tuple
 import os
-import re
 import json
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from app.models.cooccurrence import CooccurrenceMatrix
+from app.models.entity_normalizer import normalize_entities
+from app.utils.nlp_registry import get_pipeline
+from app.utils.alias_store import get_alias_store
+from app.utils.text_chunker import CHUNK_SIZE, doc_to_record, iter_chunk_records, iter_sentence_entities
 
 
 from difflib import SequenceMatcher
@@ -15,60 +18,13 @@ def calculate_similarity(str1, str2):
     """Calculate similarity ratio between two strings"""
     return SequenceMatcher(None, str1.lower(), str2.lower()).ratio()
 
-def normalize_entities(entities, similarity_threshold=0.85):
-    """
-    Normalize similar entity names to a canonical form.
-    Handles Greek declensions like Γιώργος/Γιώργου/Γιώργο
-    """
-    if not entities:
-        return entities, {}
-    
-    normalized = {}
-    entity_map = {}  # Maps original -> normalized
-    canonical_forms = {}  # Tracks the canonical form for each cluster
-    
-    entity_list = list(entities.items())
-    
-    for entity, entity_type in entity_list:
-        # Clean entity text
-        entity_clean = entity.strip()
-        if not entity_clean:
-            continue
-            
-        # Try to find a similar existing entity
-        found_match = False
-        
-        for canonical, norm_type in normalized.items():
-            # Only compare entities of the same type
-            if norm_type != entity_type:
-                continue
-            
-            # Calculate similarity
-            similarity = calculate_similarity(entity_clean, canonical)
-            
-            # If highly similar, map to canonical form
-            if similarity >= similarity_threshold:
-                entity_map[entity_clean] = canonical
-                found_match = True
-                break
-        
-        if not found_match:
-            # This becomes a new canonical form
-            normalized[entity_clean] = entity_type
-            entity_map[entity_clean] = entity_clean
-            canonical_forms[entity_clean] = entity_clean
-    
-    return normalized, entity_map
-
 
 class EnhancedNERAnalyzer:
     def __init__(self):
         """Initialize enhanced NER with better Greek language support"""
-        try:
-            self.nlp = spacy.load('el_core_news_md')
-        except OSError:
-            print("Greek model not available, using English model")
-            self.nlp = spacy.load('en_core_web_sm')
+        self.nlp = get_pipeline()
+        self.window_size = CHUNK_SIZE  # texts longer than this are processed in streaming windows
+        self.aliases = get_alias_store()
         
         # Clean, modern color palette
         self.entity_colors = {
@@ -92,6 +48,7 @@ class EnhancedNERAnalyzer:
             doc = self.nlp(text)
         
         entities = {}
+        lemmas = {}
         # Greek stopwords to filter out
         stopwords = {'και', 'για', 'με', 'σε', 'από', 'στο', 'στη', 'στον', 'στην', 
                     'δεν', 'θα', 'είναι', 'έχει', 'ήταν'}
@@ -103,9 +60,12 @@ class EnhancedNERAnalyzer:
                 ent.text.lower() not in stopwords and
                 not ent.text.isnumeric()):
                 entities[ent.text] = ent.label_
+                if doc.has_annotation('LEMMA'):
+                    lemmas.setdefault(ent.text, ent.lemma_)
         
         # Normalize similar entities (handles Greek declensions)
-        normalized_entities, entity_map = normalize_entities(entities, similarity_threshold=0.85)
+        normalized_entities, entity_map = normalize_entities(entities, similarity_threshold=0.85, aliases=self.aliases,
+                                                             lemmas=lemmas, rules=True)
         
         print(f"Entity normalization: {len(entities)} → {len(normalized_entities)} unique entities")
         
@@ -140,24 +100,58 @@ class EnhancedNERAnalyzer:
         
         return relationships
     
-    def create_network_visualization(self, text: str, output_dir: str = '.') -> Dict[str, Any]:
-        """Create clean network visualization"""
-        doc = self.nlp(text)
-        
-        # Get raw entities first
+    def collect_entities_and_pairs(self, text: str, records) -> Tuple[Dict[str, str], CooccurrenceMatrix, Dict[str, str]]:
+        """Merge entities and sentence co-occurrence counts record by record.
+
+        Only the distinct entity strings, the pair counts and the first
+        sentence of each pair are kept (no incidence rows), so memory grows
+        with the distinct entities and pairs, not with the text; each
+        record's pair counts are folded in as one sparse product. The matrix
+        includes entities later rejected by the filters; callers drop those
+        once the final entity set is known. Lemmas, when the pipeline
+        produces them, are returned for the entities that passed the filters.
+        """
         raw_entities = {}
+        cooccurrence = CooccurrenceMatrix(keep_rows=False)
+        raw_lemmas = {}
         stopwords = {'και', 'για', 'με', 'σε', 'από', 'στο', 'στη', 'στον', 'στην', 
                     'δεν', 'θα', 'είναι', 'έχει', 'ήταν'}
         
-        for ent in doc.ents:
-            if (ent.label_ in self.entity_colors and 
-                len(ent.text.strip()) > 1 and
-                ent.text.lower() not in stopwords and
-                not ent.text.isnumeric()):
-                raw_entities[ent.text] = ent.label_
+        for record in records:
+            lemmas = record.get('lemmas') or [None] * len(record['ents'])
+            for (start, end, label), lemma in zip(record['ents'], lemmas):
+                ent_text = text[start:end]
+                if (label in self.entity_colors and 
+                    len(ent_text.strip()) > 1 and
+                    ent_text.lower() not in stopwords and
+                    not ent_text.isnumeric()):
+                    raw_entities[ent_text] = label
+                    if lemma:
+                        raw_lemmas.setdefault(ent_text, lemma)
+            
+            for start, _, sent_ents in iter_sentence_entities(record):
+                cooccurrence.add_entities([text[ent_start:ent_end] for ent_start, ent_end, _ in sent_ents], key=start)
+            cooccurrence.flush()
         
-        # Normalize entities
-        entities, entity_map = normalize_entities(raw_entities, similarity_threshold=0.85)
+        return raw_entities, cooccurrence, raw_lemmas
+    
+    def create_network_visualization(self, text: str, output_dir: str = '.', doc=None) -> Dict[str, Any]:
+        """Create clean network visualization (reuses ``doc`` when already parsed)"""
+        if doc is not None:
+            records = [doc_to_record(doc)]
+        elif len(text) > self.window_size:
+            # Stream sentence-aligned windows so memory does not grow with the text
+            print(f"Streaming NER over {len(text):,} characters in {self.window_size:,}-character windows")
+            records = iter_chunk_records(self.nlp, text, self.window_size)
+        else:
+            records = [doc_to_record(self.nlp(text))]
+        
+        # Get raw entities and co-occurring pairs first
+        raw_entities, cooccurrence, raw_lemmas = self.collect_entities_and_pairs(text, records)
+        
+        # Normalize entities: declension rules and lemmas first, then fuzzy matching
+        entities, entity_map = normalize_entities(raw_entities, similarity_threshold=0.85, aliases=self.aliases,
+                                                  lemmas=raw_lemmas, rules=True)
         
         if not entities:
             return {'error': 'No entities found in text'}
@@ -166,21 +160,12 @@ class EnhancedNERAnalyzer:
         
         importance = self.calculate_entity_importance(entities)
         
-        # Update relationships to use normalized names
-        relationships = []
-        added = set()
-        
-        for sent in doc.sents:
-            sent_entities = [ent.text for ent in sent.ents if ent.text in raw_entities]
-            # Map to normalized names
-            sent_entities_normalized = [entity_map.get(e, e) for e in sent_entities]
-            
-            for i, ent1 in enumerate(sent_entities_normalized):
-                for ent2 in sent_entities_normalized[i+1:]:
-                    edge = tuple(sorted([ent1, ent2]))
-                    if edge not in added and ent1 in entities and ent2 in entities:
-                        relationships.append(edge)
-                        added.add(edge)
+        # Update relationships to use normalized names, dropping filtered entities
+        canonical_names = list(entities)
+        canonical_columns = {name: i for i, name in enumerate(canonical_names)}
+        mapping = [canonical_columns.get(entity_map.get(name.strip())) if name in raw_entities else None
+                   for name in cooccurrence.names]
+        relationships = [tuple(sorted(pair)) for pair in cooccurrence.merged_pairs(mapping, canonical_names)]
         
         # Create network
         net = Network(
@@ -325,6 +310,6 @@ class EnhancedNERAnalyzer:
             }
         }
     
-    def process_text(self, text: str, output_dir: str = '.') -> Dict[str, Any]:
+    def process_text(self, text: str, output_dir: str = '.', doc=None) -> Dict[str, Any]:
         """Main entry point for processing"""
-        return self.create_network_visualization(text, output_dir)
\ No newline at end of file
+        return self.create_network_visualization(text, output_dir, doc=doc)
\ No newline at end of file
@@ -1,4 +1,3 @@
-import spacy
 from pyvis.network import Network
 import networkx as nx
 from typing import Dict, Any, List, Tuple
@@ -8,6 +7,12 @@ import numpy as np
 from collections import Counter, defaultdict
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+from app.models.cooccurrence import CooccurrenceMatrix
+from app.models.entity_normalizer import normalize_entities
+from app.utils.nlp_registry import get_pipeline
+from app.utils.alias_store import get_alias_store
+from app.utils.entity_matcher import EntityMatcher
+from app.utils.text_chunker import CHUNK_SIZE, doc_to_record, iter_chunk_records
 
 try:
     import community as community_louvain
@@ -16,71 +21,15 @@ except ImportError:
     COMMUNITY_AVAILABLE = False
 
 
-from difflib import SequenceMatcher
-import unicodedata
-
-def remove_greek_accents(text):
-    """Remove Greek accent marks for better matching"""
-    # Decompose characters and remove combining marks
-    nfd = unicodedata.normalize('NFD', text)
-    return ''.join(char for char in nfd if unicodedata.category(char) != 'Mn')
-
-def normalize_greek_entity(text, entity_type):
-    """Comprehensive Greek entity normalization using rules and lemmatization"""
-    text = text.strip()
-    
-    # Apply Greek-specific rules based on entity type
-    if entity_type == 'PERSON' and len(text) > 4:
-        # Normalize person names to masculine nominative
-        if text.endswith('άκη'):
-            text = text[:-1] + 'ης'  # Νικολάκη -> Νικολάκης
-        elif text.endswith('ίκη'):
-            text = text[:-1] + 'ης'  # Γιωργίκη -> Γιωργίκης
-        elif text.endswith('ου'):
-            text = text[:-2] + 'ος'  # Γιώργου → Γιώργος
-        elif text.endswith('ο') and not text.endswith('ιο'):
-            text = text[:-1] + 'ος'  # Γιώργο → Γιώργος
-        elif text.endswith('ε') and len(text) > 5:
-            text = text[:-1] + 'ος'  # Γιώργε → Γιώργος
-    
-    elif entity_type in ['LOC', 'GPE'] and len(text) > 5:
-        # Normalize place names
-        if text.endswith('ης'):
-            text = text[:-1]  # Φρανκφούρτης → Φρανκφούρτη
-        elif text.endswith('ου'):
-            text = text[:-2] + 'η'  # Αθήνου → Αθήνη
-    
-    return text
-
-def find_similar_entity(new_entity, existing_entities, entity_type, threshold=0.80):
-    """Find similar entity in existing list using fuzzy matching"""
-    # Remove accents for better matching
-    new_normalized = remove_greek_accents(new_entity.lower())
-    
-    for existing in existing_entities:
-        if existing_entities[existing] != entity_type:
-            continue  # Only compare same types
-        
-        existing_normalized = remove_greek_accents(existing.lower())
-        
-        # Calculate similarity without accents
-        similarity = SequenceMatcher(None, new_normalized, existing_normalized).ratio()
-        
-        if similarity >= threshold:
-            return existing
-    
-    return None
-
-
 class EnhancedNetworkAnalyzer:
     def __init__(self):
         """Initialize enhanced network analyzer"""
-        try:
-            self.nlp = spacy.load("el_core_news_md", disable=['tok2vec', 'tagger', 'parser', 'attribute_ruler'])
-        except:
-            self.nlp = spacy.load("en_core_web_sm", disable=['tok2vec', 'tagger', 'parser', 'attribute_ruler', 'lemmatizer'])
-        
-        self.nlp.add_pipe('sentencizer')
+        self.nlp = get_pipeline(disable=['tok2vec', 'tagger', 'parser', 'attribute_ruler'], sentencizer=True)
+        self.aliases = get_alias_store()
+        # Edge strength: 'count' (sentences shared) or 'pmi'; weaker pairs are dropped
+        self.cooccurrence_weighting = os.environ.get('NATS_COOCCURRENCE_WEIGHTING', 'count')
+        min_weight = os.environ.get('NATS_COOCCURRENCE_MIN_WEIGHT')
+        self.cooccurrence_min_weight = float(min_weight) if min_weight else None
         
         self.entity_colors = {
             'PERSON': '#FF6B6B',
@@ -90,70 +39,33 @@ class EnhancedNetworkAnalyzer:
             'MISC': '#FCF3CF'
         }
     
-    def process_text_in_chunks(self, text: str, chunk_size: int = 50000):
-        """Process long text in chunks to avoid memory/timeout issues"""
+    def process_text_in_chunks(self, text: str, chunk_size: int = CHUNK_SIZE):
+        """Parse long text chunk by chunk, yielding compact per-chunk records"""
         if len(text) <= chunk_size:
-            return self.nlp(text)
+            yield doc_to_record(self.nlp(text))
+            return
         
         print(f"Processing text in chunks: {len(text):,} chars, chunk size: {chunk_size:,}", flush=True)
         
-        # Split text into manageable chunks at sentence boundaries
-        chunks = []
-        current_pos = 0
-        
-        while current_pos < len(text):
-            # Get a chunk
-            end_pos = min(current_pos + chunk_size, len(text))
-            
-            # If not at end, try to break at sentence boundary
-            if end_pos < len(text):
-                # Look for sentence endings in last 1000 chars of chunk
-                chunk_text = text[current_pos:end_pos]
-                last_period = max(
-                    chunk_text.rfind('. '),
-                    chunk_text.rfind('! '),
-                    chunk_text.rfind('? '),
-                    chunk_text.rfind('.\n')
-                )
-                
-                if last_period > chunk_size - 1000:  # Found a good break point
-                    end_pos = current_pos + last_period + 1
-            
-            chunks.append(text[current_pos:end_pos])
-            current_pos = end_pos
-        
-        print(f"Split into {len(chunks)} chunks", flush=True)
-        
-        # Process each chunk and combine entities
-        all_ents = []
-        all_sents = []
-        
-        for i, chunk in enumerate(chunks):
-            print(f"Processing chunk {i+1}/{len(chunks)}...", flush=True)
-            chunk_doc = self.nlp(chunk)
-            all_ents.extend(chunk_doc.ents)
-            all_sents.extend(chunk_doc.sents)
-        
-        # Create a combined pseudo-doc
-        class CombinedDoc:
-            def __init__(self, ents, sents):
-                self.ents = ents
-                self.sents = sents
-        
-        return CombinedDoc(all_ents, all_sents)
+        for i, record in enumerate(iter_chunk_records(self.nlp, text, chunk_size)):
+            print(f"Processed chunk {i+1} ({record['offset']:,}-{record['offset'] + record['length']:,})", flush=True)
+            yield record
     
-    def extract_entities_and_relationships(self, text: str, max_chars: int = None) -> Tuple[Dict[str, str], List[Tuple[str, str, float]]]:
+    def extract_entities_and_relationships(self, text: str, max_chars: int = None, doc=None) -> Tuple[Dict[str, str], List[Tuple[str, str, float]]]:
         """Extract entities and calculate relationship strengths"""
         print(f"Processing text: {len(text):,} characters", flush=True)
         
         # Use chunking for long texts
-        if len(text) > 50000:
-            doc = self.process_text_in_chunks(text, chunk_size=50000)
+        if doc is not None:
+            print("Using shared parse", flush=True)
+            # Sentencizer boundaries, as in a parse of our own, not the shared parser's
+            records = [doc_to_record(doc, sents=self.nlp.sentences(doc))]
         else:
-            doc = self.nlp(text)
+            records = self.process_text_in_chunks(text, chunk_size=CHUNK_SIZE)
         
-        entities = {}
-        entity_sentences = defaultdict(list)
+        raw_entities = {}
+        raw_lemmas = {}
+        sentence_spans = []
         
         # Extract entities with filtering
         stopwords = {
@@ -162,58 +74,51 @@ class EnhancedNetworkAnalyzer:
             'ένα', 'μια', 'ένας', 'μία', 'είναι', 'ήταν', 'έχει', 'έχουν', 'πώς', 'πού', 'πο',
             'αυτό', 'αυτή', 'αυτός', 'που', 'πως', 'ως', 'σαν', 'όταν', 'αν', 'αλλά', 'μα'
         }
-        for ent in doc.ents:
-            if (ent.label_ in self.entity_colors and 
-                len(ent.text.strip()) > 2 and  # Minimum 3 characters
-                ent.text.lower() not in stopwords and
-                not ent.text.lower() in ['πο', 'πω', 'πώς']):  # Extra Greek fragments
-                entities[ent.text] = ent.label_
-                entity_sentences[ent.text].append(ent.sent.text if hasattr(ent, 'sent') else "")
-        
-        print(f"Found {len(entities)} entities", flush=True)
+        for record in records:
+            lemmas = record.get('lemmas') or [None] * len(record['ents'])
+            for (start, end, label), lemma in zip(record['ents'], lemmas):
+                ent_text = text[start:end]
+                if (label in self.entity_colors and 
+                    len(ent_text.strip()) > 2 and  # Minimum 3 characters
+                    ent_text.lower() not in stopwords and
+                    not ent_text.lower() in ['πο', 'πω', 'πώς']):  # Extra Greek fragments
+                    raw_entities[ent_text] = label
+                    if lemma:
+                        raw_lemmas.setdefault(ent_text, lemma)
+            sentence_spans.extend(record['sents'])
+        
+        # Merge declensions and spelling variants into canonical names
+        entities, entity_map = normalize_entities(raw_entities, similarity_threshold=0.85, aliases=self.aliases,
+                                                  lemmas=raw_lemmas, rules=True)
+        
+        print(f"Found {len(raw_entities)} entities ({len(entities)} after normalization)", flush=True)
         
         # Calculate relationship strengths - OPTIMIZED
         print("Calculating relationships...", flush=True)
+        entity_list = [e for e in raw_entities if e.strip()]
+        canonical_names = list(dict.fromkeys(entity_map[e.strip()] for e in entity_list))
+        canonical_columns = {name: i for i, name in enumerate(canonical_names)}
+        
+        # One automaton for all entity names; each sentence is scanned once into
+        # a row of the sentence x entity incidence matrix
+        matcher = EntityMatcher(entity_list)
+        cooccurrence = CooccurrenceMatrix(entity_list)
+        for i, (start, end) in enumerate(sentence_spans):
+            cooccurrence.add_sentence(matcher.find(text[start:end]), key=i)
+        
+        # Surface forms count once per sentence as their canonical name
+        cooccurrence = cooccurrence.merged([canonical_columns[entity_map[e.strip()]] for e in entity_list],
+                                           canonical_names)
+        
+        # Pair counts come from one sparse product; contexts are the first 3 shared sentences
         relationships = []
-        entity_list = list(entities.keys())
-        
-        # Build index: which entities appear in which sentences
-        sentence_to_entities = []
-        
-        for sent in doc.sents:
-            sent_text = sent.text.lower()
-            entities_in_sent = [e for e in entity_list if e.lower() in sent_text]
-            if len(entities_in_sent) > 1:  # Only care about sentences with 2+ entities
-                sentence_to_entities.append(entities_in_sent)
-        
-        print(f"Processing {len(sentence_to_entities)} sentences with multiple entities...", flush=True)
-        
-        # Count co-occurrences and store context sentences
-        co_occurrence_counts = defaultdict(int)
-        co_occurrence_contexts = defaultdict(list)
-        
-        for sent in doc.sents:
-            sent_text = sent.text
-            sent_lower = sent_text.lower()
-            entities_in_sent = [e for e in entity_list if e.lower() in sent_lower]
-            
-            if len(entities_in_sent) > 1:
-                # Create pairs from entities in this sentence
-                for i, ent1 in enumerate(entities_in_sent):
-                    for ent2 in entities_in_sent[i+1:]:
-                        pair = tuple(sorted([ent1, ent2]))
-                        co_occurrence_counts[pair] += 1
-                        # Store the sentence context (limit to first 3 examples)
-                        if len(co_occurrence_contexts[pair]) < 3:
-                            co_occurrence_contexts[pair].append(sent_text[:200])  # First 200 chars
-        
-        # Convert to relationships list with context
-        relationships = []
-        for (e1, e2), count in co_occurrence_counts.items():
+        for pair in cooccurrence.pairs(self.cooccurrence_weighting, self.cooccurrence_min_weight):
+            contexts = [text[start:end][:200] for start, end in (sentence_spans[i] for i in pair['contexts'])]  # First 200 chars
             relationships.append({
-                'entities': (e1, e2),
-                'strength': float(count),
-                'contexts': co_occurrence_contexts[(e1, e2)]
+                'entities': tuple(sorted(pair['entities'])),
+                'strength': pair['weight'],
+                'count': pair['count'],
+                'contexts': contexts
             })
         
         print(f"Found {len(relationships)} relationships", flush=True)
@@ -230,7 +135,8 @@ class EnhancedNetworkAnalyzer:
         
         for rel in relationships:
             ent1, ent2 = rel['entities']
-            weight = rel['strength']
+            # Raw counts: PMI strengths can be zero or negative, which Louvain and PageRank cannot use
+            weight = rel.get('count', rel['strength'])
             G.add_edge(ent1, ent2, weight=weight)
         
         try:
@@ -251,7 +157,8 @@ class EnhancedNetworkAnalyzer:
         
         for rel in relationships:
             ent1, ent2 = rel['entities']
-            weight = rel['strength']
+            # Raw counts: PMI strengths can be zero or negative, which Louvain and PageRank cannot use
+            weight = rel.get('count', rel['strength'])
             G.add_edge(ent1, ent2, weight=weight)
         
         betweenness = nx.betweenness_centrality(G)
@@ -267,10 +174,10 @@ class EnhancedNetworkAnalyzer:
         
         return centrality_measures
     
-    def create_network_graph(self, text: str, output_dir: str = '.') -> Dict[str, Any]:
+    def create_network_graph(self, text: str, output_dir: str = '.', doc=None) -> Dict[str, Any]:
         """Create interactive network visualization"""
         
-        entities, relationships = self.extract_entities_and_relationships(text)
+        entities, relationships = self.extract_entities_and_relationships(text, doc=doc)
         
         if not entities:
             return {'error': 'No entities found in text'}
@@ -324,7 +231,7 @@ class EnhancedNetworkAnalyzer:
             
             # Build tooltip with context sentences
             tooltip = f"<b>{ent1} ↔ {ent2}</b><br>"
-            tooltip += f"Co-occurrences: {int(strength)}<br><br>"
+            tooltip += f"Co-occurrences: {rel.get('count', int(strength))}<br><br>"
             tooltip += "<b>Example sentences:</b><br>"
             for i, ctx in enumerate(contexts[:3], 1):
                 tooltip += f"{i}. {ctx}...<br>"
@@ -409,7 +316,6 @@ class EnhancedNetworkAnalyzer:
             'relationships': len(relationships),
             'relationship_details': relationships,
             'communities': communities,
-            'community_members': community_members,
             'community_members': dict(community_members),  # NEW: detailed community info
             'centrality': centrality,
             'visualizations': viz_data
@@ -528,6 +434,6 @@ class EnhancedNetworkAnalyzer:
             }
         }
     
-    def create_network(self, text: str, output_dir: str = '.') -> Dict[str, Any]:
+    def create_network(self, text: str, output_dir: str = '.', doc=None) -> Dict[str, Any]:
         """Backward compatibility wrapper"""
-        return self.create_network_graph(text, output_dir)
\ No newline at end of file
+        return self.create_network_graph(text, output_dir, doc=doc)
\ No newline at end of file
@@ -0,0 +1,115 @@
+# app/models/reference_space.py
+"""Persistent 2-D projection fitted once on a baseline corpus.
+
+``reduce_dimensions`` refits PCA/UMAP on every request, so coordinates from
+two analyses cannot be compared. A reference space is fitted once on stored
+document embeddings, saved with joblib, and new documents are only
+``transform``ed into it - a linear map for PCA, a nearest-neighbour
+projection for UMAP - so maps are stable and cost grows with the new
+documents only.
+"""
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, Optional
+
+import joblib
+import numpy as np
+from sklearn.decomposition import PCA
+
+try:
+    import umap
+    UMAP_AVAILABLE = True
+except ImportError:
+    UMAP_AVAILABLE = False
+
+REFERENCE_SPACE_DIR = os.environ.get('NATS_REFERENCE_SPACE_DIR', os.path.join('cache', 'reference_spaces'))
+# t-SNE has no transform for unseen points, so only these can back a reference space
+REFERENCE_METHODS = ('pca', 'umap')
+
+
+class ReferenceSpace:
+    """A fitted reducer for one embedding space and method, shared by all workers through disk"""
+
+    def __init__(self, space: str, method: str = 'pca', directory: str = REFERENCE_SPACE_DIR):
+        if method not in REFERENCE_METHODS:
+            raise ValueError(f'Reference spaces support {REFERENCE_METHODS}, not {method}')
+        self.space = space
+        self.method = method
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', space)
+        self.path = os.path.join(directory, slug, f'{method}.joblib')
+
+        self.reducer = None
+        self.info: Dict[str, Any] = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        """Load the saved reducer, or a newer one fitted by another worker"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            saved = joblib.load(self.path)
+            self.reducer = saved.pop('reducer')
+            self.info = saved
+            self._mtime = mtime
+
+    def is_fitted(self) -> bool:
+        with self._lock:
+            self._refresh()
+            return self.reducer is not None
+
+    def fit(self, embeddings: np.ndarray) -> Dict[str, Any]:
+        """Fit the reducer on a baseline corpus and save it, replacing any previous fit"""
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if len(embeddings) < 3:
+            raise ValueError('A reference space needs at least 3 documents')
+
+        start = time.time()
+        if self.method == 'umap':
+            if not UMAP_AVAILABLE:
+                raise ImportError('umap-learn is required for a UMAP reference space')
+            reducer = umap.UMAP(n_components=2, n_neighbors=min(15, len(embeddings) - 1), random_state=42)
+        else:
+            reducer = PCA(n_components=2)
+        reducer.fit(embeddings)
+
+        info = {
+            'space': self.space,
+            'method': self.method,
+            'dim': int(embeddings.shape[1]),
+            'n_documents': len(embeddings),
+            'fitted_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'fit_time': time.time() - start
+        }
+
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        joblib.dump(dict(info, reducer=reducer), tmp_path)
+        os.replace(tmp_path, self.path)
+
+        with self._lock:
+            self._refresh()
+        print(f"Fitted {self.method} reference space for {self.space} on {len(embeddings)} documents")
+        return info
+
+    def transform(self, embeddings: np.ndarray) -> Optional[np.ndarray]:
+        """Project documents into the space, or None if it is not fitted or dimensions differ"""
+        with self._lock:
+            self._refresh()
+            if self.reducer is None or self.info['dim'] != embeddings.shape[1]:
+                return None
+            return self.reducer.transform(np.asarray(embeddings, dtype=np.float32))
+
+
+_spaces: Dict[tuple, ReferenceSpace] = {}
+
+
+def get_reference_space(space: str, method: str = 'pca') -> ReferenceSpace:
+    key = (space, method)
+    if key not in _spaces:
+        _spaces[key] = ReferenceSpace(space, method)
+    return _spaces[key]
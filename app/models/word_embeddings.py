@@ -2,7 +2,7 @@
 from gensim.models import Word2Vec
 import numpy as np
 from typing import Dict, Any
-import spacy
+from app.utils.nlp_registry import get_pipeline
 from app.models.dimension_reducer import DimensionReducer
 
 class WordEmbeddingsAnalyzer:
@@ -11,7 +11,7 @@ class WordEmbeddingsAnalyzer:
         self.window = window
         self.min_count = min_count
         self.epochs = epochs
-        self.nlp = spacy.load('el_core_news_md', disable=['tagger', 'parser', 'attribute_ruler', 'lemmatizer'])
+        self.nlp = get_pipeline(disable=['tagger', 'parser', 'attribute_ruler', 'lemmatizer'])
         self.dimension_reducer = DimensionReducer()
         
     def analyze_text(self, text: str) -> Dict[str, Any]:
@@ -0,0 +1,346 @@
+# app/routes/api_routes.py
+from flask import Blueprint, request, jsonify, send_from_directory, current_app
+import os
+import uuid
+import json
+import numpy as np
+from werkzeug.utils import secure_filename
+
+from app.models.document_index import FAISS_AVAILABLE, content_key, get_document_index
+from app.models.reference_space import REFERENCE_METHODS, get_reference_space
+from app.utils.alias_store import get_alias_store
+from app.utils.embedding_store import embeddings_filename, iter_stored_embeddings, load_embeddings
+from app.utils.parse_cache import get_parse_cache
+
+api_bp = Blueprint('api', __name__)
+
+def _models():
+    """The application's ModelLoader"""
+    return current_app.extensions['models']
+
+def _document_index(doc_analyzer):
+    """Search index for the sentence model's embedding space, or None without faiss"""
+    if not FAISS_AVAILABLE:
+        return None
+    doc_analyzer.sentence_model  # the index is keyed by the loaded model's name
+    return get_document_index(doc_analyzer.sentence_model_name)
+
+@api_bp.route('/test')
+def test_viz():
+    return send_from_directory('.', 'test_viz.html')
+
+@api_bp.route('/simple')
+def simple_test():
+    return send_from_directory('.', 'simple_test.html')
+
+# Explicitly serve network visualizations
+@api_bp.route('/static/networks/<path:filename>')
+def serve_networks(filename):
+    # Use absolute path to ensure we find the file
+    network_dir = os.path.join(os.getcwd(), 'static', 'networks')
+    print(f"Serving network file: {filename} from {network_dir}") # Debug print
+    return send_from_directory(network_dir, filename)
+
+@api_bp.route('/')
+def home():
+    return 'NATS Backend is Running'
+
+@api_bp.route('/api/health')
+@api_bp.route('/api/health/live')
+def health_check():
+    """Liveness: the process is up and serving requests"""
+    parse_cache = get_parse_cache()
+    alias_store = get_alias_store()
+    models = _models()
+    embedding_cache = models.get('doc_analyzer').embedding_cache if models.is_loaded('doc_analyzer') else None
+    return jsonify({
+        'status': 'healthy',
+        'service': 'NATS',
+        'parse_cache': parse_cache.stats() if parse_cache else None,
+        'embedding_cache': embedding_cache.stats() if embedding_cache else None,
+        'alias_store': alias_store.stats() if alias_store else None
+    })
+
+@api_bp.route('/api/health/ready')
+def readiness_check():
+    """Readiness: the warm-up has tried every model (failed ones load again on use); 503 until then"""
+    models = _models()
+    ready = models.is_ready()
+    return jsonify({
+        'status': 'ready' if ready else 'loading',
+        'service': 'NATS',
+        'models': models.status()
+    }), 200 if ready else 503
+
+@api_bp.route('/api/analyze', methods=['POST'])
+def analyze_files():
+    try:
+        if 'files' not in request.files:
+            return jsonify({'error': 'No files provided'}), 400
+
+        files = request.files.getlist('files')
+        analysis_type = request.form.get('analysis_type', 'enhanced_ner')
+        embedding_type = request.form.get('embedding_type', 'sentence_transformer')
+        reduction_method = request.form.get('reduction_method', 'pca')
+        pooling = request.form.get('pooling', 'mean')
+
+        analysis_id = str(uuid.uuid4())
+        
+        texts = {}
+        for file in files:
+            if file and file.filename:
+                try:
+                    text = file.read().decode('utf-8')
+                    texts[secure_filename(file.filename)] = text
+                except Exception as e:
+                    print(f"Error processing {file.filename}: {str(e)}")
+                    continue
+        
+        if not texts:
+            return jsonify({'error': 'No valid text files uploaded'}), 400
+
+        models = _models()
+
+        results = {}
+        
+        # Parse all files under the chunk size in one batched pass and share the Docs
+        # with the analyzers; longer files take the analyzers' chunked paths.
+        # Comprehensive mode needs the full pipeline; single analyses use their own view.
+        doc_parser = models.get('doc_parser')
+        if analysis_type == 'enhanced_embeddings':
+            docs = doc_parser.parse(texts, models.get('doc_analyzer').nlp)
+        elif analysis_type == 'enhanced_network':
+            docs = doc_parser.parse(texts, models.get('network_analyzer').nlp)
+        else:
+            docs = doc_parser.parse(texts)
+        
+        if analysis_type == 'enhanced_ner' or analysis_type == 'comprehensive':
+            ner_analyzer = models.get('ner_analyzer')
+            ner_results = {}
+            for filename, text in texts.items():
+                result = ner_analyzer.process_text(text, 'static/networks', doc=docs.get(filename))
+                ner_results[filename] = result
+            results['entities'] = ner_results
+
+        if analysis_type == 'enhanced_embeddings' or analysis_type == 'comprehensive':
+            embeddings_path = os.path.join(current_app.config['RESULTS_FOLDER'], embeddings_filename(analysis_id))
+            embeddings_result = models.get('doc_analyzer').create_comprehensive_visualization(
+                texts, embedding_type, reduction_method, docs=docs, pooling=pooling,
+                embeddings_path=embeddings_path
+            )
+            # Flatten embeddings result to top level
+            if 'scatter_plot' in embeddings_result:
+                results['scatter_plot'] = embeddings_result['scatter_plot']
+            if 'features_chart' in embeddings_result:
+                results['features_chart'] = embeddings_result['features_chart']
+            if 'similarity_heatmap' in embeddings_result:
+                results['similarity_heatmap'] = embeddings_result['similarity_heatmap']
+            if 'clusters' in embeddings_result:
+                results['clusters'] = embeddings_result['clusters']
+            results['embeddings'] = embeddings_result
+
+            # Index mean-pooled transformer embeddings for /api/search
+            index = _document_index(models.get('doc_analyzer'))
+            if index is not None and embedding_type != 'doc2vec' and pooling == 'mean' and \
+                    'embeddings' in embeddings_result:
+                vectors = load_embeddings(embeddings_path)
+                for filename, vector in zip(embeddings_result['embeddings']['filenames'], vectors):
+                    # Keyed by content, so re-analysing a text replaces its entry
+                    index.add(content_key(texts[filename]), vector,
+                              {'analysis_id': analysis_id, 'filename': filename},
+                              source=f'{analysis_id}/{filename}')
+                # Written out by the index's background flusher, not per request
+
+        if analysis_type == 'enhanced_network' or analysis_type == 'comprehensive':
+            network_analyzer = models.get('network_analyzer')
+            network_results = {}
+            for filename, text in texts.items():
+                result = network_analyzer.create_network(text, 'static/networks', doc=docs.get(filename))
+                
+                # --- FIX: Send FULL ABSOLUTE URL ---
+                if 'network_path' in result:
+                    fname = os.path.basename(result['network_path'])
+                    # Hardcoded to match our port 8052
+                    # IMPORTANT: This must match the port the server is running on
+                    result['network_path'] = f"http://localhost:8052/static/networks/{fname}"
+                    print(f"Generated network URL: {result['network_path']}") # Debug print
+                # -----------------------------------
+                
+                network_results[filename] = result
+            results['network'] = network_results
+
+        stats = {
+            'total_documents': len(texts),
+            'total_entities': sum(len(r.get('entities', {})) for r in results.get('entities', {}).values()),
+            'num_communities': len(set().union(*[r.get('communities', {}).values() for r in results.get('network', {}).values()])),
+            'avg_degree': 0
+        }
+        
+        if results.get('network'):
+            all_centrality = []
+            for r in results['network'].values():
+                if 'centrality' in r:
+                    all_centrality.extend([c['degree'] for c in r['centrality'].values()])
+            if all_centrality:
+                stats['avg_degree'] = sum(all_centrality) / len(all_centrality)
+
+        results['stats'] = stats
+        results['analysis_id'] = analysis_id
+        results['analysis_type'] = analysis_type
+
+        def convert_plotly_in_dict(d):
+            if isinstance(d, dict):
+                for key, value in d.items():
+                    if isinstance(value, dict) and 'type' in value and value['type'] == 'plotly':
+                        if 'data' in value and hasattr(value['data'], 'to_json'):
+                            value['data'] = json.loads(value['data'].to_json())
+                        if 'layout' in value and hasattr(value['layout'], 'to_json'):
+                            value['layout'] = json.loads(value['layout'].to_json())
+                    else:
+                        convert_plotly_in_dict(value)
+            elif isinstance(d, list):
+                for item in d:
+                    convert_plotly_in_dict(item)
+        
+        convert_plotly_in_dict(results)
+
+        results_path = os.path.join(current_app.config['RESULTS_FOLDER'], f'{analysis_id}.json')
+        with open(results_path, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+        return jsonify({'analysis_id': analysis_id, 'results': results})
+
+    except Exception as e:
+        print(f"Analysis error: {str(e)}")
+        return jsonify({'error': f'Analysis failed: {str(e)}'}), 500
+
+
+@api_bp.route('/api/results/<analysis_id>', methods=['GET'])
+def get_results(analysis_id):
+    try:
+        results_path = os.path.join(current_app.config['RESULTS_FOLDER'], f'{analysis_id}.json')
+        if not os.path.exists(results_path):
+            return jsonify({'error': 'Analysis not found'}), 404
+        
+        with open(results_path, 'r', encoding='utf-8') as f:
+            results = json.load(f)
+        
+        return jsonify(results)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/api/results/<analysis_id>/embeddings', methods=['GET'])
+def get_embeddings(analysis_id):
+    """Stream the document embedding matrix (.npy; row order is embeddings.filenames in the results)"""
+    try:
+        results_dir = os.path.abspath(current_app.config['RESULTS_FOLDER'])
+        filename = embeddings_filename(secure_filename(analysis_id))
+        if not os.path.exists(os.path.join(results_dir, filename)):
+            return jsonify({'error': 'Embeddings not found'}), 404
+        return send_from_directory(results_dir, filename,
+                                   mimetype='application/octet-stream', as_attachment=True)
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/api/search', methods=['POST'])
+def search_documents():
+    """Nearest indexed documents to a query text or to an already analyzed document"""
+    try:
+        if not FAISS_AVAILABLE:
+            return jsonify({'error': 'Document search requires faiss-cpu'}), 501
+
+        params = request.get_json(silent=True) or request.form
+        k = int(params.get('k', 10))
+        doc_analyzer = _models().get('doc_analyzer')
+        index = _document_index(doc_analyzer)
+
+        if params.get('query'):
+            embeddings = doc_analyzer.create_embeddings({'query': params['query']})
+            if not embeddings:
+                return jsonify({'error': 'Query text is too short to embed'}), 400
+            vector = embeddings['query']
+            exclude = []
+        elif params.get('analysis_id') and params.get('filename'):
+            source = f"{params['analysis_id']}/{params['filename']}"
+            key = index.resolve(source) or source
+            vector = index.get_vector(key)
+            if vector is None:
+                return jsonify({'error': 'Document not found in index'}), 404
+            exclude = [key]
+        else:
+            return jsonify({'error': 'Provide query, or analysis_id and filename'}), 400
+
+        return jsonify({'results': index.search(vector, k, exclude=exclude),
+                        'total_documents': len(index)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/api/search/<analysis_id>/<path:filename>', methods=['DELETE'])
+def remove_indexed_document(analysis_id, filename):
+    """Drop an analyzed document from the search index"""
+    try:
+        if not FAISS_AVAILABLE:
+            return jsonify({'error': 'Document search requires faiss-cpu'}), 501
+
+        index = _document_index(_models().get('doc_analyzer'))
+        key = index.resolve(f'{analysis_id}/{filename}')
+        if key is None or not index.remove(key):
+            return jsonify({'error': 'Document not found in index'}), 404
+        return jsonify({'removed': key, 'total_documents': len(index)})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/api/reference-space', methods=['GET', 'POST'])
+def reference_space():
+    """Fit (POST) or describe (GET) the projection new analyses are mapped into.
+
+    POST fits on the stored embeddings of ``analysis_ids``, or of every stored
+    analysis in the same embedding space when none are given.
+    """
+    try:
+        json_params = request.get_json(silent=True) if request.method == 'POST' else None
+        params = (json_params or request.form) if request.method == 'POST' else request.args
+        method = params.get('method', 'pca')
+        if method not in REFERENCE_METHODS:
+            return jsonify({'error': f'method must be one of {", ".join(REFERENCE_METHODS)}'}), 400
+
+        space_name = _models().get('doc_analyzer').embedding_space(params.get('embedding_type', 'sentence_transformer'),
+                                                                  params.get('pooling', 'mean'))
+        space = get_reference_space(space_name, method)
+
+        if request.method == 'GET':
+            return jsonify({'fitted': space.is_fitted(), **space.info})
+
+        if json_params:
+            analysis_ids = json_params.get('analysis_ids')
+            if analysis_ids is not None and (not isinstance(analysis_ids, list) or
+                                             not all(isinstance(a, str) for a in analysis_ids)):
+                return jsonify({'error': 'analysis_ids must be a list of strings'}), 400
+        else:
+            analysis_ids = request.form.getlist('analysis_ids') or None  # repeated form field
+        if analysis_ids is not None:
+            analysis_ids = [secure_filename(analysis_id) for analysis_id in analysis_ids]
+        matrices = [matrix for _, matrix in
+                    iter_stored_embeddings(current_app.config['RESULTS_FOLDER'], space_name, analysis_ids)]
+        if not matrices:
+            return jsonify({'error': f'No stored embeddings for {space_name}'}), 404
+
+        return jsonify({'fitted': True, **space.fit(np.concatenate(matrices))})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api_bp.route('/api/download/<analysis_id>', methods=['GET'])
+def download_results(analysis_id):
+    try:
+        format_type = request.args.get('format', 'json')
+        results_path = os.path.join(current_app.config['RESULTS_FOLDER'], f'{analysis_id}.json')
+        
+        if not os.path.exists(results_path):
+            return jsonify({'error': 'Analysis not found'}), 404
+        
+        if format_type == 'json':
+            return send_from_directory(current_app.config['RESULTS_FOLDER'], f'{analysis_id}.json', as_attachment=True)
+        else:
+            return jsonify({'error': 'Only JSON format supported'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
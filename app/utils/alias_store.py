@@ -0,0 +1,101 @@
+# app/utils/alias_store.py
+import fcntl
+import json
+import os
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+ALIAS_STORE_PATH = os.environ.get('NATS_ALIAS_STORE', os.path.join('cache', 'aliases.jsonl'))
+
+
+class AliasStore:
+    """Persistent surface form -> canonical entity table shared across documents and workers.
+
+    Aliases are stored one JSON object per line (``{"surface", "type",
+    "canonical"}``) in an append-only file. Appends take an exclusive file
+    lock; every process replays lines appended since its last read, in file
+    order, so later entries win and all workers converge on the same table.
+    Lookups follow chains (X -> Y recorded, later Y -> Z) to the final
+    canonical.
+    """
+
+    def __init__(self, path: str = ALIAS_STORE_PATH):
+        self.path = path
+        self._lock_path = f'{path}.lock'
+        self._aliases: Dict[Tuple[str, str], str] = {}
+        self._offset = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.refresh()
+
+    def refresh(self):
+        """Read lines appended since the last refresh, by us or other processes.
+
+        Cheap when nothing changed: only the file size is checked.
+        """
+        with self._lock:
+            if not os.path.exists(self.path) or os.path.getsize(self.path) == self._offset:
+                return
+            with open(self.path, 'r', encoding='utf-8') as f:
+                f.seek(self._offset)
+                for line in f:
+                    if not line.endswith('\n'):
+                        break  # partially written line; picked up next time
+                    self._offset += len(line.encode('utf-8'))
+                    try:
+                        alias = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._aliases[(alias['type'], alias['surface'])] = alias['canonical']
+
+    def lookup(self, surface: str, entity_type: str) -> Optional[str]:
+        canonical = self._aliases.get((entity_type, surface))
+        seen = {surface}
+        while canonical is not None and canonical not in seen:
+            seen.add(canonical)
+            following = self._aliases.get((entity_type, canonical))
+            if following is None:
+                break
+            canonical = following
+        if canonical is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return canonical
+
+    def record(self, aliases: Iterable[Tuple[str, str, str]]):
+        """Persist (surface, type, canonical) mappings that are new or changed"""
+        new = [(surface, entity_type, canonical) for surface, entity_type, canonical in aliases
+               if surface != canonical and self._aliases.get((entity_type, surface)) != canonical]
+        if not new:
+            return
+
+        lines = ''.join(json.dumps({'surface': surface, 'type': entity_type, 'canonical': canonical},
+                                   ensure_ascii=False) + '\n' for surface, entity_type, canonical in new)
+        with open(self._lock_path, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+        self.refresh()
+
+    def __len__(self) -> int:
+        return len(self._aliases)
+
+    def stats(self) -> Dict[str, int]:
+        return {'aliases': len(self._aliases), 'hits': self.hits, 'misses': self.misses}
+
+
+_store = None
+
+
+def get_alias_store() -> Optional[AliasStore]:
+    """Process-wide alias store, or None when NATS_ALIAS_STORE is set to an empty string"""
+    global _store
+    if not ALIAS_STORE_PATH:
+        return None
+    if _store is None:
+        _store = AliasStore()
+    return _store
@@ -0,0 +1,50 @@
+# app/utils/doc_parser.py
+import os
+from typing import Dict, Optional
+
+from spacy.tokens import Doc
+
+from app.utils.nlp_registry import PipelineView, get_pipeline
+from app.utils.text_chunker import CHUNK_SIZE
+
+PARSE_BATCH_SIZE = int(os.environ.get('NATS_PARSE_BATCH_SIZE', '8'))
+PARSE_N_PROCESS = int(os.environ.get('NATS_PARSE_N_PROCESS', '1'))
+
+
+class SharedDocParser:
+    """Parse each uploaded text once and share the Doc between analyzers.
+
+    The default view runs the full pipeline (tagger/morphologizer, parser,
+    lemmatizer and NER), which covers everything the embedding, NER and
+    network analyzers read from a Doc. Its sentences come from the parser;
+    analyzers whose own view uses the sentencizer re-segment it with
+    ``PipelineView.sentences`` so results match a standalone run. All texts
+    of a request are streamed through ``nlp.pipe`` so multi-file uploads can
+    use several processes. Texts longer than ``max_chars`` are left to the
+    analyzers' chunked, streaming paths instead of being held whole.
+    """
+
+    def __init__(self, nlp: Optional[PipelineView] = None,
+                 batch_size: int = PARSE_BATCH_SIZE, n_process: int = PARSE_N_PROCESS,
+                 max_chars: int = CHUNK_SIZE):
+        self.nlp = nlp if nlp is not None else get_pipeline()
+        self.max_chars = max_chars
+        self.batch_size = batch_size
+        self.n_process = n_process
+
+    def parse(self, texts: Dict[str, str], nlp: Optional[PipelineView] = None) -> Dict[str, Doc]:
+        """Parse every text short enough for a single Doc, keyed by filename"""
+        nlp = nlp if nlp is not None else self.nlp
+        max_chars = min(self.max_chars, nlp.max_length)
+
+        filenames = []
+        for filename, text in texts.items():
+            if len(text) > max_chars:
+                # Long texts are parsed chunk by chunk by the analyzers themselves
+                print(f"Skipping shared parse for {filename}: {len(text):,} characters")
+                continue
+            filenames.append(filename)
+
+        n_process = self.n_process if len(filenames) > 1 else 1
+        docs = nlp.pipe((texts[f] for f in filenames), batch_size=self.batch_size, n_process=n_process)
+        return dict(zip(filenames, docs))
@@ -0,0 +1,316 @@
+# app/utils/embedding_cache.py
+import fcntl
+import hashlib
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+EMBEDDING_CACHE_DIR = os.environ.get('NATS_EMBEDDING_CACHE_DIR', os.path.join('cache', 'embeddings'))
+EMBEDDING_CACHE_MEMORY_MB = int(os.environ.get('NATS_EMBEDDING_CACHE_MEMORY_MB', '64'))
+EMBEDDING_CACHE_DISK_MB = int(os.environ.get('NATS_EMBEDDING_CACHE_DISK_MB', '1024'))
+
+# Rough per-entry bookkeeping cost of the memory tier on top of the vector itself
+_ENTRY_OVERHEAD = 120
+# Keys per disk index query, under SQLite's bound-parameter limit
+_LOOKUP_BATCH = 500
+
+
+def normalize_sentence(sentence: str) -> str:
+    return unicodedata.normalize('NFC', re.sub(r'\s+', ' ', sentence).strip())
+
+
+def sentence_key(sentence: str, model_name: str) -> str:
+    """Cache key: hash of the model name and the normalized sentence"""
+    return hashlib.sha1(f'{model_name}\0{normalize_sentence(sentence)}'.encode('utf-8')).hexdigest()
+
+
+class EmbeddingCache:
+    """Two-tier cache of sentence embeddings for one model.
+
+    The memory tier is an LRU bounded by a byte budget. The disk tier is a
+    sequence of generations, each an append-only file of float16 rows
+    (memory-mapped for reads) with a SQLite ``key -> row`` index next to it.
+    The index stays on disk and is queried per batch, so a worker's memory
+    does not grow with the number of cached sentences.
+    New vectors go to the newest generation; once it holds half the disk
+    budget a new generation starts and all but the previous one are
+    deleted. Hits in the previous generation are copied forward, so
+    vectors in use survive rotation. Appends take an exclusive file lock,
+    so several worker processes can share one cache directory.
+
+    Every vector returned is rounded to float16, hit or miss, so a corpus
+    embeds the same whether or not it was cached.
+    """
+
+    def __init__(self, model_name: str, cache_dir: str = EMBEDDING_CACHE_DIR,
+                 memory_bytes: int = EMBEDDING_CACHE_MEMORY_MB * 1024 * 1024,
+                 disk_bytes: int = EMBEDDING_CACHE_DISK_MB * 1024 * 1024):
+        self.model_name = model_name
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+
+        self._memory = OrderedDict()
+        self._memory_used = 0
+        self._lock = threading.Lock()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', model_name)
+        self.directory = os.path.join(cache_dir, slug)
+        os.makedirs(self.directory, exist_ok=True)
+        self._meta_path = os.path.join(self.directory, 'meta.json')
+        self._lock_path = os.path.join(self.directory, '.lock')
+
+        self.dim = None
+        self._connections: Dict[int, sqlite3.Connection] = {}  # generation -> open index
+        self._pid = os.getpid()
+        self._mmaps: Dict[int, np.memmap] = {}
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path, 'r', encoding='utf-8') as f:
+                self.dim = json.load(f)['dim']
+
+    # --- memory tier ---
+
+    def _remember(self, key: str, vector: np.ndarray):
+        if self.memory_bytes <= 0 or key in self._memory:
+            return
+        vector = vector.astype(np.float16)
+        self._memory[key] = vector
+        self._memory_used += vector.nbytes + _ENTRY_OVERHEAD
+        while self._memory_used > self.memory_bytes and self._memory:
+            _, old = self._memory.popitem(last=False)
+            self._memory_used -= old.nbytes + _ENTRY_OVERHEAD
+
+    # --- disk tier ---
+
+    def _generation_dir(self, generation: int) -> str:
+        return os.path.join(self.directory, f'gen-{generation}')
+
+    def _generations(self) -> List[int]:
+        return sorted(int(name[4:]) for name in os.listdir(self.directory)
+                      if name.startswith('gen-') and name[4:].isdigit())
+
+    def _connect(self, generation: int, create: bool = False) -> Optional[sqlite3.Connection]:
+        connection = self._connections.get(generation)
+        if connection is None:
+            path = os.path.join(self._generation_dir(generation), 'index.sqlite')
+            if not create and not os.path.exists(path):
+                return None
+            try:
+                # Shared by the request threads, which take self._lock around every use
+                connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+                connection.execute('CREATE TABLE IF NOT EXISTS rows (key TEXT PRIMARY KEY, row INTEGER NOT NULL)')
+                connection.commit()
+            except sqlite3.Error:
+                if create:
+                    raise
+                return None  # rotated away by another process
+            self._connections[generation] = connection
+        return connection
+
+    def _refresh_generations(self) -> List[int]:
+        """Current generations, forgetting the ones another process rotated away"""
+        if self.disk_bytes <= 0:
+            return []
+        if self.dim is None and os.path.exists(self._meta_path):
+            with open(self._meta_path, 'r', encoding='utf-8') as f:
+                self.dim = json.load(f)['dim']
+
+        if self._pid != os.getpid():
+            # SQLite connections must not be used across fork; the parent keeps its own
+            self._connections = {}
+            self._pid = os.getpid()
+
+        generations = self._generations()
+        for generation in set(self._connections) - set(generations):
+            self._connections.pop(generation).close()
+        for generation in set(self._mmaps) - set(generations):
+            self._mmaps.pop(generation)
+        return generations
+
+    def _lookup(self, keys: List[str], generations: List[int]) -> Dict[str, Tuple[int, int]]:
+        """(generation, row) of each key on disk, from the newest generation holding it"""
+        found: Dict[str, Tuple[int, int]] = {}
+        for generation in reversed(generations):
+            connection = self._connect(generation)
+            if connection is None:
+                continue
+            wanted = [key for key in keys if key not in found]
+            for start in range(0, len(wanted), _LOOKUP_BATCH):
+                batch = wanted[start:start + _LOOKUP_BATCH]
+                try:
+                    rows = connection.execute(
+                        f'SELECT key, row FROM rows WHERE key IN ({",".join("?" * len(batch))})', batch).fetchall()
+                except sqlite3.Error:
+                    break  # rotated away mid-read
+                for key, row in rows:
+                    found[key] = (generation, row)
+        return found
+
+    def _disk_vector(self, generation: int, row: int) -> Optional[np.ndarray]:
+        mmap = self._mmaps.get(generation)
+        if mmap is None or row >= mmap.shape[0]:
+            path = os.path.join(self._generation_dir(generation), 'vectors.f16')
+            try:
+                rows = os.path.getsize(path) // (self.dim * 2)
+                if row >= rows:
+                    return None
+                mmap = self._mmaps[generation] = np.memmap(path, dtype=np.float16, mode='r', shape=(rows, self.dim))
+            except OSError:
+                return None  # rotated away since the index was read
+        return np.array(mmap[row])
+
+    @staticmethod
+    def _truncate(path: str, size: int):
+        with open(path, 'r+b') as f:
+            f.truncate(size)
+
+    def _repair(self, vectors_path: str) -> int:
+        """Drop a torn trailing row left by a crash; returns the vector file size.
+
+        The index is committed after the vectors are written, so rows a crash
+        left unindexed are just never read.
+        """
+        row_bytes = self.dim * 2
+        size = os.path.getsize(vectors_path) if os.path.exists(vectors_path) else 0
+        if size % row_bytes:
+            size -= size % row_bytes
+            self._truncate(vectors_path, size)
+        return size
+
+    def _append(self, keys: List[str], vectors: np.ndarray):
+        if self.disk_bytes <= 0 or not keys:
+            return
+
+        if vectors.shape[0] * vectors.shape[1] * 2 > self.disk_bytes // 2:
+            print("Embedding batch larger than half the disk cache budget; not persisting it")
+            return
+
+        with open(self._lock_path, 'w') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(self._meta_path, 'w', encoding='utf-8') as f:
+                    json.dump({'model_name': self.model_name, 'dim': self.dim}, f)
+            for legacy in ('vectors.f16', 'index.tsv'):  # unbounded single-file layout of older versions
+                if os.path.exists(os.path.join(self.directory, legacy)):
+                    os.remove(os.path.join(self.directory, legacy))
+
+            generations = self._generations() or [0]
+            current = generations[-1]
+            os.makedirs(self._generation_dir(current), exist_ok=True)
+            vectors_path = os.path.join(self._generation_dir(current), 'vectors.f16')
+            size = self._repair(vectors_path)
+
+            if size and size + vectors.shape[0] * self.dim * 2 > self.disk_bytes // 2:
+                # Start a new generation and keep only the one before it
+                for old in generations[:-1]:
+                    if old in self._connections:
+                        self._connections.pop(old).close()
+                    shutil.rmtree(self._generation_dir(old), ignore_errors=True)
+                current += 1
+                os.makedirs(self._generation_dir(current), exist_ok=True)
+                vectors_path = os.path.join(self._generation_dir(current), 'vectors.f16')
+                size = 0
+
+            first_row = size // (self.dim * 2)
+            with open(vectors_path, 'ab') as f:
+                f.write(vectors.astype(np.float16).tobytes())
+            connection = self._connect(current, create=True)
+            with connection:
+                connection.executemany('INSERT OR REPLACE INTO rows (key, row) VALUES (?, ?)',
+                                       [(key, first_row + i) for i, key in enumerate(keys)])
+
+    # --- public API ---
+
+    def encode(self, sentences: List[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """Return embeddings for ``sentences``, calling ``encode_fn`` only for cache misses"""
+        keys = [sentence_key(s, self.model_name) for s in sentences]
+        found: Dict[str, np.ndarray] = {}
+        promote: Dict[str, np.ndarray] = {}
+
+        with self._lock:
+            generations = self._refresh_generations()
+            newest = max(generations, default=None)
+            on_disk = {}
+            if self.dim is not None and generations:
+                on_disk = self._lookup([key for key in dict.fromkeys(keys) if key not in self._memory], generations)
+            for key in keys:
+                if key in found:
+                    continue
+                if key in self._memory:
+                    self._memory.move_to_end(key)
+                    found[key] = self._memory[key]
+                    self.memory_hits += 1
+                elif key in on_disk:
+                    generation, row = on_disk[key]
+                    vector = self._disk_vector(generation, row)
+                    if vector is not None:
+                        found[key] = vector
+                        self._remember(key, vector)
+                        self.disk_hits += 1
+                        if generation != newest:
+                            promote[key] = vector
+            if promote:
+                self._append(list(promote), np.array(list(promote.values())))
+
+        missing = list(OrderedDict((key, s) for key, s in zip(keys, sentences) if key not in found).items())
+        if missing:
+            # Rounded like the stored copies, so later hits return the same values
+            vectors = np.asarray(encode_fn([s for _, s in missing]), dtype=np.float16)
+            with self._lock:
+                self.misses += len(missing)
+                for (key, _), vector in zip(missing, vectors):
+                    found[key] = vector
+                    self._remember(key, vector)
+                self._append([key for key, _ in missing], vectors)
+
+        return np.array([found[key] for key in keys], dtype=np.float32)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.memory_hits + self.disk_hits + self.misses
+        return {
+            'model_name': self.model_name,
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            'memory_entries': len(self._memory),
+            'memory_bytes': self._memory_used,
+            'disk_entries': self._disk_rows()
+        }
+
+    def _disk_rows(self) -> int:
+        """Rows stored across generations, counting vectors copied forward once per generation"""
+        if self.dim is None:
+            return 0
+        rows = 0
+        for generation in self._generations():
+            try:
+                rows += os.path.getsize(os.path.join(self._generation_dir(generation), 'vectors.f16')) // (self.dim * 2)
+            except OSError:
+                pass
+        return rows
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+
+
+def get_embedding_cache(model_name: str) -> Optional[EmbeddingCache]:
+    """Process-wide cache for a model, or None when both tiers are disabled"""
+    if EMBEDDING_CACHE_MEMORY_MB <= 0 and EMBEDDING_CACHE_DISK_MB <= 0:
+        return None
+    if model_name not in _caches:
+        _caches[model_name] = EmbeddingCache(model_name)
+    return _caches[model_name]
@@ -0,0 +1,227 @@
+# app/utils/embedding_server.py
+"""Local sentence-embedding service shared by all web workers.
+
+One process owns the SentenceTransformer and answers encode requests over a
+Unix socket. Requests that arrive close together are coalesced into a single
+large ``encode`` call, so several workers feed one well-batched encoder
+instead of each running its own contended copy of the model.
+
+Run it with ``NATS_EMBEDDING_AUTHKEY=<secret> python -m app.utils.embedding_server``
+or let gunicorn start it (``NATS_EMBEDDING_SERVER=1``, see gunicorn_config.py),
+which generates a fresh key on every boot. Workers use it when
+``NATS_EMBEDDING_SOCKET`` points at the socket and they share the key.
+
+Connections unpickle what they receive, so the server refuses to start
+without a key and only listens inside a directory private to its user.
+"""
+import argparse
+import os
+import queue
+import stat
+import tempfile
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+from typing import List
+
+import numpy as np
+
+DEFAULT_MODEL = 'paraphrase-multilingual-MiniLM-L12-v2'
+FALLBACK_MODEL = 'all-MiniLM-L6-v2'
+
+
+def get_authkey() -> bytes:
+    """Shared secret for the socket; there is deliberately no default"""
+    key = os.environ.get('NATS_EMBEDDING_AUTHKEY', '')
+    if not key:
+        raise RuntimeError('NATS_EMBEDDING_AUTHKEY is not set')
+    return key.encode('utf-8')
+
+
+def default_socket_path() -> str:
+    return os.path.join(tempfile.gettempdir(), f'nats-embed-{os.getuid()}', 'embed.sock')
+
+
+def ensure_private_dir(path: str):
+    """Create a 0700 directory, or refuse one that other users could reach"""
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.stat(path)
+    if info.st_uid != os.getuid() or stat.S_IMODE(info.st_mode) & 0o077:
+        raise RuntimeError(f'Socket directory {path} must be owned by this user with mode 0700')
+
+
+class _PendingRequest:
+    def __init__(self, sentences: List[str], batch_size: int):
+        self.sentences = sentences
+        self.batch_size = batch_size
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+
+class EmbeddingServer:
+    """Serve ``encode`` requests from a single model, coalescing them into large batches"""
+
+    def __init__(self, address: str, model_name: str = DEFAULT_MODEL,
+                 max_batch_sentences: int = 2048, max_wait: float = 0.01):
+        self.address = address
+        self.model_name = model_name
+        self.max_batch_sentences = max_batch_sentences
+        self.max_wait = max_wait
+        self.requests = queue.Queue()
+        self.model = None
+
+    def load_model(self):
+        from sentence_transformers import SentenceTransformer
+        try:
+            self.model = SentenceTransformer(self.model_name)
+        except:
+            self.model = SentenceTransformer(FALLBACK_MODEL)
+            # Clients label vectors with this name, so it must be the model that loaded
+            self.model_name = FALLBACK_MODEL
+
+    def _next_batch(self) -> List[_PendingRequest]:
+        """Block for one request, then collect whatever else arrives within max_wait"""
+        batch = [self.requests.get()]
+        total = len(batch[0].sentences)
+        deadline = time.time() + self.max_wait
+
+        while total < self.max_batch_sentences:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            try:
+                pending = self.requests.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(pending)
+            total += len(pending.sentences)
+
+        return batch
+
+    def _encode_loop(self):
+        while True:
+            batch = self._next_batch()
+            sentences = [s for pending in batch for s in pending.sentences]
+            batch_size = max(pending.batch_size for pending in batch)
+
+            try:
+                vectors = np.asarray(self.model.encode(sentences, batch_size=batch_size))
+            except Exception as e:
+                for pending in batch:
+                    pending.error = str(e)
+                    pending.done.set()
+                continue
+
+            start = 0
+            for pending in batch:
+                end = start + len(pending.sentences)
+                pending.result = vectors[start:end]
+                pending.done.set()
+                start = end
+
+    def _handle(self, conn):
+        try:
+            while True:
+                try:
+                    message = conn.recv()
+                except EOFError:
+                    break
+
+                if message.get('op') == 'info':
+                    conn.send({'model_name': self.model_name,
+                               'dimension': self.model.get_sentence_embedding_dimension()})
+                    continue
+
+                pending = _PendingRequest(message['sentences'], message.get('batch_size', 32))
+                self.requests.put(pending)
+                pending.done.wait()
+                conn.send({'error': pending.error} if pending.error else {'vectors': pending.result})
+        finally:
+            conn.close()
+
+    def serve_forever(self):
+        authkey = get_authkey()
+        ensure_private_dir(os.path.dirname(os.path.abspath(self.address)))
+        self.load_model()
+
+        if os.path.exists(self.address):
+            os.remove(self.address)  # stale socket from a previous run
+
+        threading.Thread(target=self._encode_loop, name='encode-loop', daemon=True).start()
+
+        umask = os.umask(0o177)  # socket file 0600
+        try:
+            listener = Listener(self.address, family='AF_UNIX', authkey=authkey)
+        finally:
+            os.umask(umask)
+        with listener:
+            print(f"Embedding server ({self.model_name}) listening on {self.address}", flush=True)
+            while True:
+                try:
+                    conn = listener.accept()
+                except (AuthenticationError, EOFError, OSError) as e:
+                    print(f"Rejected embedding client: {e}", flush=True)
+                    continue
+                threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+
+class EmbeddingClient:
+    """Drop-in stand-in for SentenceTransformer that encodes through the embedding server"""
+
+    def __init__(self, address: str):
+        self.address = address
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = Client(self.address, family='AF_UNIX', authkey=get_authkey())
+            self._local.conn = conn
+        return conn
+
+    def _request(self, message):
+        for attempt in range(2):
+            try:
+                conn = self._connection()
+                conn.send(message)
+                return conn.recv()
+            except (EOFError, OSError):
+                # The server restarted; reconnect once
+                self._local.conn = None
+                if attempt:
+                    raise
+
+    def encode(self, sentences: List[str], batch_size: int = 32, **kwargs) -> np.ndarray:
+        if not sentences:
+            return np.zeros((0, self.get_sentence_embedding_dimension()), dtype=np.float32)
+
+        reply = self._request({'op': 'encode', 'sentences': list(sentences), 'batch_size': batch_size})
+        if 'error' in reply:
+            raise RuntimeError(f"Embedding server error: {reply['error']}")
+        return reply['vectors']
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self._request({'op': 'info'})['dimension']
+
+    @property
+    def model_name(self) -> str:
+        return self._request({'op': 'info'})['model_name']
+
+
+def main():
+    parser = argparse.ArgumentParser(description='NATS local embedding server')
+    parser.add_argument('--socket', default=os.environ.get('NATS_EMBEDDING_SOCKET') or default_socket_path())
+    parser.add_argument('--model', default=DEFAULT_MODEL)
+    parser.add_argument('--max-batch', type=int, default=2048)
+    parser.add_argument('--max-wait-ms', type=float, default=10)
+    args = parser.parse_args()
+
+    if not os.environ.get('NATS_EMBEDDING_AUTHKEY'):
+        parser.error('NATS_EMBEDDING_AUTHKEY must be set to a secret shared with the workers')
+    EmbeddingServer(args.socket, args.model, args.max_batch, args.max_wait_ms / 1000).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
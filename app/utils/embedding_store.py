@@ -0,0 +1,60 @@
+# app/utils/embedding_store.py
+import json
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+EMBEDDING_DTYPE = os.environ.get('NATS_EMBEDDING_DTYPE', 'float16')
+
+
+def embeddings_filename(analysis_id: str) -> str:
+    return f'{analysis_id}.embeddings.npy'
+
+
+def reference_path(path: str) -> str:
+    """Small JSON sidecar describing a stored matrix, so it can be found without reading the results"""
+    return path[:-len('.npy')] + '.json'
+
+
+def save_embeddings(path: str, filenames: List[str], matrix: np.ndarray, space: str,
+                    dtype: str = EMBEDDING_DTYPE) -> Dict[str, Any]:
+    """Write an embedding matrix as .npy and return the reference stored in the results JSON"""
+    matrix = np.asarray(matrix, dtype=dtype)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, matrix)
+    os.replace(tmp_path, path)
+
+    reference = {
+        'path': os.path.basename(path),
+        'space': space,
+        'filenames': list(filenames),
+        'shape': list(matrix.shape),
+        'dtype': str(matrix.dtype)
+    }
+    with open(reference_path(path), 'w', encoding='utf-8') as f:
+        json.dump(reference, f, ensure_ascii=False)
+    return reference
+
+
+def iter_stored_embeddings(results_dir: str, space: str, analysis_ids: Optional[List[str]] = None):
+    """Yield (analysis_id, matrix) for every stored matrix in ``space``, memory-mapped"""
+    suffix = '.embeddings.json'
+    if analysis_ids is None:
+        analysis_ids = sorted(name[:-len(suffix)] for name in os.listdir(results_dir) if name.endswith(suffix))
+
+    for analysis_id in analysis_ids:
+        path = os.path.join(results_dir, embeddings_filename(analysis_id))
+        try:
+            with open(reference_path(path), 'r', encoding='utf-8') as f:
+                reference = json.load(f)
+        except OSError:
+            continue
+        if reference['space'] == space:
+            yield analysis_id, load_embeddings(path)
+
+
+def load_embeddings(path: str) -> np.ndarray:
+    """Memory-map a stored embedding matrix read-only"""
+    return np.load(path, mmap_mode='r')
@@ -0,0 +1,92 @@
+# app/utils/entity_matcher.py
+"""Case-insensitive multi-pattern substring search (Aho-Corasick).
+
+Finds every pattern that occurs in a text, including patterns nested in or
+overlapping other patterns, in one pass over the text - the same answer as
+testing ``pattern.lower() in text.lower()`` for each pattern. Uses the
+``pyahocorasick`` C extension when it is installed and a pure-Python
+automaton otherwise.
+"""
+from collections import deque
+from typing import Dict, Iterable, List
+
+try:
+    import ahocorasick
+    AHOCORASICK_AVAILABLE = True
+except ImportError:
+    AHOCORASICK_AVAILABLE = False
+
+
+class EntityMatcher:
+    """Automaton compiled once from a list of names, then run over many sentences"""
+
+    def __init__(self, patterns: Iterable[str], use_extension: bool = AHOCORASICK_AVAILABLE):
+        self.patterns = list(patterns)
+
+        # Names that lowercase to the same string share one automaton key
+        keys: Dict[str, List[int]] = {}
+        for i, pattern in enumerate(self.patterns):
+            if pattern:
+                keys.setdefault(pattern.lower(), []).append(i)
+
+        self._automaton = None
+        self._goto: List[Dict[str, int]] = [{}]
+        self._out: List[List[int]] = [[]]
+        if not keys:
+            return
+        if use_extension:
+            self._automaton = ahocorasick.Automaton()
+            for key, ids in keys.items():
+                self._automaton.add_word(key, ids)
+            self._automaton.make_automaton()
+        else:
+            self._build(keys)
+
+    def _build(self, keys: Dict[str, List[int]]):
+        goto, out = self._goto, self._out
+        for key, ids in keys.items():
+            state = 0
+            for char in key:
+                if char not in goto[state]:
+                    goto.append({})
+                    out.append([])
+                    goto[state][char] = len(goto) - 1
+                state = goto[state][char]
+            out[state] = list(ids)
+
+        # Failure links in breadth-first order; outputs are merged along them so
+        # that a state reports every pattern ending at that position
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())  # depth-1 states fail to the root
+        while queue:
+            state = queue.popleft()
+            for char, child in goto[state].items():
+                queue.append(child)
+                link = fail[state]
+                while link and char not in goto[link]:
+                    link = fail[link]
+                fail[child] = goto[link].get(char, 0)
+                out[child] = out[child] + out[fail[child]]
+        self._fail = fail
+
+    def find(self, text: str) -> List[int]:
+        """Indices of the patterns occurring in ``text``, in pattern order"""
+        text = text.lower()
+        found = set()
+        if self._automaton is not None:
+            for _, ids in self._automaton.iter(text):
+                found.update(ids)
+        elif len(self._goto) > 1:
+            goto, fail, out = self._goto, self._fail, self._out
+            state = 0
+            for char in text:
+                while state and char not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(char, 0)
+                if out[state]:
+                    found.update(out[state])
+        return sorted(found)
+
+    def find_patterns(self, text: str) -> List[str]:
+        """The patterns occurring in ``text``, in pattern order"""
+        return [self.patterns[i] for i in self.find(text)]
@@ -0,0 +1,94 @@
+# app/utils/model_loader.py
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Optional
+
+
+class ModelLoader:
+    """Load named models on first use and optionally warm them up in the background.
+
+    Each model is built by its registered factory at most once per process;
+    a failed load is tried again by the next ``get``. Load state and timing
+    are tracked per model so health endpoints can report readiness.
+    """
+
+    def __init__(self):
+        self._factories: Dict[str, Callable[[], Any]] = {}
+        self._models: Dict[str, Any] = {}
+        self._state: Dict[str, Dict[str, Any]] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._on_demand = False
+
+    def register(self, name: str, factory: Callable[[], Any]):
+        self._factories[name] = factory
+        self._locks[name] = threading.Lock()
+        self._state[name] = {'status': 'pending', 'load_time': None, 'error': None, 'attempts': 0}
+
+    def get(self, name: str) -> Any:
+        """Return the model, loading it now if nobody has yet"""
+        if name in self._models:
+            return self._models[name]
+
+        with self._locks[name]:
+            if name not in self._models:
+                state = self._state[name]
+                state['status'] = 'loading'
+                start = time.time()
+                try:
+                    self._models[name] = self._factories[name]()
+                except Exception as e:
+                    state.update(status='failed', error=str(e), load_time=time.time() - start,
+                                 attempts=state['attempts'] + 1)
+                    raise
+                state.update(status='ready', error=None, load_time=time.time() - start,
+                             attempts=state['attempts'] + 1)
+                print(f"Loaded {name} in {state['load_time']:.1f}s", flush=True)
+
+        return self._models[name]
+
+    def warm_up(self, names: Optional[Iterable[str]] = None, background: bool = True,
+                retries: int = 0, retry_delay: float = 5.0) -> Optional[threading.Thread]:
+        """Load models ahead of the first request, in a daemon thread by default.
+
+        Models that fail are retried up to ``retries`` more times, with the
+        delay doubling between rounds.
+        """
+        names = list(names) if names is not None else list(self._factories)
+
+        def load_all():
+            pending = names
+            for attempt in range(retries + 1):
+                if attempt:
+                    time.sleep(retry_delay * 2 ** (attempt - 1))
+                failed = []
+                for name in pending:
+                    try:
+                        self.get(name)
+                    except Exception as e:
+                        print(f"Warm-up of {name} failed: {e}", flush=True)
+                        failed.append(name)
+                if not failed:
+                    break
+                pending = failed
+
+        if not background:
+            load_all()
+            return None
+
+        thread = threading.Thread(target=load_all, name='model-warmup', daemon=True)
+        thread.start()
+        return thread
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self._models
+
+    def load_on_demand(self):
+        """Skip the warm-up: models load on first use, so readiness does not wait for them"""
+        self._on_demand = True
+
+    def is_ready(self) -> bool:
+        """Every model has been loaded or tried at least once (always, when loading on demand)"""
+        return self._on_demand or all(state['attempts'] for state in self._state.values())
+
+    def status(self) -> Dict[str, Dict[str, Any]]:
+        return {name: dict(state) for name, state in self._state.items()}
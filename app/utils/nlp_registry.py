@@ -0,0 +1,190 @@
+# app/utils/nlp_registry.py
+import os
+import threading
+from collections import deque
+from itertools import chain, islice
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+import spacy
+from spacy.language import Language
+from spacy.tokens import Doc
+
+from app.utils.parse_cache import ParseCache, get_parse_cache
+
+DEFAULT_MODEL = os.environ.get('NATS_SPACY_MODEL', 'el_core_news_md')
+FALLBACK_MODEL = 'en_core_web_sm'
+
+_pipelines: Dict[str, Language] = {}
+_lock = threading.RLock()
+
+
+def load_pipeline(model_name: str = DEFAULT_MODEL, fallback: Optional[str] = FALLBACK_MODEL) -> Language:
+    """Load a spaCy model once per process and return the shared instance"""
+    if model_name in _pipelines:
+        return _pipelines[model_name]
+
+    with _lock:
+        if model_name not in _pipelines:
+            try:
+                nlp = spacy.load(model_name)
+            except OSError:
+                if fallback is None:
+                    raise
+                print(f"Model {model_name} not available, using {fallback}")
+                nlp = load_pipeline(fallback, fallback=None)
+            _pipelines[model_name] = nlp
+            print(f"Loaded spaCy pipeline {model_name}: {nlp.pipe_names}")
+
+    return _pipelines[model_name]
+
+
+def loaded_pipelines() -> List[str]:
+    """Names of the models loaded in this process"""
+    return list(_pipelines.keys())
+
+
+class PipelineView:
+    """A component selection over a shared pipeline.
+
+    Behaves like ``nlp`` for the analyzers (``view(text)``, ``view.pipe(texts)``)
+    but runs only the selected components, the same way ``nlp.select_pipes``
+    would, without mutating the shared pipeline. Parses go through the
+    on-disk parse cache when one is configured.
+    """
+
+    def __init__(self, nlp: Language, disable: Iterable[str] = (), sentencizer: bool = False,
+                 cache: Optional[ParseCache] = None):
+        self.nlp = nlp
+        self.sentencizer = sentencizer
+        self.cache = cache
+        self._disable = set(disable)
+
+        if sentencizer and 'sentencizer' not in nlp.pipe_names:
+            with _lock:
+                if 'sentencizer' not in nlp.pipe_names:
+                    nlp.add_pipe('sentencizer')
+
+    @property
+    def disabled(self) -> List[str]:
+        """Components of the shared pipeline this view skips"""
+        disabled = [name for name in self.nlp.pipe_names if name in self._disable]
+        if not self.sentencizer and 'sentencizer' in self.nlp.pipe_names:
+            disabled.append('sentencizer')
+        return disabled
+
+    @property
+    def pipe_names(self) -> List[str]:
+        disabled = self.disabled
+        return [name for name in self.nlp.pipe_names if name not in disabled]
+
+    @property
+    def vocab(self):
+        return self.nlp.vocab
+
+    @property
+    def meta(self):
+        return self.nlp.meta
+
+    @property
+    def max_length(self) -> int:
+        return self.nlp.max_length
+
+    @property
+    def pipeline_id(self) -> str:
+        """Identity of the model and active components, used as part of cache keys"""
+        meta = self.nlp.meta
+        return f"{meta.get('lang')}_{meta.get('name')}-{meta.get('version')}:{','.join(self.pipe_names)}"
+
+    def sentences(self, doc: Doc) -> List[Tuple[int, int]]:
+        """(start_char, end_char) of each sentence of ``doc`` as this view segments it.
+
+        A Doc parsed by another view, such as the shared full parse whose
+        parser sets the boundaries, is re-segmented with this view's
+        sentencizer without being modified.
+        """
+        if not self.sentencizer:
+            return [(sent.start_char, sent.end_char) for sent in doc.sents]
+        guesses = self.nlp.get_pipe('sentencizer').predict([doc])[0]
+        starts = [i for i, is_start in enumerate(guesses) if is_start]
+        return [(doc[start].idx, doc[end - 1].idx + len(doc[end - 1]))
+                for start, end in zip(starts, starts[1:] + [len(doc)])]
+
+    def __call__(self, text: str) -> Doc:
+        if self.cache is None or len(text) < self.cache.min_chars:
+            return self.nlp(text, disable=self.disabled)
+
+        key = self.cache.key(text, self.pipeline_id)
+        doc = self.cache.get(key, self.vocab)
+        if doc is None:
+            doc = self.nlp(text, disable=self.disabled)
+            self.cache.put(key, doc)
+        return doc
+
+    def pipe(self, texts: Iterable[str], batch_size: int = 8, n_process: int = 1,
+             as_tuples: bool = False, **kwargs) -> Iterator[Doc]:
+        """Stream texts through ``nlp.pipe``, yielding Docs in input order.
+
+        With a parse cache, cached Docs are reused and only the misses go
+        through spaCy, all in one ``nlp.pipe`` call so ``n_process`` starts
+        one pool per call. Hits are only looked up as texts are read and are
+        loaded when their turn to be yielded comes. Other keyword arguments
+        (e.g. ``component_cfg``) are passed on to ``nlp.pipe``.
+        """
+        if self.cache is None:
+            yield from self.nlp.pipe(texts, disable=self.disabled, batch_size=batch_size, n_process=n_process,
+                                     as_tuples=as_tuples, **kwargs)
+            return
+
+        if as_tuples:
+            contexts = deque()
+
+            def split():
+                for text, context in texts:
+                    contexts.append(context)
+                    yield text
+
+            for doc in self.pipe(split(), batch_size=batch_size, n_process=n_process, **kwargs):
+                yield doc, contexts.popleft()
+            return
+
+        entries = deque()  # [text, key, doc, cached] per text, in input order
+        parsing = deque()  # the entries sent to spaCy, in order
+
+        def read_misses():
+            for text in texts:
+                key = self.cache.key(text, self.pipeline_id) if len(text) >= self.cache.min_chars else None
+                entry = [text, key, None, key is not None and self.cache.contains(key)]
+                entries.append(entry)
+                if not entry[3]:
+                    parsing.append(entry)
+                    yield text
+
+        def ready():
+            while entries and (entries[0][3] or entries[0][2] is not None):
+                text, key, doc, _ = entries.popleft()
+                if doc is None:
+                    doc = self.cache.get(key, self.vocab)
+                    if doc is None:  # evicted since it was looked up
+                        doc = self.nlp(text, disable=self.disabled)
+                        self.cache.put(key, doc)
+                yield doc
+
+        misses = read_misses()
+        head = list(islice(misses, 2))  # no pool at all for fewer than two misses
+        if head:
+            parsed = self.nlp.pipe(chain(head, misses), disable=self.disabled, batch_size=batch_size,
+                                   n_process=n_process if len(head) > 1 else 1, **kwargs)
+            for doc in parsed:
+                entry = parsing.popleft()
+                entry[2] = doc
+                if entry[1] is not None:
+                    self.cache.put(entry[1], doc)
+                yield from ready()
+        yield from ready()
+
+
+def get_pipeline(model_name: str = DEFAULT_MODEL, disable: Iterable[str] = (),
+                 sentencizer: bool = False, fallback: Optional[str] = FALLBACK_MODEL) -> PipelineView:
+    """Return a view over the shared pipeline with only the needed components"""
+    return PipelineView(load_pipeline(model_name, fallback), disable=disable, sentencizer=sentencizer,
+                        cache=get_parse_cache())
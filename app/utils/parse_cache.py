@@ -0,0 +1,166 @@
+# app/utils/parse_cache.py
+import hashlib
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from spacy.tokens import Doc, DocBin
+
+PARSE_CACHE_DIR = os.environ.get('NATS_PARSE_CACHE_DIR', os.path.join('cache', 'parses'))
+PARSE_CACHE_MB = int(os.environ.get('NATS_PARSE_CACHE_MB', '512'))
+
+
+class ParseCache:
+    """Content-addressed on-disk cache of parsed Docs stored as DocBin files.
+
+    Entries are keyed by a hash of the pipeline identity (model name, version
+    and active components) plus the text. Recency is tracked through file
+    mtimes so the least recently used entries are evicted first once the
+    cache grows past ``max_bytes``, down to ``low_water`` of it. Each process
+    keeps the LRU order it last scanned from disk, updated by its own puts
+    and hits; the directory (with other workers' entries and touches) is
+    re-scanned on eviction at most every ``rescan_puts`` puts or
+    ``rescan_seconds`` seconds.
+    """
+
+    def __init__(self, cache_dir: str = PARSE_CACHE_DIR, max_bytes: int = PARSE_CACHE_MB * 1024 * 1024,
+                 min_chars: int = 200, low_water: float = 0.9, rescan_puts: int = 256,
+                 rescan_seconds: float = 300):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.min_chars = min_chars
+        self.low_water = low_water
+        self.rescan_puts = rescan_puts
+        self.rescan_seconds = rescan_seconds
+        self.hits = 0
+        self.misses = 0
+        self._size = None
+        self._lru: Optional[OrderedDict] = None  # path -> size, least recently used first
+        self._puts_since_scan = 0
+        self._last_scan = 0.0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def key(self, text: str, pipeline_id: str) -> str:
+        digest = hashlib.sha256(pipeline_id.encode('utf-8'))
+        digest.update(b'\0')
+        digest.update(text.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f'{key}.spacy')
+
+    def contains(self, key: str) -> bool:
+        """Whether ``key`` is cached, without reading it; False counts as a miss, a later ``get`` as the hit"""
+        if os.path.exists(self._path(key)):
+            return True
+        with self._lock:
+            self.misses += 1
+        return False
+
+    def get(self, key: str, vocab) -> Optional[Doc]:
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            doc = next(DocBin().from_bytes(data).get_docs(vocab))
+        except (OSError, ValueError, StopIteration):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass  # e.g. evicted by another worker since the read; the Doc is still good
+
+        with self._lock:
+            self.hits += 1
+            if self._lru is not None and path in self._lru:
+                self._lru.move_to_end(path)
+        return doc
+
+    def put(self, key: str, doc: Doc):
+        path = self._path(key)
+        data = DocBin(docs=[doc], store_user_data=False).to_bytes()
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Parse cache write failed: {e}")
+            return
+
+        with self._lock:
+            if self._lru is not None:
+                self._size += len(data) - self._lru.pop(path, 0)
+                self._lru[path] = len(data)
+        self._evict()
+
+    def _entries(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.spacy'):
+                    path = os.path.join(root, name)
+                    try:
+                        st = os.stat(path)
+                    except OSError:
+                        continue
+                    yield st.st_mtime, st.st_size, path
+
+    def _scan(self):
+        self._lru = OrderedDict((path, size) for _, size, path in sorted(self._entries()))
+        self._size = sum(self._lru.values())
+        self._puts_since_scan = 0
+        self._last_scan = time.time()
+
+    def _evict(self):
+        """Once over budget, drop least recently used entries down to the low-water mark"""
+        with self._lock:
+            self._puts_since_scan += 1
+            if self._size is not None and self._size <= self.max_bytes:
+                return
+
+            if self._lru is None or self._puts_since_scan >= self.rescan_puts or \
+                    time.time() - self._last_scan >= self.rescan_seconds:
+                self._scan()
+                if self._size <= self.max_bytes:
+                    return
+
+            target = self.max_bytes * self.low_water
+            while self._size > target and self._lru:
+                path, size = self._lru.popitem(last=False)
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass  # already evicted by another worker
+                self._size -= size
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'size_bytes': self._size,
+            'max_bytes': self.max_bytes
+        }
+
+
+_parse_cache = None
+
+
+def get_parse_cache() -> Optional[ParseCache]:
+    """Process-wide parse cache, or None when disabled with NATS_PARSE_CACHE_MB=0"""
+    global _parse_cache
+    if PARSE_CACHE_MB <= 0:
+        return None
+    if _parse_cache is None:
+        _parse_cache = ParseCache()
+    return _parse_cache
@@ -0,0 +1,114 @@
+# app/utils/text_chunker.py
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Texts longer than this are parsed in chunks rather than as one Doc
+CHUNK_SIZE = 50000
+
+
+def _chunk_end(text: str, start: int, chunk_size: int) -> int:
+    """End of the chunk starting at ``start``, preferring a sentence boundary"""
+    # Get a chunk
+    end_pos = min(start + chunk_size, len(text))
+
+    # If not at end, try to break at sentence boundary
+    if end_pos < len(text):
+        # Look for sentence endings near the end of the chunk
+        chunk_text = text[start:end_pos]
+        last_period = max(
+            chunk_text.rfind('. '),
+            chunk_text.rfind('! '),
+            chunk_text.rfind('? '),
+            chunk_text.rfind('.\n')
+        )
+
+        if last_period > chunk_size - min(1000, chunk_size // 2):  # Found a good break point
+            # Keep the whitespace after the punctuation with this chunk so the
+            # next one starts on a word
+            end_pos = start + last_period + 2
+
+    return end_pos
+
+
+def iter_text_chunks(text: str, chunk_size: int = CHUNK_SIZE) -> Iterator[Tuple[int, str]]:
+    """Split text into chunks, preferring sentence boundaries, yielding (offset, chunk).
+
+    A chunk ends after the last '. ', '! ', '? ' or '.\\n' in its final 1000
+    characters (its second half, for chunks under 2000 characters), else at
+    ``chunk_size``. The punctuation is not checked against abbreviations;
+    ``iter_chunk_records`` re-parses whatever sentence a cut splits.
+    """
+    current_pos = 0
+    while current_pos < len(text):
+        end_pos = _chunk_end(text, current_pos, chunk_size)
+        yield current_pos, text[current_pos:end_pos]
+        current_pos = end_pos
+
+
+def doc_to_record(doc, offset: int = 0, sents: Optional[List[Tuple[int, int]]] = None,
+                  end: Optional[int] = None) -> Dict[str, Any]:
+    """Reduce a parsed Doc to entity spans and sentence boundaries in global character offsets.
+
+    ``sents`` overrides the Doc's own sentences (e.g. ``PipelineView.sentences``).
+    With ``end``, only the sentences and entities before that character of
+    the Doc are kept.
+    """
+    if sents is None:
+        sents = [(sent.start_char, sent.end_char) for sent in doc.sents]
+    ents = list(doc.ents)
+    if end is not None:
+        sents = [(start, stop) for start, stop in sents if start < end]
+        ents = [ent for ent in ents if ent.end_char <= end]
+    return {
+        'offset': offset,
+        'length': len(doc.text) if end is None else end,
+        'ents': [(ent.start_char + offset, ent.end_char + offset, ent.label_) for ent in ents],
+        # Aligned with 'ents'; None when the pipeline has no lemmatizer
+        'lemmas': [ent.lemma_ for ent in ents] if doc.has_annotation('LEMMA') else None,
+        'sents': [(start + offset, stop + offset) for start, stop in sents]
+    }
+
+
+def iter_chunk_records(nlp, text: str, chunk_size: int = CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """Parse text window by window and yield one compact record per window.
+
+    A window is cut at sentence punctuation (see ``iter_text_chunks``), but
+    the cut may fall inside a sentence, e.g. after the '. ' of an
+    abbreviation. So the last sentence the model finds in a window is left
+    out of its record and the next window starts at that sentence: every
+    sentence is parsed whole from its own start, and sentence boundaries and
+    entities are those of a single parse of the text. Windows are parsed one
+    after another, since each starts where the previous parse says, and each
+    Doc is dropped as soon as its record is built: memory stays bounded by a
+    window rather than by the length of the text. Offsets in the records
+    refer to the original text, so callers can slice entity and sentence
+    text from it directly.
+    """
+    start = 0
+    while start < len(text):
+        end = _chunk_end(text, start, chunk_size)
+        doc = nlp(text[start:end])
+        cut = None
+        if end < len(text):
+            sent_starts = [sent.start_char for sent in doc.sents]
+            if len(sent_starts) > 1:
+                cut = sent_starts[-1]  # carry the possibly incomplete last sentence over
+        yield doc_to_record(doc, start, end=cut)
+        start += len(doc.text) if cut is None else cut
+
+
+def iter_sentence_entities(record: Dict[str, Any]) -> Iterator[Tuple[int, int, list]]:
+    """Yield (start, end, ents) for each sentence of a record, with the entities inside it"""
+    ents = record['ents']
+    i = 0
+
+    for sent_start, sent_end in record['sents']:
+        while i < len(ents) and ents[i][0] < sent_start:
+            i += 1
+
+        sent_ents = []
+        while i < len(ents) and ents[i][0] < sent_end:
+            if ents[i][1] <= sent_end:  # entities crossing the boundary belong to neither sentence
+                sent_ents.append(ents[i])
+            i += 1
+
+        yield sent_start, sent_end, sent_ents
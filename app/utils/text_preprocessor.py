@@ -1,11 +1,12 @@
 import os
 import chardet
-import spacy
-from typing import Dict, List, Optional
+from spacy.tokens import Doc
+from app.utils.nlp_registry import get_pipeline
+from typing import Dict, Optional
 
 class TextPreprocessor:
     def __init__(self):
-        self.nlp = spacy.load('el_core_news_md')  # Greek language model
+        self.nlp = get_pipeline()  # Greek language model
         self.texts = {}
         
     def load_text(self, file_path: str) -> Optional[str]:
@@ -23,11 +24,11 @@ class TextPreprocessor:
             print(f"Error loading {file_path}: {str(e)}")
             return None
     
-    def process_text(self, text: str) -> spacy.tokens.Doc:
+    def process_text(self, text: str) -> Doc:
         """Process text using spaCy"""
         return self.nlp(text.lower())
     
-    def load_directory(self, directory: str) -> Dict[str, spacy.tokens.Doc]:
+    def load_directory(self, directory: str) -> Dict[str, Doc]:
         """Load and process all texts from a directory"""
         for filename in os.listdir(directory):
             if filename.endswith('.txt'):
@@ -37,6 +38,6 @@ class TextPreprocessor:
                     self.texts[filename] = self.process_text(text)
         return self.texts
     
-    def get_processed_texts(self) -> Dict[str, spacy.tokens.Doc]:
+    def get_processed_texts(self) -> Dict[str, Doc]:
         """Get all processed texts"""
         return self.texts
\ No newline at end of file
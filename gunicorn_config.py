@@ -1,2 +1,58 @@
-bind = "0.0.0.0:" + os.environ.get("PORT", "8000")
-workers = 4
+import os
+
+bind = "0.0.0.0:" + os.environ.get("PORT", "8000")
+workers = 4
+
+# Build the app (and its spaCy models) once in the master before forking, so the
+# workers share the model pages copy-on-write instead of each loading a copy.
+# NATS_PRELOAD=0 builds the app in each worker instead.
+preload_app = os.environ.setdefault("NATS_PRELOAD", "1") == "1"
+# Background warm-up threads are started per worker by post_worker_init, never in the master
+os.environ["NATS_WARMUP_HOOK"] = "1"
+
+
+def post_worker_init(worker):
+    """Warm up, in a thread of this worker, the models not already loaded by the master"""
+    app = worker.wsgi
+    if app.config['WARMUP_MODELS']:
+        app.extensions['models'].warm_up(retries=app.config['WARMUP_RETRIES'])
+
+
+def on_starting(server):
+    """Optionally start one local embedding server shared by every worker"""
+    if os.environ.get("NATS_EMBEDDING_SERVER") != "1":
+        return
+
+    import secrets
+    import subprocess
+    import sys
+    import tempfile
+    import time
+
+    # Fresh secret per boot, inherited by the server and the workers through the
+    # environment; the socket lives in a private 0700 directory
+    os.environ["NATS_EMBEDDING_AUTHKEY"] = secrets.token_hex(32)
+    if not os.environ.get("NATS_EMBEDDING_SOCKET"):
+        server.embedding_dir = tempfile.mkdtemp(prefix="nats-embed-")
+        os.environ["NATS_EMBEDDING_SOCKET"] = os.path.join(server.embedding_dir, "embed.sock")
+    socket_path = os.environ["NATS_EMBEDDING_SOCKET"]
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    server.embedding_server = subprocess.Popen(
+        [sys.executable, "-m", "app.utils.embedding_server", "--socket", socket_path])
+
+    # Workers fall back to a local model if the socket is missing, so wait for it
+    for _ in range(600):
+        if os.path.exists(socket_path) or server.embedding_server.poll() is not None:
+            break
+        time.sleep(0.5)
+
+
+def on_exit(server):
+    embedding_server = getattr(server, "embedding_server", None)
+    if embedding_server is not None:
+        embedding_server.terminate()
+    embedding_dir = getattr(server, "embedding_dir", None)
+    if embedding_dir is not None:
+        import shutil
+        shutil.rmtree(embedding_dir, ignore_errors=True)
@@ -0,0 +1,52 @@
+# tests/test_alias_store.py
+import pytest
+from app.utils.alias_store import AliasStore
+from app.models.entity_normalizer import EntityNormalizer
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'aliases.jsonl')
+
+def test_records_and_reloads(path):
+    store = AliasStore(path)
+    store.record([('Γιώργου', 'PERSON', 'Γιώργος'), ('Αθήνα', 'LOC', 'Αθήνα')])
+
+    assert len(store) == 1  # identity mappings are not stored
+    assert AliasStore(path).lookup('Γιώργου', 'PERSON') == 'Γιώργος'
+    assert AliasStore(path).lookup('Γιώργου', 'LOC') is None
+
+def test_sees_updates_from_other_writers(path):
+    first, second = AliasStore(path), AliasStore(path)
+    second.record([('Γιώργο', 'PERSON', 'Γιώργος')])
+    first.record([('Γιώργο', 'PERSON', 'Γιωργος')])
+
+    second.refresh()
+    assert first.lookup('Γιώργο', 'PERSON') == second.lookup('Γιώργο', 'PERSON') == 'Γιωργος'
+
+def test_normalizer_learns_aliases_across_documents(path):
+    EntityNormalizer(0.85, AliasStore(path)).normalize({'Γιώργος': 'PERSON', 'Γιώργου': 'PERSON'})
+
+    # On its own this document would make Γιώργου canonical
+    normalized, entity_map = EntityNormalizer(0.85, AliasStore(path)).normalize({'Γιώργου': 'PERSON'})
+
+    assert normalized == {'Γιώργος': 'PERSON'}
+    assert entity_map == {'Γιώργου': 'Γιώργος'}
+
+def test_lookup_follows_alias_chains(path):
+    store = AliasStore(path)
+    store.record([('Γιώργου', 'PERSON', 'Γιώργο')])
+    store.record([('Γιώργο', 'PERSON', 'Γιώργος')])
+
+    assert store.lookup('Γιώργου', 'PERSON') == 'Γιώργος'
+    # The later entry wins in a cycle, and a lookup stops before repeating a name
+    store.record([('Γιώργος', 'PERSON', 'Γιώργο')])
+    assert store.lookup('Γιώργου', 'PERSON') == 'Γιώργο'
+    assert store.lookup('Γιώργο', 'PERSON') == 'Γιώργο'
+
+def test_normalizer_sees_aliases_recorded_by_other_workers(path):
+    store, other = AliasStore(path), AliasStore(path)
+    other.record([('Γιώργου', 'PERSON', 'Γιώργος')])
+
+    normalized, entity_map = EntityNormalizer(0.85, store).normalize({'Γιώργου': 'PERSON'})
+
+    assert entity_map == {'Γιώργου': 'Γιώργος'}
@@ -0,0 +1,94 @@
+# tests/test_app.py
+import gc
+import importlib
+import threading
+
+import numpy as np
+import pytest
+
+import app as app_module
+from app.models.document_index import DocumentIndex
+from app.routes import api_routes
+from app.utils.model_loader import ModelLoader
+
+@pytest.fixture
+def loaded(monkeypatch, tmp_path):
+    """create_app with stub models; records which models were built"""
+    monkeypatch.chdir(tmp_path)
+    for name in ('NATS_PRELOAD', 'NATS_WARMUP', 'NATS_WARMUP_HOOK'):
+        monkeypatch.delenv(name, raising=False)
+    built = []
+
+    def create_models(app):
+        models = ModelLoader()
+        for name in app_module.PRELOAD_MODELS + ['sentence_model']:
+            models.register(name, lambda name=name: built.append(name) or name)
+        return models
+
+    monkeypatch.setattr(app_module, 'create_models', create_models)
+    yield built
+    gc.unfreeze()
+
+def warm_up_threads():
+    return [thread for thread in threading.enumerate() if thread.name == 'model-warmup']
+
+def ready(app):
+    return app.test_client().get('/api/health/ready').status_code
+
+def test_preload_loads_in_the_master_without_threads(loaded, monkeypatch):
+    monkeypatch.setenv('NATS_PRELOAD', '1')
+    monkeypatch.setenv('NATS_WARMUP_HOOK', '1')
+
+    app = app_module.create_app()
+
+    assert loaded == app_module.PRELOAD_MODELS
+    assert warm_up_threads() == []
+    assert ready(app) == 503  # the sentence model is still to come
+
+def test_gunicorn_hook_warms_up_each_worker(loaded, monkeypatch):
+    monkeypatch.setenv('NATS_PRELOAD', '0')
+    monkeypatch.setenv('NATS_WARMUP_HOOK', '0')  # restored after the config module sets it
+    gunicorn_config = importlib.import_module('gunicorn_config')
+    gunicorn_config = importlib.reload(gunicorn_config)
+
+    app = app_module.create_app()
+    assert gunicorn_config.preload_app is False
+    assert loaded == [] and warm_up_threads() == []  # nothing runs until the worker hook
+
+    class Worker:
+        wsgi = app
+    gunicorn_config.post_worker_init(Worker())
+    for thread in warm_up_threads():
+        thread.join(timeout=5)
+
+    assert sorted(loaded) == sorted(app_module.PRELOAD_MODELS + ['sentence_model'])
+    assert ready(app) == 200
+
+def test_without_gunicorn_warms_up_in_the_background(loaded):
+    app = app_module.create_app()
+    for thread in warm_up_threads():
+        thread.join(timeout=5)
+
+    assert len(loaded) == len(app_module.PRELOAD_MODELS) + 1
+    assert ready(app) == 200
+
+def test_no_warm_up_is_ready_at_once(loaded, monkeypatch):
+    monkeypatch.setenv('NATS_WARMUP', '0')
+
+    app = app_module.create_app()
+
+    assert loaded == []
+    assert ready(app) == 200
+
+def test_delete_removes_document_from_index(loaded, monkeypatch, tmp_path):
+    pytest.importorskip('faiss')
+    monkeypatch.setenv('NATS_WARMUP', '0')
+    index = DocumentIndex(str(tmp_path / 'index'), snapshot_interval=3600)
+    index.add('key1', np.ones(4, dtype=np.float32), source='a1/one.txt')
+    monkeypatch.setattr(api_routes, '_document_index', lambda doc_analyzer: index)
+    client = app_module.create_app().test_client()
+
+    response = client.delete('/api/search/a1/one.txt')
+    assert response.status_code == 200 and response.get_json()['removed'] == 'key1'
+    assert len(index) == 0
+    assert client.delete('/api/search/a1/one.txt').status_code == 404
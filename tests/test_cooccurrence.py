@@ -0,0 +1,81 @@
+# tests/test_cooccurrence.py
+import math
+import random
+from collections import defaultdict
+
+import pytest
+from app.models.cooccurrence import CooccurrenceMatrix
+
+def random_sentences(seed, n_sentences=200, n_entities=30):
+    rng = random.Random(seed)
+    names = [f'E{i}' for i in range(n_entities)]
+    return [[rng.choice(names) for _ in range(rng.randint(0, 8))] for _ in range(n_sentences)]
+
+def brute_force(sentences):
+    """The nested-loop pair counting this replaces"""
+    counts, first, totals = defaultdict(int), defaultdict(list), defaultdict(int)
+    for i, sentence in enumerate(sentences):
+        names = list(dict.fromkeys(sentence))
+        for name in names:
+            totals[name] += 1
+        for a in range(len(names)):
+            for b in range(a + 1, len(names)):
+                pair = tuple(sorted([names[a], names[b]]))
+                counts[pair] += 1
+                first[pair].append(i)
+    return counts, first, totals
+
+@pytest.mark.parametrize('window', [1, 7, 1000])
+@pytest.mark.parametrize('seed', range(3))
+def test_counts_and_pmi_match_nested_loops(seed, window):
+    sentences = random_sentences(seed)
+    counts, first, totals = brute_force(sentences)
+
+    matrix = CooccurrenceMatrix()
+    for i, sentence in enumerate(sentences):
+        matrix.add_entities(sentence, key=i)
+        if (i + 1) % window == 0:
+            matrix.flush()  # streaming windows
+
+    pairs = matrix.pairs(max_contexts=2)
+    assert {tuple(sorted(p['entities'])): p['count'] for p in pairs} == counts
+    assert {tuple(sorted(p['entities'])): p['contexts'] for p in pairs} == {pair: rows[:2] for pair, rows in first.items()}
+    assert [p['contexts'][0] for p in pairs] == sorted(rows[0] for rows in first.values())
+
+    for p in matrix.pairs('pmi', min_weight=0.5):
+        (a, b), count = p['entities'], p['count']
+        expected = math.log(len(sentences) * count / (totals[a] * totals[b]))
+        assert p['weight'] == pytest.approx(expected)
+        assert expected >= 0.5
+
+def test_merged_columns_count_each_sentence_once():
+    matrix = CooccurrenceMatrix()
+    matrix.add_entities(['Γιώργος', 'Γιώργου', 'Αθήνα'], key='s1')
+    matrix.add_entities(['Γιώργο', 'Αθήνα', 'και'], key='s2')
+    matrix.add_entities(['Γιώργος', 'Γιώργου'], key='s3')
+
+    merged = matrix.merged([0, 0, 1, 0, None], ['Γιώργος', 'Αθήνα'])
+
+    assert merged.pairs() == [{'entities': ('Γιώργος', 'Αθήνα'), 'count': 2, 'weight': 2.0,
+                               'contexts': ['s1', 's2']}]
+
+@pytest.mark.parametrize('seed', range(3))
+def test_without_rows_matches_full_matrix(seed):
+    sentences = random_sentences(seed)
+    full, compact = CooccurrenceMatrix(), CooccurrenceMatrix(keep_rows=False)
+    for i, sentence in enumerate(sentences):
+        for matrix in (full, compact):
+            matrix.add_entities(sentence, key=f's{i}')
+            if (i + 1) % 7 == 0:
+                matrix.flush()
+
+    assert compact.pairs(max_contexts=1) == full.pairs(max_contexts=1)
+    assert compact.pairs('pmi') == [dict(p, contexts=p['contexts'][:1]) for p in full.pairs('pmi')]
+    assert not compact._blocks
+
+    rng = random.Random(seed)
+    canonical = ['A', 'B', 'C', 'D', 'E']
+    mapping = [rng.choice([None, 0, 1, 2, 3, 4]) for _ in full.names]
+    expected = [p['entities'] for p in full.merged(mapping, canonical).pairs()]
+    assert compact.merged_pairs(mapping, canonical) == expected
+    assert full.merged_pairs(mapping, canonical) == expected
@@ -0,0 +1,72 @@
+# tests/test_dimension_reducer.py
+import threading
+import time
+
+import numpy as np
+import app.models.dimension_reducer as dimension_reducer
+from app.models.dimension_reducer import DimensionReducer
+
+def embeddings(n=40, dim=16, seed=0):
+    rng = np.random.default_rng(seed)
+    return {f'doc{i}': vector for i, vector in enumerate(rng.normal(size=(n, dim)))}
+
+def test_iter_reductions_runs_each_method():
+    results = dict(DimensionReducer().iter_reductions(embeddings(), ('pca', 'tsne'), time_budget=120))
+
+    assert set(results) == {'pca', 'tsne'}
+    assert 'fallback' not in results['tsne']
+    assert np.asarray(results['tsne']['coordinates']).shape == (40, 2)
+    assert results['tsne']['labels'] == list(embeddings())
+
+def test_timeout_falls_back_without_affecting_other_requests(monkeypatch):
+    monkeypatch.setattr(dimension_reducer, 'IN_PROCESS_MAX_ROWS', 0)
+    other = {}
+    thread = threading.Thread(target=lambda: other.update(
+        DimensionReducer().analyze_both(embeddings(seed=1), ('tsne',), time_budget=120)))
+    thread.start()
+
+    overrun = DimensionReducer().analyze_both(embeddings(n=2000), ('pca', 'tsne'), time_budget={'tsne': 0.5})
+    thread.join()
+
+    assert overrun['tsne']['fallback'] == 'pca'
+    assert overrun['tsne']['coordinates'] == overrun['pca']['coordinates']
+    assert 'fallback' not in other['tsne']
+
+def test_missing_umap_is_marked_as_fallback(monkeypatch):
+    monkeypatch.setattr(dimension_reducer, 'UMAP_AVAILABLE', False)
+
+    results = DimensionReducer().analyze_both(embeddings(), ('pca', 'umap'))
+
+    assert results['umap']['fallback'] == 'pca'
+    assert results['umap']['coordinates'] == results['pca']['coordinates']
+
+def test_small_inputs_run_in_process(monkeypatch):
+    def no_spawn(self):
+        raise AssertionError('spawned a reducer process')
+    monkeypatch.setattr(dimension_reducer._ReducerJob, 'start', no_spawn)
+
+    results = DimensionReducer().analyze_both(embeddings(), ('pca', 'tsne'))
+
+    assert 'fallback' not in results['tsne']
+    assert np.asarray(results['tsne']['coordinates']).shape == (40, 2)
+
+def test_jobs_are_submitted_before_the_first_result(monkeypatch):
+    monkeypatch.setattr(dimension_reducer, 'IN_PROCESS_MAX_ROWS', 0)
+    started = []
+    monkeypatch.setattr(dimension_reducer._ReducerJob, 'start', lambda self: started.append(self.args[1]) or False)
+
+    reductions = DimensionReducer().iter_reductions(embeddings(), ('pca', 'tsne'))
+    assert next(reductions)[0] == 'pca'
+    assert started == ['tsne']
+    reductions.close()
+
+def test_budget_starts_with_the_process():
+    job = dimension_reducer._ReducerJob(np.zeros((10, 4)), 'pca', 2, 30)
+    assert job.deadline is None  # waiting for a slot does not use up the budget
+
+    before = time.time()
+    assert job.start()
+    try:
+        assert job.deadline >= before + 30
+    finally:
+        job.close(kill=True)
@@ -0,0 +1,58 @@
+# tests/test_doc2vec_backend.py
+import fcntl
+import os
+import threading
+import time
+
+import pytest
+
+pytest.importorskip('gensim')
+from app.models.doc2vec_backend import Doc2VecBackend
+
+DOCUMENTS = {
+    'a.txt': ['η', 'αθήνα', 'είναι', 'πόλη'],
+    'b.txt': ['ο', 'γιώργος', 'μένει', 'εκεί'],
+}
+
+def make_backend(tmp_path, **kwargs):
+    return Doc2VecBackend(str(tmp_path), vector_size=8, epochs=2, workers=1, **kwargs)
+
+def test_tiny_corpus_falls_back_to_min_count_one(tmp_path):
+    backend = make_backend(tmp_path)  # min_count=2, but every word occurs once
+
+    vectors = backend.infer(DOCUMENTS)
+
+    assert set(vectors) == set(DOCUMENTS)
+    assert all(v.shape == (8,) for v in vectors.values())
+
+def test_old_versions_are_pruned(tmp_path):
+    backend = make_backend(tmp_path, keep_versions=2)
+    backend.add_documents(DOCUMENTS)
+
+    versions = []
+    for i in range(4):
+        backend.add_documents({'new': ['έγγραφο', str(i)]})
+        versions.append(backend.train())
+        time.sleep(1.01)  # versions are named by the second
+
+    assert sorted(os.listdir(tmp_path / 'models')) == versions[-2:]
+
+def test_waits_for_another_worker_training_the_first_model(tmp_path):
+    trainer = make_backend(tmp_path)
+    trainer.add_documents(DOCUMENTS)
+    backend = make_backend(tmp_path)
+    trained = []
+    backend.train = lambda: trained.append(1)
+
+    with open(str(tmp_path / '.lock') + '.train', 'w') as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        waiter = threading.Thread(target=backend.ensure_model)
+        waiter.start()
+        time.sleep(0.2)
+        assert waiter.is_alive()  # blocked on the other worker, not failing
+        trainer.train()
+    waiter.join(timeout=10)
+
+    assert backend.model is not None
+    assert backend.version == trainer._current_version()
+    assert trained == []
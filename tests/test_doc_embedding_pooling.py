@@ -0,0 +1,135 @@
+# tests/test_doc_embedding_pooling.py
+import numpy as np
+import pytest
+import spacy
+
+import app.models.doc_embeddings as doc_embeddings
+from app.utils.nlp_registry import PipelineView
+
+class StubModel:
+    """Encodes a sentence as (length, spaces, character sum mod 101) and records each batch"""
+
+    def __init__(self):
+        self.batches = []
+        self.pool_batches = []
+
+    def vector(self, sentence):
+        return [len(sentence), sentence.count(' '), sum(map(ord, sentence)) % 101]
+
+    def encode(self, sentences, batch_size=32):
+        self.batches.append(list(sentences))
+        return np.array([self.vector(sentence) for sentence in sentences], dtype=np.float32)
+
+    def encode_multi_process(self, sentences, pool, batch_size=32):
+        self.pool_batches.append(list(sentences))
+        return np.array([self.vector(sentence) for sentence in sentences], dtype=np.float32)
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    nlp = spacy.blank('el')
+    monkeypatch.setattr(doc_embeddings, 'get_pipeline', lambda **kwargs: PipelineView(nlp, sentencizer=True))
+    analyzer = doc_embeddings.EnhancedDocEmbeddingAnalyzer()
+    analyzer._sentence_model = StubModel()
+    return analyzer
+
+TEXTS = {
+    'a.txt': 'Η πρώτη πρόταση εδώ. Μια δεύτερη και πολύ μεγαλύτερη πρόταση. Τρίτη σύντομη φράση.',
+    'b.txt': 'Ένα κείμενο με μία μόνο αρκετά μακριά πρόταση μέσα του.',
+    'c.txt': 'Άλλη μία πρόταση. Και ακόμα μία εδώ πέρα για το τέλος.'
+}
+
+def sentences_of(analyzer, text):
+    return [text[start:end] for start, end in analyzer.nlp.sentences(analyzer.nlp(text))]
+
+def test_windows_are_sorted_by_length(analyzer):
+    analyzer.encode_window = 2
+
+    analyzer.create_embeddings(TEXTS)
+
+    batches = analyzer.sentence_model.batches
+    assert len(batches) > 1 and all(len(batch) <= 2 for batch in batches)
+    lengths = [len(sentence) for batch in batches for sentence in batch]
+    assert lengths == sorted(lengths)
+
+def test_window_vectors_are_pooled_back_to_their_documents(analyzer):
+    analyzer.encode_window = 2
+
+    embeddings = analyzer.create_embeddings(TEXTS)
+
+    assert list(embeddings) == list(TEXTS)
+    model = analyzer.sentence_model
+    for filename, text in TEXTS.items():
+        expected = np.mean([model.vector(sentence) for sentence in sentences_of(analyzer, text)], axis=0)
+        np.testing.assert_allclose(embeddings[filename], expected, rtol=1e-6)
+
+def test_max_pooling_differs_from_mean(analyzer):
+    mean = analyzer.create_embeddings(TEXTS, pooling='mean')
+    maximum = analyzer.create_embeddings(TEXTS, pooling='max')
+
+    model = analyzer.sentence_model
+    vectors = [model.vector(sentence) for sentence in sentences_of(analyzer, TEXTS['a.txt'])]
+    np.testing.assert_allclose(maximum['a.txt'], np.max(vectors, axis=0))
+    assert not np.allclose(mean['a.txt'], maximum['a.txt'])
+    # A single sentence is its own mean and max
+    np.testing.assert_allclose(mean['b.txt'], maximum['b.txt'])
+
+def test_every_sentence_is_encoded_unless_capped(analyzer):
+    text = ' '.join(f'Πρόταση αριθμός {i} του κειμένου.' for i in range(30))
+
+    analyzer.create_embeddings({'long.txt': text})
+    assert sum(len(batch) for batch in analyzer.sentence_model.batches) == 30
+
+    analyzer.sentence_model.batches.clear()
+    analyzer.create_embeddings({'long.txt': text}, max_sentences=5)
+    assert sum(len(batch) for batch in analyzer.sentence_model.batches) == 5
+
+def test_documents_without_sentences_are_dropped(analyzer):
+    embeddings = analyzer.create_embeddings(dict(TEXTS, **{'short.txt': 'Γεια σου.', 'empty.txt': ''}))
+
+    assert list(embeddings) == list(TEXTS)
+    assert analyzer.create_embeddings({'short.txt': 'Γεια σου.'}) == {}
+
+@pytest.mark.parametrize('pooling', ['mean', 'max'])
+def test_streaming_pooling_matches_naive_pooling(analyzer, pooling):
+    rng = np.random.default_rng(0)
+    words = ['λέξη', 'κείμενο', 'α', 'πρόταση', 'μεγάλη']
+    texts = [' '.join(f"{' '.join(rng.choice(words, rng.integers(1, 8)))}." for _ in range(rng.integers(1, 12)))
+             for _ in range(5)]
+    sentences = [(doc_id, start, end) for doc_id, text in enumerate(texts)
+                 for start, end in analyzer.nlp.sentences(analyzer.nlp(text))]
+    analyzer.encode_window = 4
+
+    pooled = analyzer.encode_pooled(sentences, texts, pooling)
+
+    assert len(analyzer.sentence_model.batches) > 1
+    model = analyzer.sentence_model
+    naive = np.mean if pooling == 'mean' else np.max
+    for doc_id, text in enumerate(texts):
+        vectors = [model.vector(text[start:end]) for d, start, end in sentences if d == doc_id]
+        np.testing.assert_allclose(pooled[doc_id], naive(vectors, axis=0), rtol=1e-6)
+
+def test_encode_pool_only_above_the_sentence_threshold(analyzer, monkeypatch):
+    monkeypatch.setattr(doc_embeddings, 'ENCODE_POOL_MIN_SENTENCES', 5)
+    monkeypatch.setattr(doc_embeddings.EnhancedDocEmbeddingAnalyzer, 'encode_pool',
+                        property(lambda self: {'processes': [None, None]}))
+    analyzer.encode_window = 2
+    model = analyzer.sentence_model
+
+    # 'a.txt' and 'c.txt' have 5 sentences between them, 'b.txt' just one
+    single = analyzer.create_embeddings({'b.txt': TEXTS['b.txt']})
+    assert len(model.batches) == 1 and model.pool_batches == []
+
+    model.batches.clear()
+    pooled = analyzer.create_embeddings({name: TEXTS[name] for name in ('a.txt', 'c.txt')})
+    assert model.batches == [] and len(model.pool_batches) == 2
+    assert len(model.pool_batches[0]) == 4  # a full window per pool process
+    np.testing.assert_allclose(pooled['a.txt'], analyzer.create_embeddings({'a.txt': TEXTS['a.txt']})['a.txt'])
+    assert list(single) == ['b.txt']
+
+def test_without_encode_pool_large_requests_encode_in_process(analyzer, monkeypatch):
+    monkeypatch.setattr(doc_embeddings, 'ENCODE_POOL', False)
+    monkeypatch.setattr(doc_embeddings, 'ENCODE_POOL_MIN_SENTENCES', 1)
+
+    assert analyzer.encode_pool is None
+    analyzer.create_embeddings(TEXTS)
+    assert analyzer.sentence_model.pool_batches == []
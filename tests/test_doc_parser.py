@@ -0,0 +1,39 @@
+# tests/test_doc_parser.py
+import spacy
+
+import app.models.network_analyzer as network_analyzer
+from app.utils.doc_parser import SharedDocParser
+from app.utils.nlp_registry import PipelineView
+from app.utils.text_chunker import CHUNK_SIZE
+
+SENTENCE = 'Ο Γιώργος έμεινε στην Αθήνα πολλά χρόνια. '
+
+def ruler_pipeline():
+    nlp = spacy.blank('el')
+    ruler = nlp.add_pipe('entity_ruler')
+    ruler.add_patterns([{'label': 'PERSON', 'pattern': 'Γιώργος'}, {'label': 'LOC', 'pattern': 'Αθήνα'}])
+    return nlp
+
+def test_only_texts_under_the_chunk_size_are_pre_parsed():
+    texts = {'short.txt': SENTENCE * 10, 'long.txt': SENTENCE * (CHUNK_SIZE // len(SENTENCE) + 1)}
+
+    docs = SharedDocParser(PipelineView(spacy.blank('el'))).parse(texts)
+
+    assert list(docs) == ['short.txt']
+
+def test_long_text_reaches_the_chunked_network_path(monkeypatch, tmp_path):
+    nlp = ruler_pipeline()
+    monkeypatch.setattr(network_analyzer, 'get_pipeline', lambda **kwargs: PipelineView(nlp, **kwargs))
+    monkeypatch.setattr(network_analyzer, 'get_alias_store', lambda: None)
+    chunked = []
+    iter_chunk_records = network_analyzer.iter_chunk_records
+    monkeypatch.setattr(network_analyzer, 'iter_chunk_records',
+                        lambda *args, **kwargs: chunked.append(args[2]) or iter_chunk_records(*args, **kwargs))
+    analyzer = network_analyzer.EnhancedNetworkAnalyzer()
+    text = SENTENCE * (CHUNK_SIZE // len(SENTENCE) + 1)
+
+    docs = SharedDocParser(analyzer.nlp).parse({'long.txt': text})
+    result = analyzer.create_network(text, output_dir=str(tmp_path), doc=docs.get('long.txt'))
+
+    assert chunked == [CHUNK_SIZE]
+    assert set(result['entities']) == {'Γιώργος', 'Αθήνα'}
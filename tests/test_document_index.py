@@ -0,0 +1,73 @@
+# tests/test_document_index.py
+import time
+
+import numpy as np
+import pytest
+
+faiss = pytest.importorskip('faiss')
+from app.models.document_index import DocumentIndex, content_key
+
+def vectors(n, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+@pytest.mark.parametrize('index_type', ['flat', 'ivf', 'hnsw'])
+def test_add_search_remove(tmp_path, index_type):
+    index = DocumentIndex(str(tmp_path), index_type=index_type, nlist=2, snapshot_interval=3600)
+    data = vectors(100)
+    for i, vector in enumerate(data):
+        index.add(f'doc{i}', vector, {'n': i})
+
+    assert index.kind == ('ivf' if index_type == 'ivf' else index_type)  # IVF trains at 2 x 39 vectors
+    assert index.search(data[7], k=1)[0]['key'] == 'doc7'
+    assert [r['key'] for r in index.search(data[7], k=3, exclude=['doc7'])][0] != 'doc7'
+
+    assert index.remove('doc7')
+    assert 'doc7' not in [r['key'] for r in index.search(data[7], k=10)]
+    assert len(index) == 99
+
+def test_hnsw_tombstones_are_rebuilt_on_snapshot(tmp_path):
+    index = DocumentIndex(str(tmp_path), index_type='hnsw', snapshot_interval=3600)
+    for i, vector in enumerate(vectors(20)):
+        index.add(f'doc{i}', vector)
+    for i in range(10):
+        index.remove(f'doc{i}')
+    assert len(index.tombstones) == 10
+
+    index.snapshot()
+    assert index.tombstones == set() and index.index.ntotal == 10
+
+def test_workers_merge_snapshots(tmp_path):
+    first = DocumentIndex(str(tmp_path), snapshot_interval=3600)
+    second = DocumentIndex(str(tmp_path), snapshot_interval=3600)
+    data = vectors(2)
+    first.add('a', data[0])
+    second.add('b', data[1])
+    first.snapshot()
+    second.snapshot()
+
+    assert second.search(data[0], k=1)[0]['key'] == 'a'
+    assert first.search(data[1], k=1)[0]['key'] == 'b'  # first reloads second's snapshot
+    assert len(DocumentIndex(str(tmp_path))) == 2
+
+def test_reanalysed_text_replaces_its_entry(tmp_path):
+    index = DocumentIndex(str(tmp_path), snapshot_interval=3600)
+    vector = vectors(1)[0]
+    for analysis_id in ('run1', 'run2'):
+        index.add(content_key('same text'), vector, {'analysis_id': analysis_id},
+                  source=f'{analysis_id}/doc.txt')
+
+    assert len(index) == 1
+    assert index.resolve('run1/doc.txt') == index.resolve('run2/doc.txt') == content_key('same text')
+    assert index.search(vector, k=5)[0]['analysis_id'] == 'run2'
+
+def test_flusher_snapshots_pending_adds(tmp_path):
+    index = DocumentIndex(str(tmp_path), snapshot_interval=0.05)
+    index.start_flusher()
+    index._last_snapshot = float('inf')  # no snapshot from add itself
+    index.add('a', vectors(1)[0])
+
+    for _ in range(100):
+        if not index._pending:
+            break
+        time.sleep(0.02)
+    assert len(DocumentIndex(str(tmp_path))) == 1
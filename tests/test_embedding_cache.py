@@ -0,0 +1,71 @@
+# tests/test_embedding_cache.py
+import os
+
+import numpy as np
+import app.utils.embedding_cache as embedding_cache
+from app.utils.embedding_cache import EmbeddingCache
+
+DIM = 4
+
+def fake_encode(sentences):
+    calls.append(list(sentences))
+    return np.array([[len(s) / 3, 1 / 3, np.pi, -len(s)] for s in sentences], dtype=np.float32)
+
+calls = []
+
+def make_cache(tmp_path, **kwargs):
+    return EmbeddingCache('test-model', cache_dir=str(tmp_path), **kwargs)
+
+def test_hits_and_misses_return_identical_values(tmp_path):
+    sentences = ['ένα', 'δύο  ', 'τρία', 'ένα']
+    first = make_cache(tmp_path).encode(sentences, fake_encode)
+    calls.clear()
+    second = make_cache(tmp_path, memory_bytes=0).encode(sentences, fake_encode)  # disk tier only
+
+    assert calls == []
+    assert np.array_equal(first, second)
+    assert np.array_equal(first, fake_encode(sentences).astype(np.float16).astype(np.float32))
+
+def test_torn_writes_are_repaired_before_appending(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.encode(['a', 'bb'], fake_encode)
+    generation = os.path.join(cache.directory, 'gen-0')
+    with open(os.path.join(generation, 'vectors.f16'), 'ab') as f:
+        f.write(b'\x00\x01\x02')  # half a row
+
+    cache.encode(['ccc'], fake_encode)
+    reread = make_cache(tmp_path, memory_bytes=0)
+    calls.clear()
+    vectors = reread.encode(['a', 'bb', 'ccc'], fake_encode)
+
+    assert calls == []
+    assert np.array_equal(vectors, fake_encode(['a', 'bb', 'ccc']).astype(np.float16).astype(np.float32))
+
+def test_disk_tier_rotates_generations_and_keeps_used_vectors(tmp_path):
+    budget = 20 * DIM * 2  # 20 rows; a generation holds 10
+    cache = make_cache(tmp_path, memory_bytes=0, disk_bytes=budget)
+    for i in range(60):
+        cache.encode([f'sentence {i}', 'hot'], fake_encode)
+
+    generations = [name for name in os.listdir(cache.directory) if name.startswith('gen-')]
+    assert len(generations) <= 2
+    used = sum(os.path.getsize(os.path.join(cache.directory, name, 'vectors.f16')) for name in generations)
+    assert used <= budget
+
+    calls.clear()
+    make_cache(tmp_path, memory_bytes=0, disk_bytes=budget).encode(['hot'], fake_encode)
+    assert calls == []  # copied forward on every rotation
+
+def test_disk_index_is_queried_not_loaded(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, '_LOOKUP_BATCH', 2)
+    sentences = [f'sentence {i}' for i in range(5)]
+    reader = make_cache(tmp_path, memory_bytes=0)
+    reader.encode(['warm up'], fake_encode)  # opens the index before the writer adds to it
+
+    make_cache(tmp_path).encode(sentences, fake_encode)
+    calls.clear()
+    vectors = reader.encode(sentences + ['warm up'], fake_encode)
+
+    assert calls == []  # another worker's entries are found without reloading anything
+    assert np.array_equal(vectors, fake_encode(sentences + ['warm up']).astype(np.float16).astype(np.float32))
+    assert reader.stats()['disk_entries'] == 6
@@ -0,0 +1,53 @@
+# tests/test_embedding_server.py
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+from app.utils.embedding_server import EmbeddingClient, EmbeddingServer, ensure_private_dir, get_authkey
+
+class FakeModel:
+    def encode(self, sentences, batch_size=32):
+        return np.array([[len(s), 1.0] for s in sentences], dtype=np.float32)
+
+    def get_sentence_embedding_dimension(self):
+        return 2
+
+class FakeServer(EmbeddingServer):
+    def load_model(self):
+        self.model = FakeModel()
+        self.model_name = 'fake-model'
+
+def test_refuses_without_key(monkeypatch):
+    monkeypatch.delenv('NATS_EMBEDDING_AUTHKEY', raising=False)
+    with pytest.raises(RuntimeError):
+        get_authkey()
+
+def test_refuses_shared_directory(tmp_path):
+    shared = tmp_path / 'shared'
+    shared.mkdir(mode=0o755)
+    os.chmod(shared, 0o755)
+    with pytest.raises(RuntimeError):
+        ensure_private_dir(str(shared))
+
+def test_round_trip_reports_loaded_model(tmp_path, monkeypatch):
+    monkeypatch.setenv('NATS_EMBEDDING_AUTHKEY', 'test-secret')
+    socket_path = str(tmp_path / 'private' / 'embed.sock')
+    server = FakeServer(socket_path, model_name='requested-model')
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    for _ in range(100):
+        if os.path.exists(socket_path):
+            break
+        time.sleep(0.05)
+
+    assert os.stat(os.path.dirname(socket_path)).st_mode & 0o077 == 0
+    client = EmbeddingClient(socket_path)
+    assert client.model_name == 'fake-model'
+    assert client.encode(['ab', 'abcd']).tolist() == [[2.0, 1.0], [4.0, 1.0]]
+
+    monkeypatch.setenv('NATS_EMBEDDING_AUTHKEY', 'wrong-secret')
+    with pytest.raises(Exception):
+        EmbeddingClient(socket_path).encode(['ab'])
+    monkeypatch.setenv('NATS_EMBEDDING_AUTHKEY', 'test-secret')
+    assert EmbeddingClient(socket_path).model_name == 'fake-model'  # still serving
@@ -0,0 +1,35 @@
+# tests/test_embedding_store.py
+import json
+import os
+
+import numpy as np
+from app.utils.embedding_store import (embeddings_filename, iter_stored_embeddings, load_embeddings,
+                                       reference_path, save_embeddings)
+
+def save(results_dir, analysis_id, matrix, space='minilm'):
+    path = os.path.join(results_dir, embeddings_filename(analysis_id))
+    return save_embeddings(path, [f'doc{i}.txt' for i in range(len(matrix))], matrix, space)
+
+def test_round_trip(tmp_path):
+    matrix = np.random.default_rng(0).normal(size=(3, 4)).astype(np.float32)
+
+    reference = save(str(tmp_path), 'a1', matrix)
+    loaded = load_embeddings(str(tmp_path / embeddings_filename('a1')))
+
+    assert reference == {'path': 'a1.embeddings.npy', 'space': 'minilm',
+                         'filenames': ['doc0.txt', 'doc1.txt', 'doc2.txt'], 'shape': [3, 4], 'dtype': 'float16'}
+    with open(reference_path(str(tmp_path / embeddings_filename('a1'))), encoding='utf-8') as f:
+        assert json.load(f) == reference
+    assert isinstance(loaded, np.memmap) and not loaded.flags.writeable
+    np.testing.assert_array_equal(loaded, matrix.astype(np.float16))
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.tmp')]
+
+def test_iter_stored_embeddings_by_space_and_id(tmp_path):
+    save(str(tmp_path), 'a1', np.ones((2, 4)))
+    save(str(tmp_path), 'a2', np.zeros((1, 4)))
+    save(str(tmp_path), 'other', np.ones((1, 8)), space='mpnet')
+
+    assert [aid for aid, _ in iter_stored_embeddings(str(tmp_path), 'minilm')] == ['a1', 'a2']
+    stored = dict(iter_stored_embeddings(str(tmp_path), 'minilm', ['a2', 'missing', 'other']))
+    assert list(stored) == ['a2']  # unknown ids and other spaces are skipped
+    assert stored['a2'].shape == (1, 4)
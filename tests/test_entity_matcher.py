@@ -0,0 +1,30 @@
+# tests/test_entity_matcher.py
+import random
+
+import pytest
+from app.utils.entity_matcher import AHOCORASICK_AVAILABLE, EntityMatcher
+
+BACKENDS = [False] + ([True] if AHOCORASICK_AVAILABLE else [])
+
+def naive(patterns, text):
+    return [i for i, pattern in enumerate(patterns) if pattern and pattern.lower() in text.lower()]
+
+@pytest.mark.parametrize('use_extension', BACKENDS)
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_substring_search(seed, use_extension):
+    rng = random.Random(seed)
+    alphabet = 'abΑαβ '
+    patterns = [''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 5))) for _ in range(40)]
+    matcher = EntityMatcher(patterns, use_extension=use_extension)
+
+    for _ in range(50):
+        text = ''.join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+        assert matcher.find(text) == naive(patterns, text)
+
+@pytest.mark.parametrize('use_extension', BACKENDS)
+def test_nested_names_and_pattern_order(use_extension):
+    patterns = ['Νέα Υόρκη', 'Υόρκη', 'ΝΈΑ ΥΌΡΚΗ', 'Αθήνα', '']
+    matcher = EntityMatcher(patterns, use_extension=use_extension)
+
+    assert matcher.find_patterns('Από την Αθήνα στη νέα υόρκη.') == ['Νέα Υόρκη', 'Υόρκη', 'ΝΈΑ ΥΌΡΚΗ', 'Αθήνα']
+    assert EntityMatcher([], use_extension=use_extension).find('κάτι') == []
@@ -0,0 +1,83 @@
+# tests/test_entity_normalizer.py
+import random
+from difflib import SequenceMatcher
+
+import pytest
+from app.models.entity_normalizer import EntityNormalizer, normalize_entities
+
+def brute_force(entities, threshold):
+    """The original all-pairs normalization"""
+    normalized, entity_map = {}, {}
+    for entity, entity_type in entities.items():
+        entity_clean = entity.strip()
+        if not entity_clean:
+            continue
+        for canonical, norm_type in normalized.items():
+            if norm_type == entity_type and \
+                    SequenceMatcher(None, entity_clean.lower(), canonical.lower()).ratio() >= threshold:
+                entity_map[entity_clean] = canonical
+                break
+        else:
+            normalized[entity_clean] = entity_type
+            entity_map[entity_clean] = entity_clean
+    return normalized, entity_map
+
+def random_entities(seed, count=400):
+    rng = random.Random(seed)
+    stems = ['Γιώργ', 'Αθήν', 'Μαρί', 'Νίκ', 'Ελέν', 'Παπαδόπουλ', 'ab', 'x']
+    endings = ['ος', 'ου', 'ο', 'α', 'ας', 'ης', '', 'ΟΣ']
+    entities = {}
+    for _ in range(count):
+        name = rng.choice(stems) + rng.choice(endings)
+        if rng.random() < 0.3:
+            name = name + ' ' + rng.choice(stems) + rng.choice(endings)
+        if rng.random() < 0.1:
+            name = ' ' + name  # strips to a name that may already exist
+        entities[name] = rng.choice(['PERSON', 'LOC', 'ORG'])
+    return entities
+
+@pytest.mark.parametrize('threshold', [0.5, 0.6, 0.7, 0.85, 0.95])
+@pytest.mark.parametrize('seed', range(5))
+def test_matches_brute_force(seed, threshold):
+    entities = random_entities(seed)
+
+    assert EntityNormalizer(threshold).normalize(entities) == brute_force(entities, threshold)
+
+def test_short_names_without_shared_bigrams():
+    # 'ab' and 'b' share no bigram but score 0.67; 'abc'/'axbxc' score 0.75
+    entities = {'ab': 'X', 'b': 'X', 'abc': 'Y', 'axbxc': 'Y', 'a': 'Z', 'ba': 'Z'}
+
+    for threshold in (0.6, 0.66, 0.7, 0.75):
+        assert EntityNormalizer(threshold).normalize(entities) == brute_force(entities, threshold)
+
+def test_length_bound_is_not_truncated_by_float_error():
+    # At 0.8 the bound 2/(3*0.8-2) evaluates to 4.999...; 'bcα'/'bα' (L=5) score exactly 0.8
+    entities = {'bcα': 'L', 'bα': 'L'}
+
+    normalized, entity_map = normalize_entities(entities, similarity_threshold=0.8)
+
+    assert entity_map['bα'] == 'bcα'
+    assert (normalized, entity_map) == brute_force(entities, 0.8)
+
+def test_greek_declensions_map_to_first_form():
+    normalized, entity_map = EntityNormalizer(0.85).normalize(
+        {'Παπαδόπουλος': 'PERSON', 'Παπαδόπουλου': 'PERSON', 'Παπαδόπουλο': 'LOC'})
+
+    assert entity_map['Παπαδόπουλου'] == 'Παπαδόπουλος'
+    assert normalized == {'Παπαδόπουλος': 'PERSON', 'Παπαδόπουλο': 'LOC'}
+
+def test_rules_merge_declensions_below_fuzzy_threshold():
+    entities = {'Γιώργος': 'PERSON', 'Γιώργου': 'PERSON', 'Γιώργο': 'PERSON'}
+
+    assert EntityNormalizer(0.9).normalize(entities)[1]['Γιώργου'] == 'Γιώργου'
+    normalized, entity_map = normalize_entities(entities, similarity_threshold=0.9, rules=True)
+    assert normalized == {'Γιώργος': 'PERSON'}
+    assert entity_map == {'Γιώργος': 'Γιώργος', 'Γιώργου': 'Γιώργος', 'Γιώργο': 'Γιώργος'}
+
+def test_lemmas_merge_inflected_names():
+    entities = {'Ολυμπιακός': 'ORG', 'Ολυμπιακού': 'ORG', 'Ολυμπιακο': 'LOC'}
+    lemmas = {'Ολυμπιακού': 'Ολυμπιακός', 'Ολυμπιακο': 'Ολυμπιακός'}
+
+    normalized, entity_map = normalize_entities(entities, lemmas=lemmas, rules=True)
+    assert entity_map['Ολυμπιακού'] == 'Ολυμπιακός'
+    assert normalized == {'Ολυμπιακός': 'ORG', 'Ολυμπιακο': 'LOC'}  # keys never cross types
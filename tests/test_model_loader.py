@@ -0,0 +1,58 @@
+# tests/test_model_loader.py
+import pytest
+from app.utils.model_loader import ModelLoader
+
+@pytest.fixture
+def loader():
+    calls = []
+    loader = ModelLoader()
+    loader.register('model', lambda: calls.append('model') or object())
+    loader.calls = calls
+    return loader
+
+def test_loads_lazily_once(loader):
+    assert loader.status()['model']['status'] == 'pending'
+    assert not loader.is_ready()
+
+    model = loader.get('model')
+
+    assert loader.get('model') is model
+    assert loader.calls == ['model']
+    assert loader.is_ready()
+    assert loader.status()['model']['load_time'] is not None
+
+def test_background_warm_up(loader):
+    thread = loader.warm_up()
+    thread.join(timeout=5)
+
+    assert loader.is_loaded('model')
+    assert loader.is_ready()
+
+def test_failed_load_is_reported():
+    loader = ModelLoader()
+    loader.register('broken', lambda: 1 / 0)
+
+    loader.warm_up(background=False)
+
+    state = loader.status()['broken']
+    assert state['status'] == 'failed'
+    assert 'division' in state['error']
+    assert loader.is_ready()  # tried; the next get loads it again
+
+def test_warm_up_retries_failed_loads():
+    attempts = []
+    loader = ModelLoader()
+    loader.register('flaky', lambda: attempts.append(1) or (1 / (len(attempts) - 1)))
+
+    loader.warm_up(background=False, retries=2, retry_delay=0)
+
+    assert loader.is_loaded('flaky')
+    assert loader.status()['flaky']['attempts'] == 2
+
+def test_ready_without_warm_up(loader):
+    assert not loader.is_ready()
+
+    loader.load_on_demand()
+
+    assert loader.is_ready()
+    assert not loader.is_loaded('model')
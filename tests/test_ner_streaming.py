@@ -0,0 +1,40 @@
+# tests/test_ner_streaming.py
+import spacy
+
+import app.models.ner_analyzer as ner_analyzer
+from app.utils.nlp_registry import PipelineView
+
+SENTENCES = ['Ήρθε ο κ. Γιώργος από την Αθήνα.', 'Η Μαρία έμεινε στη Θεσσαλονίκη.',
+             'Ο Νίκος και η Μαρία είδαν τον κ. Γιώργος.', 'Η Ελένη πήγε στην Αθήνα.']
+
+def pipeline():
+    nlp = spacy.blank('el')
+    nlp.add_pipe('sentencizer')
+    nlp.add_pipe('entity_ruler').add_patterns(
+        [{'label': 'PERSON', 'pattern': name} for name in ('κ. Γιώργος', 'Μαρία', 'Νίκος', 'Ελένη')] +
+        [{'label': 'LOC', 'pattern': name} for name in ('Αθήνα', 'Θεσσαλονίκη')])
+    return nlp
+
+def test_streaming_windows_match_single_pass(monkeypatch, tmp_path):
+    nlp = pipeline()
+    monkeypatch.setattr(ner_analyzer, 'get_pipeline', lambda **kwargs: PipelineView(nlp, sentencizer=True))
+    monkeypatch.setattr(ner_analyzer, 'get_alias_store', lambda: None)
+    text = ' '.join(SENTENCES * 10)
+
+    analyzer = ner_analyzer.EnhancedNERAnalyzer()
+    single = analyzer.create_network_visualization(text, output_dir=str(tmp_path / 'single'))
+
+    records = []
+    collect = analyzer.collect_entities_and_pairs
+    def spy(text, records_iter):
+        return collect(text, (records.append(record) or record for record in records_iter))
+    monkeypatch.setattr(analyzer, 'collect_entities_and_pairs', spy)
+    # Cut the first window right after 'κ. ' so its last sentence is carried over
+    analyzer.window_size = text.index('κ. Γιώργος', len(SENTENCES[0])) + 3
+    streamed = analyzer.create_network_visualization(text, output_dir=str(tmp_path / 'streamed'))
+
+    assert len(records) > 1
+    assert 'error' not in single
+    for key in ('entities', 'entity_count', 'relationship_count', 'importance_scores'):
+        assert streamed[key] == single[key]
+    assert 'κ. Γιώργος' in streamed['entities']
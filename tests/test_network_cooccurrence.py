@@ -0,0 +1,33 @@
+# tests/test_network_cooccurrence.py
+import spacy
+from spacy.tokens import Span
+
+import app.models.network_analyzer as network_analyzer
+from app.utils.nlp_registry import PipelineView
+
+SENTENCES = ['Ο Γιώργος είδε τη Μαρία .', 'Ο Γιώργος είδε τον Νίκο .', 'Ο Γιώργος είδε την Ελένη .',
+             'Η Μαρία και ο Νίκος .']
+PEOPLE = {'Γιώργος', 'Μαρία', 'Νίκο', 'Νίκος', 'Ελένη'}
+
+def parsed_doc():
+    nlp = spacy.blank('el')
+    nlp.add_pipe('sentencizer')
+    doc = nlp(' '.join(SENTENCES))
+    doc.ents = [Span(doc, token.i, token.i + 1, label='PERSON') for token in doc if token.text in PEOPLE]
+    return doc
+
+def test_create_network_with_pmi_weighting(monkeypatch, tmp_path):
+    monkeypatch.setenv('NATS_COOCCURRENCE_WEIGHTING', 'pmi')
+    monkeypatch.setattr(network_analyzer, 'get_pipeline', lambda **kwargs: PipelineView(spacy.blank('el'), **kwargs))
+    monkeypatch.setattr(network_analyzer, 'get_alias_store', lambda: None)
+    analyzer = network_analyzer.EnhancedNetworkAnalyzer()
+    doc = parsed_doc()
+
+    # Γιώργος is in 3 of 4 sentences, so his PMI with Μαρία is log(4/3 * 1/2) < 0
+    result = analyzer.create_network(doc.text, output_dir=str(tmp_path), doc=doc)
+
+    assert 'error' not in result
+    assert any(rel['strength'] < 0 for rel in result['relationship_details'])
+    assert all(rel['count'] >= 1 for rel in result['relationship_details'])
+    # Graph measures use the raw counts, never negative PMI weights
+    assert all(0 <= scores['pagerank'] <= 1 for scores in result['centrality'].values())
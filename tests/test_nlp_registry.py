@@ -0,0 +1,74 @@
+# tests/test_nlp_registry.py
+import spacy
+from spacy.tokens import Doc
+
+from app.utils.nlp_registry import PipelineView
+from app.utils.parse_cache import ParseCache
+
+WORDS = ['Ο', 'Γιώργος', 'ήρθε', '.', 'Η', 'Μαρία', 'έφυγε', '.', 'Τέλος']
+
+def shared_parse(nlp):
+    """A Doc as the full pipeline returns it: the parser put every word in one sentence"""
+    return Doc(nlp.vocab, words=WORDS, sent_starts=[True] + [False] * (len(WORDS) - 1))
+
+def test_sentencizer_view_resegments_a_shared_parse():
+    nlp = spacy.blank('el')
+    view = PipelineView(nlp, sentencizer=True)
+    doc = shared_parse(nlp)
+    own = view(doc.text)
+
+    assert len(list(doc.sents)) == 1
+    assert view.sentences(doc) == [(sent.start_char, sent.end_char) for sent in own.sents]
+    assert [doc.text[start:end] for start, end in view.sentences(doc)] == \
+        ['Ο Γιώργος ήρθε .', 'Η Μαρία έφυγε .', 'Τέλος']
+    assert len(list(doc.sents)) == 1  # the shared Doc is left as it was
+
+def test_view_without_sentencizer_keeps_doc_sentences():
+    nlp = spacy.blank('el')
+    doc = shared_parse(nlp)
+
+    assert PipelineView(nlp).sentences(doc) == [(0, len(doc.text.rstrip()))]
+
+def counting_pipe(nlp):
+    """Record the texts and keyword arguments of every nlp.pipe call"""
+    calls = []
+    pipe = nlp.pipe
+
+    def counted(texts, **kwargs):
+        call = {'texts': [], 'kwargs': kwargs}
+        calls.append(call)
+        return pipe((call['texts'].append(text) or text for text in texts), **kwargs)
+
+    nlp.pipe = counted
+    return calls
+
+def test_cached_pipe_parses_all_misses_in_one_call(tmp_path):
+    nlp = spacy.blank('el')
+    view = PipelineView(nlp, sentencizer=True, cache=ParseCache(str(tmp_path), min_chars=0))
+    texts = [f'Κείμενο {i} εδώ. Δεύτερη πρόταση.' for i in range(100)]  # many old 32-text windows
+    for text in texts[::3]:
+        view(text)  # cache every third text
+    calls = counting_pipe(nlp)
+    component_cfg = {'sentencizer': {}}
+
+    docs = list(view.pipe(texts, batch_size=4, component_cfg=component_cfg))
+
+    assert [doc.text for doc in docs] == texts
+    assert len(calls) == 1
+    assert calls[0]['texts'] == [text for i, text in enumerate(texts) if i % 3]
+    assert calls[0]['kwargs']['component_cfg'] is component_cfg
+    assert [len(list(doc.sents)) for doc in docs] == [2] * len(texts)
+
+    calls.clear()
+    again = list(view.pipe(texts))
+    assert [doc.text for doc in again] == texts
+    assert calls == []  # everything cached: spaCy is not called at all
+
+def test_cached_pipe_as_tuples(tmp_path):
+    nlp = spacy.blank('el')
+    view = PipelineView(nlp, cache=ParseCache(str(tmp_path), min_chars=0))
+    view('πρώτο')
+
+    pairs = list(view.pipe([('πρώτο', 1), ('δεύτερο', 2)], as_tuples=True))
+
+    assert [(doc.text, context) for doc, context in pairs] == [('πρώτο', 1), ('δεύτερο', 2)]
@@ -0,0 +1,102 @@
+# tests/test_parse_cache.py
+import os
+
+import pytest
+import spacy
+from spacy.tokens import Span
+
+import app.utils.parse_cache as parse_cache
+from app.utils.parse_cache import ParseCache
+
+TEXT = 'Ο Γιώργος έμεινε στην Αθήνα πολλά χρόνια. ' * 10
+
+@pytest.fixture
+def nlp():
+    nlp = spacy.blank('el')
+    nlp.add_pipe('sentencizer')
+    return nlp
+
+def parsed(nlp, text=TEXT):
+    doc = nlp(text)
+    doc.ents = [Span(doc, token.i, token.i + 1, label='PERSON') for token in doc if token.text == 'Γιώργος']
+    return doc
+
+def test_docbin_round_trip(nlp, tmp_path):
+    cache = ParseCache(str(tmp_path))
+    doc = parsed(nlp)
+    key = cache.key(TEXT, 'el_test-1.0:sentencizer')
+
+    assert cache.get(key, nlp.vocab) is None
+    cache.put(key, doc)
+    cached = cache.get(key, nlp.vocab)
+
+    assert cached.text == doc.text
+    assert [(e.start_char, e.end_char, e.label_) for e in cached.ents] == \
+        [(e.start_char, e.end_char, e.label_) for e in doc.ents]
+    assert [s.start_char for s in cached.sents] == [s.start_char for s in doc.sents]
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+def test_pipeline_version_invalidates_entries(nlp, tmp_path):
+    cache = ParseCache(str(tmp_path))
+    cache.put(cache.key(TEXT, 'el_test-1.0:sentencizer'), parsed(nlp))
+
+    assert cache.key(TEXT, 'el_test-1.1:sentencizer') != cache.key(TEXT, 'el_test-1.0:sentencizer')
+    assert cache.get(cache.key(TEXT, 'el_test-1.1:sentencizer'), nlp.vocab) is None
+    assert cache.get(cache.key(TEXT, 'el_test-1.0:ner,sentencizer'), nlp.vocab) is None
+
+def test_eviction_keeps_recently_used_entries_within_budget(nlp, tmp_path):
+    texts = [f'{i} {TEXT}' for i in range(4)]
+    probe = ParseCache(str(tmp_path / 'probe'))
+    probe.put('probe', parsed(nlp, texts[0]))
+    entry_bytes = os.path.getsize(probe._path('probe'))
+
+    cache = ParseCache(str(tmp_path / 'cache'), max_bytes=int(entry_bytes * 3.5))
+    keys = [cache.key(text, 'el') for text in texts]
+    for i in range(3):
+        cache.put(keys[i], parsed(nlp, texts[i]))
+        os.utime(cache._path(keys[i]), (i, i))  # distinct mtimes regardless of clock resolution
+    assert cache.get(keys[0], nlp.vocab) is not None  # now the most recently used
+    cache.put(keys[3], parsed(nlp, texts[3]))
+
+    kept = [i for i, key in enumerate(keys) if os.path.exists(cache._path(key))]
+    assert kept == [0, 2, 3]
+    assert cache.stats()['size_bytes'] <= cache.max_bytes
+
+def test_failed_touch_is_still_a_hit(nlp, tmp_path, monkeypatch):
+    cache = ParseCache(str(tmp_path))
+    key = cache.key(TEXT, 'el')
+    cache.put(key, parsed(nlp))
+
+    def evicted_meanwhile(path):
+        raise FileNotFoundError(path)
+    monkeypatch.setattr(parse_cache.os, 'utime', evicted_meanwhile)
+
+    assert cache.get(key, nlp.vocab).text == TEXT
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 0
+
+def test_eviction_rescans_rarely_and_frees_headroom(nlp, tmp_path, monkeypatch):
+    texts = [f'{i:02d} {TEXT}' for i in range(30)]
+    probe = ParseCache(str(tmp_path / 'probe'))
+    probe.put('probe', parsed(nlp, texts[0]))
+    entry_bytes = os.path.getsize(probe._path('probe'))
+
+    cache = ParseCache(str(tmp_path / 'cache'), max_bytes=int(entry_bytes * 10.5))
+    scans = []
+    entries = cache._entries
+    monkeypatch.setattr(cache, '_entries', lambda: scans.append(1) or entries())
+    for text in texts[:11]:
+        cache.put(cache.key(text, 'el'), parsed(nlp, text))
+
+    # Evicted down to 90% of the budget, so the next put still fits
+    assert cache.stats()['size_bytes'] <= cache.max_bytes * 0.9
+    cache.put(cache.key(texts[11], 'el'), parsed(nlp, texts[11]))
+    assert len(cache._lru) == 10 == sum(len(files) for _, _, files in os.walk(cache.cache_dir))
+
+    for text in texts[12:]:
+        cache.put(cache.key(text, 'el'), parsed(nlp, text))
+    assert len(scans) == 1  # only the first put walked the directory
+    assert cache.stats()['size_bytes'] <= cache.max_bytes
+
+    cache.rescan_puts = 1
+    cache.put(cache.key(texts[0], 'el'), parsed(nlp, texts[0]))
+    assert len(scans) == 2
@@ -0,0 +1,57 @@
+# tests/test_reference_space.py
+import numpy as np
+import pytest
+from flask import Flask
+
+import app.routes.api_routes as api_routes
+from app.models.reference_space import ReferenceSpace
+from app.utils.embedding_store import embeddings_filename, save_embeddings
+
+def matrix(n, seed):
+    return np.random.default_rng(seed).normal(size=(n, 8)).astype(np.float32)
+
+def test_fit_transform_round_trip(tmp_path):
+    baseline = matrix(30, 0)
+    ReferenceSpace('space', 'pca', directory=str(tmp_path)).fit(baseline)
+
+    reloaded = ReferenceSpace('space', 'pca', directory=str(tmp_path))  # e.g. another worker
+    assert reloaded.is_fitted() and reloaded.info['n_documents'] == 30
+    projected = reloaded.transform(matrix(5, 1))
+    assert projected.shape == (5, 2)
+    assert np.allclose(reloaded.transform(baseline[:3]), reloaded.reducer.transform(baseline[:3]))
+    assert reloaded.transform(np.zeros((2, 3))) is None  # other dimension
+
+class FakeAnalyzer:
+    def embedding_space(self, embedding_type, pooling):
+        return 'fake-space'
+
+class FakeModels:
+    def get(self, name):
+        return FakeAnalyzer()
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    results = tmp_path / 'results'
+    results.mkdir()
+    for analysis_id, n in (('run1', 4), ('run2', 6)):
+        save_embeddings(str(results / embeddings_filename(analysis_id)), [f'f{i}' for i in range(n)],
+                        matrix(n, n), 'fake-space')
+    monkeypatch.setattr(api_routes, 'get_reference_space',
+                        lambda space, method: ReferenceSpace(space, method, directory=str(tmp_path / 'spaces')))
+
+    app = Flask(__name__)
+    app.config['RESULTS_FOLDER'] = str(results)
+    app.extensions['models'] = FakeModels()
+    app.register_blueprint(api_routes.api_bp)
+    return app.test_client()
+
+def test_form_post_reads_repeated_analysis_ids(client):
+    reply = client.post('/api/reference-space', data={'analysis_ids': ['run1', 'run2']})
+    assert reply.status_code == 200 and reply.get_json()['n_documents'] == 10
+
+    reply = client.post('/api/reference-space', data={'analysis_ids': 'run1'})
+    assert reply.get_json()['n_documents'] == 4
+
+def test_json_post_requires_a_list(client):
+    assert client.post('/api/reference-space', json={'analysis_ids': 'run1'}).status_code == 400
+    assert client.post('/api/reference-space', json={'analysis_ids': ['run2']}).get_json()['n_documents'] == 6
@@ -0,0 +1,45 @@
+# tests/test_similarity.py
+import numpy as np
+import pytest
+import spacy
+from sklearn.metrics.pairwise import cosine_similarity
+
+import app.models.doc_embeddings as doc_embeddings
+from app.utils.nlp_registry import PipelineView
+
+@pytest.fixture
+def analyzer(monkeypatch):
+    monkeypatch.setattr(doc_embeddings, 'get_pipeline', lambda **kwargs: PipelineView(spacy.blank('el'), **kwargs))
+    return doc_embeddings.EnhancedDocEmbeddingAnalyzer()
+
+def test_top_k_similarity_matches_dense(analyzer):
+    matrix = np.random.default_rng(0).normal(size=(50, 8))
+    dense = cosine_similarity(matrix)
+    np.fill_diagonal(dense, -np.inf)
+
+    top_k = analyzer.top_k_similarity(matrix, k=5, block_size=7).toarray()
+
+    for i in range(len(matrix)):
+        neighbours = np.flatnonzero(top_k[i])
+        assert len(neighbours) == 5
+        assert set(neighbours) == set(np.argsort(-dense[i])[:5])
+        np.testing.assert_allclose(top_k[i, neighbours], dense[i, neighbours], rtol=1e-5)
+
+def test_aggregated_heatmap_keeps_negative_similarities(analyzer):
+    matrix = np.random.default_rng(1).normal(size=(12, 3))  # few dimensions: many negative neighbours
+    analyzer.similarity_top_k = 8
+    analyzer.heatmap_max_cells = 12  # one document per cell
+
+    z = np.array(analyzer.create_aggregated_similarity_heatmap(matrix, [f'd{i}' for i in range(12)]).data[0].z,
+                 dtype=float)
+
+    dense = cosine_similarity(matrix)
+    np.fill_diagonal(dense, -np.inf)
+    linked = np.zeros_like(dense, dtype=bool)
+    for i, row in enumerate(dense):
+        linked[i, np.argsort(-row)[:8]] = True
+    linked |= linked.T
+    expected = np.where(linked, dense, np.nan)
+
+    assert np.nanmin(expected) < 0
+    np.testing.assert_allclose(z, expected, atol=1e-6)
@@ -0,0 +1,77 @@
+# tests/test_text_chunker.py
+import pytest
+import spacy
+from app.utils.text_chunker import iter_text_chunks, iter_chunk_records, doc_to_record
+
+@pytest.fixture
+def nlp():
+    nlp = spacy.blank('el')
+    nlp.add_pipe('sentencizer')
+    ruler = nlp.add_pipe('entity_ruler')
+    ruler.add_patterns([
+        {'label': 'PERSON', 'pattern': 'Γιώργος'},
+        {'label': 'LOC', 'pattern': 'Αθήνα'}
+    ])
+    return nlp
+
+@pytest.fixture
+def long_text():
+    return 'Ο Γιώργος έμεινε στην Αθήνα πολλά χρόνια. ' * 200
+
+def test_chunks_cover_text(long_text):
+    chunks = list(iter_text_chunks(long_text, chunk_size=1500))
+
+    assert len(chunks) > 1
+    assert ''.join(chunk for _, chunk in chunks) == long_text
+    for offset, chunk in chunks:
+        assert long_text[offset:offset + len(chunk)] == chunk
+
+def test_chunks_break_at_sentences(long_text):
+    for _, chunk in list(iter_text_chunks(long_text, chunk_size=1500))[:-1]:
+        assert chunk.rstrip().endswith('.')
+
+def test_records_use_global_offsets(nlp, long_text):
+    records = list(iter_chunk_records(nlp, long_text, chunk_size=1500))
+    single = doc_to_record(nlp(long_text))
+
+    ents = [ent for record in records for ent in record['ents']]
+    assert ents == single['ents']
+    for start, end, label in ents:
+        assert long_text[start:end] in ('Γιώργος', 'Αθήνα')
+
+    sents = [sent for record in records for sent in record['sents']]
+    assert len(sents) == 200
+    assert all(long_text[start:end].startswith('Ο Γιώργος') for start, end in sents)
+
+def test_small_chunks_without_punctuation_are_full_size():
+    text = 'λέξη ' * 100  # no sentence punctuation at all
+
+    chunks = list(iter_text_chunks(text, chunk_size=120))
+
+    assert [len(chunk) for _, chunk in chunks] == [120, 120, 120, 120, 20]
+
+def test_small_chunks_only_break_in_their_second_half():
+    text = 'Α. ' + 'λέξη ' * 100
+
+    chunks = list(iter_text_chunks(text, chunk_size=120))
+
+    assert len(chunks[0][1]) == 120  # the period at 1 is too early to cut at
+
+def test_records_match_single_parse_when_cut_after_abbreviation():
+    nlp = spacy.blank('el')
+    nlp.add_pipe('sentencizer')
+    nlp.add_pipe('entity_ruler').add_patterns([{'label': 'PERSON', 'pattern': 'κ. Γιώργος'}])
+    sentence = 'Ήρθε ο κ. Γιώργος από την Αθήνα. '
+    text = sentence * 20
+    chunk_size = 3 * len(sentence) + sentence.index('κ. ') + 3
+
+    first = next(iter_text_chunks(text, chunk_size))[1]
+    assert first.endswith('Ήρθε ο κ. ')  # the window is cut inside a sentence
+
+    records = list(iter_chunk_records(nlp, text, chunk_size))
+    single = doc_to_record(nlp(text))
+
+    assert len(records) > 1
+    assert [ent for record in records for ent in record['ents']] == single['ents']
+    assert [sent for record in records for sent in record['sents']] == single['sents']
+    assert len(single['ents']) == 20